@@ -0,0 +1,95 @@
+import queue
+import threading
+
+# --- EXECUÇÃO EM SEGUNDO PLANO PARA A GUI ---
+# Chamadas de rede e de banco (Gemini, conexão, consultas) rodam em uma
+# thread de trabalho, fora do loop do Tk. A thread nunca mexe em widgets:
+# ela publica callbacks em uma fila que o loop do Tk esvazia periodicamente
+# via root.after. As tarefas são executadas uma de cada vez, na ordem em que
+# foram enviadas, pois escrevem na mesma área de resultados da janela.
+# Lotes de resultados vão por post_wait: com max_pending lotes ainda não
+# exibidos, a thread de trabalho espera, e a leitura do banco não se adianta
+# à janela acumulando linhas na fila.
+
+class BackgroundWorker:
+    """Fila de tarefas executadas em uma thread, com retorno na thread do Tk."""
+
+    def __init__(self, root, poll_ms=50, max_pending=8):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = queue.Queue()
+        self._ui_events = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="text-to-sql-worker", daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_ms, self._poll)
+
+    @property
+    def pending(self):
+        """Tarefas na fila ou em execução."""
+        with self._lock:
+            return self._pending
+
+    def submit(self, job, *args, on_success=None, on_error=None):
+        """Enfileira job(*args); on_success(resultado) ou on_error(exceção) rodam na thread do Tk."""
+        with self._lock:
+            self._pending += 1
+        self._jobs.put((job, args, on_success, on_error))
+
+    def post(self, callback, *args):
+        """Agenda callback(*args) na thread do Tk (pode ser chamado de qualquer thread)."""
+        self._ui_events.put((callback, args))
+
+    def post_wait(self, callback, *args):
+        """Como post, mas espera enquanto houver max_pending chamadas de post_wait ainda não executadas."""
+        while not self._slots.acquire(timeout=self.poll_ms / 1000):
+            if self._closed:
+                return
+
+        def run(*args):
+            try:
+                callback(*args)
+            finally:
+                self._slots.release()
+
+        self.post(run, *args)
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            job, args, on_success, on_error = item
+            try:
+                callback, payload = on_success, job(*args)
+            except Exception as e:
+                callback, payload = on_error, e
+            with self._lock:
+                self._pending -= 1
+            if callback:
+                self.post(callback, payload)
+
+    def _poll(self):
+        if self._closed:
+            return
+        try:
+            # Processa um número limitado de eventos por ciclo para não travar a janela
+            for _ in range(200):
+                try:
+                    callback, args = self._ui_events.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    callback(*args)
+                except Exception as e:
+                    # Um callback com erro não pode parar a entrega dos demais eventos
+                    print(f"Erro na atualização da interface ({getattr(callback, '__name__', callback)}): {e}")
+        finally:
+            self.root.after(self.poll_ms, self._poll)
+
+    def shutdown(self):
+        self._closed = True
+        self._jobs.put(None)
@@ -0,0 +1,228 @@
+"""Modo batch: gera (e opcionalmente executa) a SQL de um arquivo JSONL de perguntas.
+
+Cada linha da entrada é um objeto JSON com a pergunta em "question" (ou
+"pergunta") e, opcionalmente, um "id". A geração roda em paralelo com até
+--workers perguntas ao mesmo tempo; com --execute, cada SQL é executada em
+uma conexão emprestada do pool. Cada resultado é gravado assim que fica
+pronto em uma linha da saída JSONL, com tempos por etapa, tokens de entrada e
+o erro, se houver. Perguntas repetidas que ficam em andamento ao mesmo tempo
+compartilham uma só chamada ao modelo (e, com --execute, uma só execução).
+Se o processo cair, rodar o mesmo comando de novo pula as perguntas que já
+estão na saída.
+
+Uso:
+    python batch.py perguntas.jsonl -o respostas.jsonl --engine postgresql --user postgres --database meu_banco
+    python batch.py perguntas.jsonl -o respostas.jsonl --engine mysql --user root --database meu_banco \\
+        --execute --workers 8 --parquet respostas.parquet
+
+A senha é lida da variável DB_PASSWORD ou pedida no terminal.
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+import cost_guard
+import metrics
+import script
+
+# --- ENTRADA E SAÍDA ---
+
+def read_questions(path):
+    """Lê o JSONL de perguntas, gerando (id, pergunta). Linhas vazias são ignoradas."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            pergunta = item.get("question") or item.get("pergunta")
+            if not pergunta:
+                raise ValueError(f"Linha {line_number} de {path} não tem 'question' nem 'pergunta'.")
+            yield str(item.get("id", line_number)), pergunta
+
+def load_done_ids(path, retry_errors=False):
+    """Ids já gravados na saída (para retomar após uma interrupção)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Última linha truncada por uma queda no meio da escrita
+                continue
+            if retry_errors and record.get("status") != "ok":
+                continue
+            done.add(record["id"])
+    return done
+
+def _ensure_newline(path):
+    """Garante que a próxima escrita comece em uma linha nova (a anterior pode estar truncada)."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+def write_parquet(jsonl_path, parquet_path):
+    """Converte a saída JSONL em Parquet (requer pyarrow)."""
+    import pandas as pd
+    df = pd.read_json(jsonl_path, lines=True, dtype=False)
+    for column in ("columns", "result"):
+        if column in df:
+            # Listas aninhadas de tipos variados viram texto JSON
+            df[column] = df[column].map(lambda v: json.dumps(v, ensure_ascii=False, default=str))
+    df.to_parquet(parquet_path, index=False)
+
+# --- PROCESSAMENTO ---
+
+def process_question(item_id, pergunta, schema, pool, max_rows, use_cache):
+    """Gera e (se houver pool) executa a SQL de uma pergunta. Nunca levanta exceção."""
+    record = {"id": item_id, "question": pergunta, "sql": None, "status": "ok", "error": None,
+              "cache_hit": False, "timings": {}}
+    # Cada pergunta é um trace; o trace_id vai na saída para cruzar com METRICS_OTEL_SPANS
+    with metrics.span("question", interface="batch", id=str(item_id)) as question:
+        record["trace_id"] = question.trace_id
+        stage = "generate"
+        try:
+            info = {}
+            start = time.perf_counter()
+            record["sql"] = script.generate_sql(schema, pergunta, use_cache=use_cache, info=info)
+            record["timings"]["generate_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            record["cache_hit"] = info["cache_hit"]
+            record["coalesced"] = info["coalesced"]
+            record["tokens"] = info["tokens"]
+
+            if pool is not None:
+                stage = "estimate"
+                start = time.perf_counter()
+                decision = cost_guard.check(pool, record["sql"])
+                record["timings"]["estimate_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if decision.estimate is not None:
+                    record["estimate"] = {"cost": decision.estimate.cost, "rows": decision.estimate.rows,
+                                          "action": decision.action}
+                if decision.action == 'block':
+                    raise cost_guard.CostGuardError(decision)
+
+                stage = "execute"
+                start = time.perf_counter()
+                # Execuções idênticas simultâneas (mesma SQL) são feitas uma vez só
+                rows, record["columns"] = script.execute_sql(pool, decision.sql, use_cache=use_cache,
+                                                             max_rows=max_rows)
+                record["timings"]["execute_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                record["rows"] = len(rows)
+                record["truncated"] = rows.truncated
+                record["result"] = [list(row) for row in rows]
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{stage}: {type(e).__name__}: {e}"
+            if stage != "generate":
+                # Não reaproveitar do cache uma SQL que falhou
+                script.invalidate_sql_cache(schema, pergunta)
+        question.set(status=record["status"])
+    return record
+
+def run_batch(questions, output_path, schema, pool=None, workers=4, max_rows=1000, use_cache=True, done_ids=()):
+    """Processa as perguntas em paralelo e grava cada resultado na saída assim que fica pronto.
+
+    No máximo 2 * workers perguntas ficam em andamento, para que arquivos
+    grandes não sejam carregados inteiros na memória. Retorna um dict com
+    os totais do processamento.
+    """
+    totals = {"processed": 0, "ok": 0, "errors": 0, "cache_hits": 0, "skipped": 0, "elapsed": 0.0}
+    _ensure_newline(output_path)
+    start = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        def write(record):
+            # Só a thread principal escreve; cada linha vai para o disco na hora,
+            # o que permite retomar após uma queda
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            totals["processed"] += 1
+            totals["ok" if record["status"] == "ok" else "errors"] += 1
+            totals["cache_hits"] += bool(record["cache_hit"])
+            if totals["processed"] % 10 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {totals['processed']} perguntas processadas "
+                      f"({totals['processed'] / elapsed * 60:.1f}/min, {totals['errors']} erros)")
+
+        in_flight = set()
+        try:
+            for item_id, pergunta in questions:
+                if item_id in done_ids:
+                    totals["skipped"] += 1
+                    continue
+                if len(in_flight) >= 2 * workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+                in_flight.add(executor.submit(process_question, item_id, pergunta, schema, pool, max_rows, use_cache))
+            for future in as_completed(in_flight):
+                write(future.result())
+        except KeyboardInterrupt:
+            print("\nInterrompido; rode o mesmo comando para continuar de onde parou.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    totals["elapsed"] = time.perf_counter() - start
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="arquivo JSONL com as perguntas")
+    parser.add_argument("-o", "--output", required=True, help="arquivo JSONL de saída (também usado para retomar)")
+    parser.add_argument("--parquet", help="também grava a saída em Parquet ao final (requer pyarrow)")
+    parser.add_argument("--engine", choices=["postgresql", "mysql"], required=True)
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--workers", type=int, default=4, help="perguntas processadas em paralelo (com --execute, limitadas também por DB_POOL_MAX_SIZE)")
+    parser.add_argument("--execute", action="store_true", help="executa cada SQL gerada no banco")
+    parser.add_argument("--max-rows", type=int, default=1000, help="linhas de resultado gravadas por pergunta")
+    parser.add_argument("--no-cache", action="store_true", help="ignora os caches de SQL e de resultados")
+    parser.add_argument("--retry-errors", action="store_true", help="ao retomar, refaz as perguntas que falharam")
+    args = parser.parse_args()
+
+    password = os.getenv("DB_PASSWORD") or getpass.getpass("Digite a senha do banco de dados: ")
+    pool = script.get_pool(args.engine, args.user, password, args.database)
+    try:
+        schema, from_cache = script.get_schema_cached(pool, args.engine, args.user, args.database)
+        print(f"Schema carregado ({'cache' if from_cache else 'introspecção completa'}).")
+
+        done_ids = load_done_ids(args.output, retry_errors=args.retry_errors)
+        if done_ids:
+            print(f"Retomando: {len(done_ids)} perguntas já estão em {args.output}.")
+
+        totals = run_batch(
+            read_questions(args.input), args.output, schema,
+            pool=pool if args.execute else None, workers=args.workers, max_rows=args.max_rows,
+            use_cache=not args.no_cache, done_ids=done_ids,
+        )
+    finally:
+        script.close_pools()
+
+    elapsed = totals["elapsed"]
+    rate = totals["processed"] / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"\n{totals['processed']} perguntas em {elapsed:.1f}s ({rate:.1f} perguntas/min): "
+          f"{totals['ok']} ok, {totals['errors']} erros, {totals['cache_hits']} do cache, "
+          f"{totals['skipped']} já processadas.")
+    stats = script.get_sql_cache().stats()
+    print(f"Cache de SQL: {stats['hits']} acertos, {stats['misses']} falhas.")
+    print(script.describe_llm_stats())
+    print(script.describe_singleflight())
+    print(metrics.describe())
+
+    if args.parquet:
+        try:
+            write_parquet(args.output, args.parquet)
+            print(f"Saída também gravada em {args.parquet}.")
+        except ImportError as e:
+            print(f"Não foi possível gravar o Parquet (instale o pyarrow): {e}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: latência de cancelamento e de tempo limite de consultas em um banco local.
+
+Mede quanto tempo passa entre pedir o cancelamento (query_control.cancel_query)
+e a instrução realmente parar, e entre o tempo limite configurado no servidor
+e o erro chegar ao cliente.
+
+Uso:
+    python benchmarks/bench_cancel.py --engine postgresql --user postgres --database meu_banco
+    python benchmarks/bench_cancel.py --engine mysql --user root --database meu_banco --repeat 10
+
+A senha é lida da variável DB_PASSWORD ou pedida no terminal.
+"""
+import argparse
+import getpass
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import query_control  # noqa: E402
+
+# Consultas que ficam rodando até serem interrompidas
+SLOW_QUERIES = {
+    'postgresql': "SELECT pg_sleep(30)",
+    'mysql': "SELECT SLEEP(30)",
+}
+
+def connect(args, password):
+    if args.engine == 'postgresql':
+        import psycopg2
+        return psycopg2.connect(host=args.host, dbname=args.database, user=args.user, password=password)
+    import pymysql
+    return pymysql.connect(host=args.host, user=args.user, password=password, database=args.database)
+
+def run_slow_query(conn, engine, finished):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SLOW_QUERIES[engine])
+        cursor.fetchall()
+    except Exception as e:
+        finished['error'] = e
+    finally:
+        finished['at'] = time.perf_counter()
+        cursor.close()
+
+def measure_cancel(conn, engine, delay):
+    """Inicia a consulta lenta, cancela após delay segundos e mede até ela parar."""
+    finished = {}
+    worker = threading.Thread(target=run_slow_query, args=(conn, engine, finished))
+    worker.start()
+    time.sleep(delay)
+    start = time.perf_counter()
+    query_control.cancel_query(conn)
+    worker.join()
+    conn.rollback()
+    return finished['at'] - start, finished.get('error')
+
+def measure_timeout(conn, engine, timeout):
+    """Roda a consulta lenta com tempo limite no servidor e mede o atraso além do limite."""
+    query_control.set_query_timeout(conn, timeout)
+    finished = {}
+    start = time.perf_counter()
+    run_slow_query(conn, engine, finished)
+    conn.rollback()
+    query_control.set_query_timeout(conn, 0)
+    return finished['at'] - start - timeout, finished.get('error')
+
+def summarize(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:<22} mediana {statistics.median(ms):8.1f} ms   máx {max(ms):8.1f} ms   (n={len(ms)})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=["postgresql", "mysql"], required=True)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.5, help="segundos antes de cancelar")
+    parser.add_argument("--timeout", type=float, default=1.0, help="tempo limite no servidor (s)")
+    args = parser.parse_args()
+
+    password = os.getenv("DB_PASSWORD") or getpass.getpass("Senha do banco de dados: ")
+    conn = connect(args, password)
+    try:
+        cancel_samples = []
+        for _ in range(args.repeat):
+            latency, error = measure_cancel(conn, args.engine, args.delay)
+            cancel_samples.append(latency)
+        print(f"Último erro de cancelamento: {error!r}")
+
+        timeout_samples = []
+        for _ in range(args.repeat):
+            overshoot, error = measure_timeout(conn, args.engine, args.timeout)
+            timeout_samples.append(overshoot)
+        print(f"Último erro de tempo limite: {error!r}\n")
+
+        summarize("cancelamento", cancel_samples)
+        summarize("atraso do tempo limite", timeout_samples)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Benchmark: latência por etapa do pipeline pergunta -> SQL -> resultado, totalmente offline.
+
+Usa o modelo falso (fake_llm.py) com latência configurável e SQL pré-definida,
+e bancos SQLite gerados localmente com --tables tabelas e uma tabela de fatos
+("vendas") com --rows linhas. Para cada tamanho de schema, mede cada etapa:
+
+    get_schema  -> introspecção do catálogo
+    prompt      -> poda do schema e montagem do prompt
+    generate    -> chamada ao modelo (falso) e limpeza da resposta
+    execute     -> execução da SQL e leitura de todas as linhas
+    render      -> DataFrame + texto, como na saída da CLI
+
+e grava p50/p95/p99 (ms) em JSON, para comparar entre commits com --compare.
+
+Uso:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --tables 10 500 5000 --rows 1000000 --repeat 50
+    python benchmarks/bench_pipeline.py --output atual.json --compare benchmarks/results/pipeline-abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Sem chave de API e sem cache em disco compartilhado com o uso normal
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("TEXT_TO_SQL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "text-to-sql-bench"))
+
+import fake_llm  # noqa: E402
+import llm_client  # noqa: E402
+import script  # noqa: E402
+
+STAGES = ["get_schema", "prompt", "generate", "execute", "render"]
+
+# (pergunta, SQL devolvida pelo modelo falso); {limit} limita as consultas sem agregação
+QUESTIONS = [
+    ("Quantas vendas existem no total?", "SELECT COUNT(*) FROM vendas;"),
+    ("Qual o valor total vendido por tabela_1?",
+     "SELECT tabela_1_id, SUM(valor) AS total FROM vendas GROUP BY tabela_1_id ORDER BY total DESC;"),
+    ("Mostre as últimas vendas", "SELECT * FROM vendas ORDER BY criado_em DESC LIMIT {limit};"),
+    ("Liste as vendas com o nome de tabela_1",
+     "SELECT v.id, v.valor, t.nome FROM vendas v JOIN tabela_1 t ON t.id = v.tabela_1_id LIMIT {limit};"),
+    ("Quais registros de tabela_2 têm valor acima da média?",
+     "SELECT * FROM tabela_2 WHERE valor > (SELECT AVG(valor) FROM tabela_2);"),
+]
+
+# --- FIXTURES ---
+
+def fixture_path(directory, n_tables, n_rows):
+    return os.path.join(directory, f"pipeline_{n_tables}t_{n_rows}r.sqlite")
+
+def build_fixture(path, n_tables, n_rows, dimension_rows=100, seed=42):
+    """Cria o banco: n_tables tabelas de dimensão encadeadas por FK e a tabela de fatos."""
+    rng = random.Random(seed)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for i in range(1, n_tables):
+        parent = f", tabela_{i - 1}_id INTEGER REFERENCES tabela_{i - 1}(id)" if i > 1 else ""
+        conn.execute(f"CREATE TABLE tabela_{i} (id INTEGER PRIMARY KEY, nome TEXT, valor REAL, "
+                     f"criado_em TEXT{parent})")
+        conn.executemany(
+            f"INSERT INTO tabela_{i} (id, nome, valor, criado_em) VALUES (?, ?, ?, ?)",
+            ((r, f"{i}-{r}", rng.random() * 100, f"2024-01-{r % 28 + 1:02d}") for r in range(1, dimension_rows + 1)),
+        )
+    conn.execute("CREATE TABLE vendas (id INTEGER PRIMARY KEY, tabela_1_id INTEGER REFERENCES tabela_1(id), "
+                 "valor REAL, quantidade INTEGER, criado_em TEXT)")
+    batch_size = 100_000
+    for start in range(0, n_rows, batch_size):
+        conn.executemany(
+            "INSERT INTO vendas VALUES (?, ?, ?, ?, ?)",
+            ((r, rng.randint(1, dimension_rows), round(rng.random() * 1000, 2), rng.randint(1, 10),
+              f"2024-{r % 12 + 1:02d}-{r % 28 + 1:02d}") for r in range(start + 1, min(n_rows, start + batch_size) + 1)),
+        )
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+def get_fixture(directory, n_tables, n_rows):
+    """Retorna o caminho da fixture, gerando-a só na primeira vez."""
+    path = fixture_path(directory, n_tables, n_rows)
+    if not os.path.exists(path):
+        print(f"Gerando fixture: {n_tables} tabelas, {n_rows} linhas em vendas...")
+        start = time.perf_counter()
+        build_fixture(path, n_tables, n_rows)
+        print(f"  pronta em {time.perf_counter() - start:.1f}s ({path})")
+    return path
+
+# --- MEDIÇÃO ---
+
+def percentile(samples, p):
+    """Percentil p (0-100) com interpolação linear entre as amostras ordenadas."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+def summarize(samples):
+    ms = [s * 1000 for s in samples]
+    return {"n": len(ms), "p50": percentile(ms, 50), "p95": percentile(ms, 95), "p99": percentile(ms, 99),
+            "max": max(ms)}
+
+def canned_responder(limit):
+    """Responde com a SQL pré-definida da pergunta contida no prompt."""
+    answers = {pergunta: sql.format(limit=limit) for pergunta, sql in QUESTIONS}
+
+    def respond(prompt):
+        pergunta = prompt.rsplit('Pergunta: "', 1)[1].split('"', 1)[0]
+        return answers[pergunta]
+    return respond
+
+def run_fixture(path, repeat, limit):
+    """Roda repeat perguntas na fixture e retorna {etapa: [segundos, ...]}."""
+    timings = {stage: [] for stage in STAGES}
+    conn = sqlite3.connect(path)
+    try:
+        for i in range(repeat):
+            pergunta, _ = QUESTIONS[i % len(QUESTIONS)]
+
+            start = time.perf_counter()
+            schema = script.get_schema(conn, 'sqlite')
+            timings["get_schema"].append(time.perf_counter() - start)
+
+            info = {}
+            start = time.perf_counter()
+            prompt, cache_key, _ = script._prepare_generation(schema, pergunta, use_cache=False, prune=True, info=info)
+            timings["prompt"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            response = script.get_llm_client().generate_content(prompt.text)
+            sql_query = script._extract_sql(response, cache_key)
+            timings["generate"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rows, columns = script.execute_sql(conn, sql_query)
+            timings["execute"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rows.to_pandas().to_string()
+            timings["render"].append(time.perf_counter() - start)
+    finally:
+        conn.close()
+    return timings
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+def print_comparison(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    old = {(r["tables"], r["rows"]): r["stages"] for r in previous["results"]}
+    print(f"\nComparação com {previous_path} (commit {previous.get('commit')}): variação do p50 / p95")
+    for result in current["results"]:
+        before = old.get((result["tables"], result["rows"]))
+        if before is None:
+            continue
+        parts = []
+        for stage in STAGES:
+            if stage not in before:
+                continue
+            now, then = result["stages"][stage], before[stage]
+            parts.append(f"{stage} {_delta(now['p50'], then['p50'])} / {_delta(now['p95'], then['p95'])}")
+        print(f"  {result['tables']:>5} tabelas: " + "   ".join(parts))
+
+def _delta(now, then):
+    if not then:
+        return "-"
+    return f"{(now - then) / then * 100:+.0f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--rows", type=int, default=100_000, help="linhas da tabela de fatos")
+    parser.add_argument("--repeat", type=int, default=30, help="perguntas por tamanho de schema")
+    parser.add_argument("--limit", type=int, default=10_000, help="LIMIT das consultas sem agregação")
+    parser.add_argument("--latency", type=float, default=0.05, help="latência do modelo falso (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="variação da latência do modelo falso (s)")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "text-to-sql-fixtures"))
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+    if min(args.tables) < 3:
+        parser.error("--tables precisa ser pelo menos 3 (as perguntas usam tabela_1 e tabela_2)")
+
+    os.makedirs(args.fixtures_dir, exist_ok=True)
+    # Modelo falso sem limite de taxa: o benchmark mede o pipeline, não a cota
+    script.model = fake_llm.FakeModel(latency=args.latency, jitter=args.jitter,
+                                      responder=canned_responder(args.limit), seed=0)
+    script._llm_client = llm_client.LLMClient(script.model, bucket=llm_client.TokenBucket(rate_per_minute=0))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "fixtures_dir")},
+        "results": [],
+    }
+
+    header = f"{'tabelas':>7} " + " ".join(f"{stage + ' p50/p95/p99':>26}" for stage in STAGES)
+    print(header)
+    for n_tables in args.tables:
+        path = get_fixture(args.fixtures_dir, n_tables, args.rows)
+        stages = {stage: summarize(samples) for stage, samples in run_fixture(path, args.repeat, args.limit).items()}
+        report["results"].append({"tables": n_tables, "rows": args.rows, "stages": stages})
+        print(f"{n_tables:>7} " + " ".join(
+            f"{s['p50']:>8.1f}/{s['p95']:>7.1f}/{s['p99']:>7.1f}ms" for s in stages.values()))
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"pipeline-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados gravados em {output}")
+
+    if args.compare:
+        print_comparison(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark: tamanho e montagem do prompt, schema verboso x compacto x cache de contexto.
+
+Gera schemas sintéticos com --tables tabelas (tipos variados, como os do
+PostgreSQL e do MySQL) e, para cada tamanho, compara:
+
+    verboso   -> texto "Tabela: / - coluna: tipo" em um template com .format()
+    compacto  -> prompts.build_prompt (uma linha por tabela, tipos abreviados,
+                 prefixo montado uma vez por schema)
+    contexto  -> compacto com o prefixo no cache de contexto (LocalContextCache):
+                 só o trecho da pergunta é enviado a cada chamada
+
+Mostra caracteres, tokens estimados enviados por pergunta e o tempo de montagem.
+O schema não é podado, para comparar só a codificação.
+
+Uso:
+    python benchmarks/bench_prompt.py
+    python benchmarks/bench_prompt.py --tables 10 200 2000 --questions 500
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context_cache  # noqa: E402
+import introspection  # noqa: E402
+import prompts  # noqa: E402
+import schema_pruning  # noqa: E402
+
+# Tipos como vêm do catálogo, em rodízio
+COLUMN_TYPES = ["integer", "character varying", "numeric", "timestamp without time zone", "bigint", "text",
+                "boolean", "date", "varchar(255)", "int(11)", "decimal(10,2)", "datetime", "double precision"]
+
+# Template no formato anterior (sem as legendas de tipos e marcadores), para comparação
+VERBOSE_TEMPLATE = re.sub(r"(### SCHEMA DO BANCO DE DADOS ###\n).*?(\{schema\})", r"\1\2", prompts.PREFIX_TEMPLATE,
+                          flags=re.DOTALL) + prompts.QUESTION_TEMPLATE
+
+def make_schema(n_tables, columns_per_table=8):
+    tables = []
+    for t in range(n_tables):
+        columns = [("id", "integer")] + [
+            (f"coluna_{c}", COLUMN_TYPES[(t + c) % len(COLUMN_TYPES)]) for c in range(1, columns_per_table)]
+        foreign_keys, indexes = (), ()
+        if t:
+            parent = f"tabela_{t - 1}_id"
+            columns.append((parent, "integer"))
+            foreign_keys = (introspection.ForeignKey((parent,), f"tabela_{t - 1}", ("id",)),)
+            indexes = (introspection.Index(f"tabela_{t}_{parent}_idx", (parent,), False),)
+        tables.append(introspection.Table(f"tabela_{t}", columns, ("id",), foreign_keys, indexes,
+                                          introspection.round_rows(1000 * (t + 1) ** 2)))
+    return introspection.format_schema(tables)
+
+def measure(build, questions):
+    start = time.perf_counter()
+    sent = 0
+    for pergunta in questions:
+        sent += len(build(pergunta))
+    return sent / len(questions), (time.perf_counter() - start) / len(questions)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--questions", type=int, default=200)
+    args = parser.parse_args()
+
+    questions = [f"Qual o total da coluna_{i % 7} por tabela_{i % 5} no mês {i % 12 + 1}?"
+                 for i in range(args.questions)]
+    print(f"{'tabelas':>7} {'formato':<10} {'chars/pergunta':>15} {'~tokens':>9} {'montagem':>10}")
+    for n_tables in args.tables:
+        schema = make_schema(n_tables)
+        cache = context_cache.LocalContextCache(min_tokens=0)
+
+        def verbose(pergunta):
+            return VERBOSE_TEMPLATE.format(schema=schema, pergunta=pergunta)
+
+        def compact(pergunta):
+            return prompts.build_prompt(schema, pergunta).text
+
+        def cached(pergunta):
+            prompt = prompts.build_prompt(schema, pergunta)
+            cache.model_for(prompt.prefix, None)
+            return prompt.question
+
+        for label, build in [("verboso", verbose), ("compacto", compact), ("contexto", cached)]:
+            chars, elapsed = measure(build, questions)
+            tokens = chars / prompts.CHARS_PER_TOKEN
+            print(f"{n_tables:>7} {label:<10} {chars:>15.0f} {tokens:>9.0f} {elapsed * 1e6:>8.1f}µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark: memória por linha de um resultado largo, lista de tuplas x ResultSet colunar.
+
+Simula o que o driver entrega (lotes de tuplas com inteiros, reais, textos,
+datas, Decimal, booleanos e nulos) e mede, com tracemalloc, a memória retida
+depois de montar o resultado inteiro:
+
+    tuplas     -> lista de tuplas, como o execute_sql antigo
+    ResultSet  -> result_set.ResultSet montado lote a lote
+
+Também mede o tempo de montagem e da conversão para pandas
+(pd.DataFrame(lista) x ResultSet.to_pandas()).
+
+Uso:
+    python benchmarks/bench_result_memory.py
+    python benchmarks/bench_result_memory.py --rows 200000 --columns 60 --batch-size 5000
+"""
+import argparse
+import datetime
+import decimal
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import result_set  # noqa: E402
+
+# Tipos das colunas, em rodízio: a maioria das tabelas largas é numérica
+COLUMN_KINDS = ["int", "float", "int", "text", "float", "date", "int_null", "decimal", "bool", "float"]
+
+def make_value(kind, r, c):
+    if kind == "int":
+        return r * 31 + c
+    if kind == "int_null":
+        return None if r % 5 == 0 else r + c
+    if kind == "float":
+        return r * 0.5 + c
+    if kind == "text":
+        return f"cliente {r % 1000}"
+    if kind == "date":
+        return datetime.date(2024, 1, 1) + datetime.timedelta(days=r % 365)
+    if kind == "decimal":
+        return decimal.Decimal(r % 10000) / 100
+    return r % 2 == 0
+
+def driver_batches(n_rows, n_columns, batch_size):
+    """Lotes de tuplas como os de cursor.fetchmany()."""
+    kinds = [COLUMN_KINDS[c % len(COLUMN_KINDS)] for c in range(n_columns)]
+    for start in range(0, n_rows, batch_size):
+        yield [tuple(make_value(kind, r, c) for c, kind in enumerate(kinds))
+               for r in range(start, min(n_rows, start + batch_size))]
+
+def build_tuples(batches, columns):
+    rows = []
+    for batch in batches:
+        rows.extend(batch)
+    return rows
+
+def build_result_set(batches, columns):
+    result = result_set.ResultSet(columns)
+    for batch in batches:
+        result.append(batch)
+    return result
+
+def measure(build, n_rows, n_columns, batch_size):
+    columns = [f"coluna_{c}" for c in range(n_columns)]
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(driver_batches(n_rows, n_columns, batch_size), columns)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if isinstance(result, result_set.ResultSet):
+        df = result.to_pandas()
+    else:
+        df = pd.DataFrame(result, columns=columns)
+    to_pandas = time.perf_counter() - start
+    del df, result
+    return elapsed, retained, peak, to_pandas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} linhas x {args.columns} colunas, lotes de {args.batch_size}")
+    print(f"{'formato':<10} {'montagem':>10} {'retido':>10} {'por linha':>11} {'pico':>10} {'-> pandas':>10}")
+    for label, build in [("tuplas", build_tuples), ("ResultSet", build_result_set)]:
+        elapsed, retained, peak, to_pandas = measure(build, args.rows, args.columns, args.batch_size)
+        print(f"{label:<10} {elapsed:>9.2f}s {retained / 1024 / 1024:>7.1f} MB {retained / args.rows:>9.0f} B "
+              f"{peak / 1024 / 1024:>7.1f} MB {to_pandas * 1000:>7.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: tempo de renderização e memória da tabela de resultados da GUI.
+
+Compara a tabela virtualizada (results_grid.VirtualResultsGrid) com a tabela
+antiga, que criava um CTkLabel por célula. A tabela antiga só é medida até
+--legacy-max linhas, pois acima disso a janela congela por minutos.
+
+Uso (requer um display):
+    python benchmarks/bench_results_grid.py
+    python benchmarks/bench_results_grid.py --rows 1000 100000 1000000 --columns 10
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customtkinter as ctk  # noqa: E402
+
+import results_grid  # noqa: E402
+
+def make_rows(n_rows, n_columns):
+    return [tuple(f"valor {r}-{c}" if c % 2 else r * c for c in range(n_columns)) for r in range(n_rows)]
+
+def legacy_render(parent, rows, columns):
+    """Reproduz a tabela antiga: um frame por linha e um label por célula."""
+    container = ctk.CTkScrollableFrame(parent, height=220)
+    container.pack(fill="both", expand=True)
+    header = ctk.CTkFrame(container)
+    header.pack(fill="x")
+    for i, coluna in enumerate(["#"] + columns):
+        ctk.CTkLabel(header, text=coluna, width=140).grid(row=0, column=i)
+    for row_idx, linha in enumerate(rows):
+        row_frame = ctk.CTkFrame(container)
+        row_frame.pack(fill="x")
+        ctk.CTkLabel(row_frame, text=str(row_idx + 1), width=50).grid(row=0, column=0)
+        for col_idx, valor in enumerate(linha):
+            text = str(valor)[:45] + "..." if len(str(valor)) > 45 else str(valor)
+            ctk.CTkLabel(row_frame, text=text, width=140).grid(row=0, column=col_idx + 1)
+    return container
+
+def virtual_render(parent, rows, columns):
+    grid = results_grid.VirtualResultsGrid(parent, visible_rows=10)
+    grid.pack(fill="both", expand=True)
+    grid.set_columns(columns)
+    grid.set_source(rows)
+    return grid
+
+def measure(root, render, rows, columns):
+    frame = ctk.CTkFrame(root)
+    frame.pack(fill="both", expand=True)
+    tracemalloc.start()
+    start = time.perf_counter()
+    widget = render(frame, rows, columns)
+    root.update()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    scroll_time = None
+    if isinstance(widget, results_grid.VirtualResultsGrid):
+        # Rolagem: 100 saltos pela tabela inteira
+        start = time.perf_counter()
+        for step in range(100):
+            widget.offset = step * len(rows) // 100
+            widget.render()
+            root.update_idletasks()
+        scroll_time = (time.perf_counter() - start) / 100
+    frame.destroy()
+    root.update()
+    return elapsed, peak, scroll_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--legacy-max", type=int, default=1000,
+                        help="maior quantidade de linhas medida na tabela antiga")
+    args = parser.parse_args()
+
+    root = ctk.CTk()
+    root.geometry("1200x600")
+    columns = [f"coluna_{c}" for c in range(args.columns)]
+
+    print(f"{'tabela':<12} {'linhas':>9} {'render':>10} {'pico mem.':>12} {'rolagem':>10}")
+    for n_rows in args.rows:
+        rows = make_rows(n_rows, args.columns)
+        candidates = [("virtual", virtual_render)]
+        if n_rows <= args.legacy_max:
+            candidates.insert(0, ("antiga", legacy_render))
+        for label, render in candidates:
+            elapsed, peak, scroll_time = measure(root, render, rows, columns)
+            scroll = f"{scroll_time * 1000:.1f} ms" if scroll_time is not None else "-"
+            print(f"{label:<12} {n_rows:>9} {elapsed:>9.3f}s {peak / 1024 / 1024:>9.1f} MB {scroll:>10}")
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
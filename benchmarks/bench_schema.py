@@ -0,0 +1,151 @@
+"""Benchmark: introspecção do schema em massa vs. o loop antigo (uma consulta por tabela).
+
+A introspecção em massa também lê chaves, índices e linhas estimadas (três
+consultas ao catálogo no total, independentemente do número de tabelas).
+
+Uso:
+    python benchmarks/bench_schema.py --engine postgresql --user postgres --database meu_banco
+    python benchmarks/bench_schema.py --engine mysql --user root --database meu_banco --create-tables 1500
+
+A senha é lida da variável DB_PASSWORD ou pedida no terminal.
+"""
+import argparse
+import getpass
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import introspection  # noqa: E402
+
+BENCH_PREFIX = "bench_schema_t"
+
+class CountingConnection:
+    """Envolve uma conexão DB-API contando as idas ao servidor (cursor.execute)."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.round_trips = 0
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self, self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class CountingCursor:
+    def __init__(self, owner, cursor):
+        self._owner = owner
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        self._owner.round_trips += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+def legacy_get_schema(db, db_engine):
+    """Implementação anterior de script.get_schema, mantida como referência."""
+    cursor = db.cursor()
+    schema_parts = []
+    if db_engine == 'postgresql':
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema='public'")
+        tables = [row[0] for row in cursor.fetchall()]
+        for table in tables:
+            schema_parts.append(f"Tabela: {table}")
+            cursor.execute(f"""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_schema='public' AND table_name='{table}'
+                ORDER BY ordinal_position
+            """)
+            columns = cursor.fetchall()
+            for col_name, col_type in columns:
+                schema_parts.append(f"  - {col_name}: {col_type}")
+            schema_parts.append("")
+    else:  # MySQL
+        cursor.execute("SHOW TABLES")
+        tables = [row[0] for row in cursor.fetchall()]
+        for table in tables:
+            schema_parts.append(f"Tabela: {table}")
+            cursor.execute(f"DESCRIBE {table}")
+            columns = cursor.fetchall()
+            for col in columns:
+                schema_parts.append(f"  - {col[0]}: {col[1]}")
+            schema_parts.append("")
+    cursor.close()
+    return "\n".join(schema_parts)
+
+def bulk_get_schema(db, db_engine):
+    return introspection.format_schema(introspection.fetch_tables(db, db_engine))
+
+def connect(args, password):
+    if args.engine == 'postgresql':
+        import psycopg2
+        return psycopg2.connect(host=args.host, dbname=args.database, user=args.user, password=password)
+    import pymysql
+    return pymysql.connect(host=args.host, user=args.user, password=password, database=args.database)
+
+def create_bench_tables(conn, count, columns):
+    """Cria tabelas sintéticas no schema padrão para simular um warehouse grande."""
+    cursor = conn.cursor()
+    cols = ", ".join(f"c{i} varchar(50)" for i in range(columns))
+    for i in range(count):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {BENCH_PREFIX}{i} (id integer primary key, {cols})")
+    conn.commit()
+    cursor.close()
+
+def drop_bench_tables(conn, count):
+    cursor = conn.cursor()
+    for i in range(count):
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_PREFIX}{i}")
+    conn.commit()
+    cursor.close()
+
+def run(label, func, conn, engine, repeat):
+    timings = []
+    round_trips = 0
+    schema = ""
+    for _ in range(repeat):
+        counting = CountingConnection(conn)
+        start = time.perf_counter()
+        schema = func(counting, engine)
+        timings.append(time.perf_counter() - start)
+        round_trips = counting.round_trips
+    tables = schema.count("Tabela: ")
+    print(f"{label:<10} {round_trips:>12} {tables:>8} {min(timings):>10.3f}s {statistics.median(timings):>10.3f}s")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=["postgresql", "mysql"], required=True)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--database", required=True)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--create-tables", type=int, default=0,
+                        help="cria N tabelas sintéticas antes do benchmark e as remove no final")
+    parser.add_argument("--columns", type=int, default=10, help="colunas por tabela sintética")
+    args = parser.parse_args()
+
+    password = os.getenv("DB_PASSWORD") or getpass.getpass("Senha do banco de dados: ")
+    conn = connect(args, password)
+    try:
+        if args.create_tables:
+            print(f"Criando {args.create_tables} tabelas sintéticas...")
+            create_bench_tables(conn, args.create_tables, args.columns)
+
+        print(f"\n{'método':<10} {'idas ao BD':>12} {'tabelas':>8} {'mínimo':>11} {'mediana':>11}")
+        legacy = run("loop", legacy_get_schema, conn, args.engine, args.repeat)
+        bulk = run("em massa", bulk_get_schema, conn, args.engine, args.repeat)
+        print(f"\nGanho (mediana): {statistics.median(legacy) / statistics.median(bulk):.1f}x")
+    finally:
+        if args.create_tables:
+            drop_bench_tables(conn, args.create_tables)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
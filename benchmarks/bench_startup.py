@@ -0,0 +1,83 @@
+"""Benchmark: tempo de inicialização (importação) dos pontos de entrada.
+
+Importa cada módulo em um processo novo com python -X importtime e mostra, pela
+mediana de --repeat execuções:
+
+    total     -> tempo acumulado da importação do módulo (inclui dependências)
+    processo  -> tempo de parede do processo inteiro (inclui o interpretador)
+    pesados   -> quais módulos caros (pandas, NumPy, drivers, google.generativeai,
+                 asyncio) foram carregados já na importação; no servidor, o
+                 asyncio é esperado
+
+Com --top, lista também os módulos de maior custo próprio da última execução.
+As variáveis de ambiente do processo atual são repassadas (ex.: LLM_BACKEND).
+
+Uso:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --modules script gui --repeat 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que não deveriam ser importados só para abrir a aplicação
+HEAVY_MODULES = ["pandas", "numpy", "psycopg2", "pymysql", "google.generativeai", "asyncio"]
+
+def import_times(module):
+    """Importa o módulo em um processo novo.
+
+    Retorna (tempo de parede em s, {módulo: (próprio µs, acumulado µs)}).
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")])))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"falha ao importar {module}:\n{result.stderr.strip().splitlines()[-1]}")
+
+    # Linhas no formato "import time:   self |  cumulative | [espaços]nome"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall, times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["script", "gui", "batch", "server"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="módulos mais caros a listar por ponto de entrada")
+    args = parser.parse_args()
+
+    print(f"{'módulo':<8} {'total':>9} {'processo':>9}  pesados")
+    for module in args.modules:
+        totals, walls = [], []
+        for _ in range(args.repeat):
+            try:
+                wall, times = import_times(module)
+            except RuntimeError as e:
+                print(f"{module:<8} {e}")
+                break
+            walls.append(wall)
+            totals.append(times[module][1] if module in times else 0)
+        else:
+            heavy = [name for name in HEAVY_MODULES if name in times]
+            print(f"{module:<8} {statistics.median(totals) / 1000:>7.0f}ms "
+                  f"{statistics.median(walls) * 1000:>7.0f}ms  {', '.join(heavy) or '-'}")
+            if args.top:
+                ranked = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+                for name, (self_us, cumulative_us) in ranked:
+                    print(f"{'':<8} {self_us / 1000:>7.1f}ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import metrics
+import singleflight
+from prompts import estimate_tokens
+
+# --- CACHE DE CONTEXTO DO PREFIXO DO PROMPT ---
+# O prefixo do prompt (instruções + schema + exemplos, ver prompts.py) é igual
+# para todas as perguntas sobre o mesmo schema. Com o cache de contexto, ele é
+# registrado uma vez no modelo e cada pergunta envia só o próprio trecho; os
+# tokens do prefixo são cobrados a um preço reduzido enquanto o cache existir.
+# Implementações:
+#   - GeminiContextCache: caching.CachedContent do google.generativeai, com TTL;
+#   - LocalContextCache: imitação local para testes, que envia prefixo + pergunta
+#     ao modelo (fake_llm, cassette) mas contabiliza o prefixo como em cache.
+# Prefixos menores que CONTEXT_CACHE_MIN_TOKENS não vão para o cache (o Gemini
+# recusa caches pequenos), e o prompt é enviado inteiro como antes.
+# O Gemini só cria caches para modelos versionados: sem CONTEXT_CACHE_MODEL, o
+# modelo padrão ("-latest") não tem cache de contexto.
+
+# 'auto' (Gemini quando o modelo real está em uso e há um modelo versionado), 'gemini', 'local' ou 'off'
+MODE = os.getenv("CONTEXT_CACHE", "auto").lower()
+# Mínimo de tokens do prefixo (o Gemini 1.5 exige 32768)
+MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "32768"))
+# Tempo de vida (s) de cada cache no servidor
+TTL = int(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+# Prefixos mantidos ao mesmo tempo; o menos usado é apagado do servidor
+MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "8"))
+# Modelo versionado usado no cache (o Gemini não aceita aliases como "-latest")
+MODEL_NAME = os.getenv("CONTEXT_CACHE_MODEL")
+
+# Um cache não é usado nos últimos EXPIRY_MARGIN segundos antes de expirar
+EXPIRY_MARGIN = 60
+
+# model: objeto com generate_content(trecho, stream=...) que já conhece o prefixo
+CachedPrefix = namedtuple("CachedPrefix", "model tokens expires_at handle")
+
+class ContextCache:
+    """Registra prefixos de prompt e devolve um modelo que só precisa receber o restante.
+
+    Subclasses implementam _create(prefix, model) -> CachedPrefix e, se o cache
+    ocupar recursos no servidor, _delete(entry).
+    """
+
+    name = "base"
+
+    def __init__(self, min_tokens=MIN_TOKENS, ttl=TTL, max_entries=MAX_ENTRIES):
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (prefixo, id do modelo) -> CachedPrefix; model None: a criação falhou, não tentar de novo até expirar
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # A criação (chamada de rede) roda fora do lock; perguntas simultâneas
+        # sobre o mesmo prefixo esperam a mesma criação
+        self._flight = singleflight.SingleFlight("context_cache")
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def accepts(self, prefix):
+        """Indica se o prefixo é grande o bastante para ir para o cache."""
+        return estimate_tokens(prefix) >= self.min_tokens
+
+    def model_for(self, prefix, model):
+        """Modelo ligado ao prefixo em cache (criado na primeira vez), ou None para enviar o prompt inteiro."""
+        if not self.accepts(prefix):
+            return None
+        # O prefixo vem do cache de prompts.prefix_for: o hash da str já está calculado
+        key = (prefix, id(model))
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and time.time() < entry.expires_at - EXPIRY_MARGIN
+            if fresh:
+                self._entries.move_to_end(key)
+        if fresh:
+            if entry.model is not None:
+                self._hit()
+            return entry.model
+        entry, shared = self._flight.do(key, self._create_entry, key, prefix, model)
+        if shared and entry.model is not None:
+            self._hit()
+        return entry.model
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
+        metrics.inc("cache_requests_total", cache="context", result="hit")
+
+    def _create_entry(self, key, prefix, model):
+        with self._lock:
+            self.misses += 1
+        metrics.inc("cache_requests_total", cache="context", result="miss")
+        try:
+            entry = self._create(prefix, model)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            print(f"Aviso: cache de contexto indisponível, enviando o prompt inteiro: {e}")
+            entry = CachedPrefix(None, 0, time.time() + self.ttl, None)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._delete(old)
+        return entry
+
+    def _create(self, prefix, model):
+        raise NotImplementedError
+
+    def _delete(self, entry):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "hits": self.hits, "misses": self.misses, "failures": self.failures,
+                    "entries": sum(1 for e in self._entries.values() if e.model is not None),
+                    "tokens": sum(e.tokens for e in self._entries.values() if e.model is not None)}
+
+class _LocalCachedModel:
+    """Modelo com o prefixo "em cache": repassa prefixo + trecho ao modelo original."""
+
+    def __init__(self, model, prefix, cached_tokens):
+        self.model = model
+        self.prefix = prefix
+        self.cached_tokens = cached_tokens
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self.model.generate_content(self.prefix + prompt, stream=True)
+        return self.model.generate_content(self.prefix + prompt)
+
+    async def generate_content_async(self, prompt):
+        return await self.model.generate_content_async(self.prefix + prompt)
+
+class LocalContextCache(ContextCache):
+    """Imitação local do cache de contexto, para testes e benchmarks sem a API."""
+
+    name = "local"
+
+    def _create(self, prefix, model):
+        tokens = estimate_tokens(prefix)
+        return CachedPrefix(_LocalCachedModel(model, prefix, tokens), tokens, time.time() + self.ttl, None)
+
+class GeminiContextCache(ContextCache):
+    """Cache de contexto do Gemini (google.generativeai.caching.CachedContent)."""
+
+    name = "gemini"
+
+    def __init__(self, model_name, **kwargs):
+        super().__init__(**kwargs)
+        self.model_name = model_name
+
+    def _create(self, prefix, model):
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        handle = caching.CachedContent.create(
+            model=self.model_name,
+            display_name="text-to-sql-schema",
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=self.ttl),
+        )
+        cached_model = genai.GenerativeModel.from_cached_content(cached_content=handle)
+        tokens = handle.usage_metadata.total_token_count
+        return CachedPrefix(cached_model, tokens, time.time() + self.ttl, handle)
+
+    def _delete(self, entry):
+        if entry.handle is None:
+            return
+        try:
+            entry.handle.delete()
+        except Exception as e:
+            # Expira sozinho ao fim do TTL
+            print(f"Aviso: não foi possível apagar o cache de contexto: {e}")
+
+def is_versioned(model_name):
+    """Modelos com versão fixa (ex.: gemini-1.5-pro-002), os únicos aceitos no cache; aliases "-latest" não."""
+    return not model_name.endswith("-latest")
+
+def from_env(model_name, gemini_model=False):
+    """Cache configurado por CONTEXT_CACHE, ou None se desativado.
+
+    gemini_model indica que o modelo em uso é o Gemini real (e não o falso ou
+    o do cassette), condição para o modo 'auto' usar o cache do Gemini. O
+    cache do Gemini usa CONTEXT_CACHE_MODEL ou, se ele não estiver definido,
+    model_name; em ambos os casos só com um modelo versionado.
+    """
+    if MODE == "local":
+        return LocalContextCache()
+    if MODE == "gemini" or (MODE == "auto" and gemini_model):
+        name = MODEL_NAME or model_name
+        if is_versioned(name):
+            return GeminiContextCache(name)
+        if MODE == "gemini":
+            print(f"Aviso: cache de contexto desativado, o modelo '{name}' não tem versão fixa "
+                  "(defina CONTEXT_CACHE_MODEL, ex.: gemini-1.5-pro-002).")
+    return None
@@ -0,0 +1,204 @@
+import json
+import os
+import re
+from collections import namedtuple
+
+import db_pool
+from result_stream import detect_engine, is_streamable_query
+
+# --- ESTIMATIVA DE CUSTO ANTES DA EXECUÇÃO ---
+# Antes de rodar a SQL gerada, o plano é pedido ao banco com EXPLAIN em JSON
+# (PostgreSQL: EXPLAIN (FORMAT JSON); MySQL: EXPLAIN FORMAT=JSON) e as linhas
+# e o custo estimados decidem o que fazer:
+#   - linhas acima de LIMIT_ROWS: a consulta recebe um LIMIT e é reestimada;
+#   - custo acima de BLOCK_COST: a consulta é bloqueada;
+#   - custo acima de WARN_COST: a consulta roda, com um aviso.
+# Os limites são por motor, pois as unidades de custo do PostgreSQL e do MySQL
+# não são comparáveis: COST_GUARD_<MOTOR>_<LIMITE>, ex.: COST_GUARD_POSTGRESQL_BLOCK_COST.
+# COST_GUARD=off desativa a verificação.
+
+ENABLED = os.getenv("COST_GUARD", "on").strip().lower() not in ("0", "off", "false", "no")
+
+Thresholds = namedtuple("Thresholds", "warn_cost block_cost limit_rows")
+
+_DEFAULTS = {
+    'postgresql': Thresholds(warn_cost=100_000, block_cost=10_000_000, limit_rows=100_000),
+    'mysql': Thresholds(warn_cost=100_000, block_cost=10_000_000, limit_rows=100_000),
+}
+
+def _thresholds_from_env(engine, defaults):
+    prefix = f"COST_GUARD_{engine.upper()}_"
+    return Thresholds(*(float(os.getenv(prefix + name.upper(), value)) for name, value in defaults._asdict().items()))
+
+THRESHOLDS = {engine: _thresholds_from_env(engine, defaults) for engine, defaults in _DEFAULTS.items()}
+
+# Estimativa do plano: custo total, linhas do resultado e maior número de linhas em um nó do plano
+Estimate = namedtuple("Estimate", "engine cost rows max_node_rows")
+
+# action: 'run', 'warn', 'limit' ou 'block'; sql é a instrução que deve ser executada
+Decision = namedtuple("Decision", "action sql estimate reason")
+
+class CostGuardError(Exception):
+    """A consulta foi bloqueada pela estimativa de custo."""
+
+    def __init__(self, decision):
+        super().__init__(decision.reason)
+        self.decision = decision
+
+def _load_json(value):
+    # psycopg2 já converte o json; o PyMySQL devolve texto
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+def _walk(node, key):
+    """Todos os nós (dicts) da árvore que contêm key."""
+    if isinstance(node, dict):
+        if key in node:
+            yield node
+        for value in node.values():
+            yield from _walk(value, key)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk(item, key)
+
+def parse_postgres_plan(data):
+    plan = _load_json(data)[0]["Plan"]
+    node_rows = [node["Plan Rows"] for node in _walk(plan, "Plan Rows")]
+    return Estimate('postgresql', float(plan["Total Cost"]), float(plan["Plan Rows"]), float(max(node_rows)))
+
+def parse_mysql_plan(data):
+    data = _load_json(data)
+    if "query_block" not in data:
+        # Formato 2 (explain_json_format_version=2, MySQL 8.3+)
+        node_rows = [float(node["estimated_rows"]) for node in _walk(data, "estimated_rows")]
+        return Estimate('mysql', float(data.get("estimated_total_cost", 0)), float(data.get("estimated_rows", 0)),
+                        max(node_rows, default=0.0))
+    block = data["query_block"]
+    cost = float(block.get("cost_info", {}).get("query_cost", 0))
+    produced = [float(node["rows_produced_per_join"]) for node in _walk(block, "rows_produced_per_join")]
+    examined = [float(node["rows_examined_per_scan"]) for node in _walk(block, "rows_examined_per_scan")]
+    # Em um nested loop, a última tabela produz as linhas do resultado
+    rows = produced[-1] if produced else 0.0
+    return Estimate('mysql', cost, rows, max(produced + examined, default=0.0))
+
+def explain(db, sql_query):
+    """Estima custo e linhas da consulta sem executá-la. Levanta o erro do banco se a SQL for inválida.
+
+    Retorna None para motores sem EXPLAIN em JSON (a SQL ainda é validada com EXPLAIN simples).
+    """
+    engine = detect_engine(db)
+    statement = sql_query.strip().rstrip(";")
+    cursor = db.cursor()
+    try:
+        if engine == 'postgresql':
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement)
+            return parse_postgres_plan(cursor.fetchone()[0])
+        if engine == 'mysql':
+            cursor.execute("EXPLAIN FORMAT=JSON " + statement)
+            return parse_mysql_plan(cursor.fetchone()[0])
+        cursor.execute("EXPLAIN " + statement)
+        cursor.fetchall()
+        return None
+    finally:
+        cursor.close()
+        db.rollback()
+
+def _fmt(number):
+    """Número inteiro com separador de milhar brasileiro (1.234.567)."""
+    return f"{number:,.0f}".replace(",", ".")
+
+# Funções de agregação que, sem GROUP BY, reduzem o resultado a uma linha
+_AGGREGATE_RE = re.compile(r"\b(count|sum|avg|min|max|group_concat|string_agg|array_agg|json_arrayagg"
+                           r"|json_objectagg|bool_and|bool_or|bit_and|bit_or|bit_xor|std|stddev|variance)\s*\(",
+                           flags=re.IGNORECASE)
+# Cláusulas no nível de fora que impedem acrescentar um LIMIT no fim
+_TAIL_CLAUSE_RE = re.compile(r"\b(limit|fetch|offset|for|lock|into|procedure)\b", flags=re.IGNORECASE)
+
+def top_level(sql_query):
+    """Texto da instrução sem comentários, strings e o conteúdo dos parênteses (que ficam vazios)."""
+    text = re.sub(r"--[^\n]*|/\*.*?\*/", " ", sql_query, flags=re.DOTALL)
+    text = re.sub(r"'(?:[^'\\]|\\.)*'|\"[^\"]*\"|`[^`]*`", " ? ", text)
+    parts = []
+    depth = 0
+    for c in text:
+        if c == "(":
+            if depth == 0:
+                parts.append(c)
+            depth += 1
+        elif c == ")":
+            depth = max(0, depth - 1)
+            if depth == 0:
+                parts.append(c)
+        elif depth == 0:
+            parts.append(c)
+    return "".join(parts)
+
+def is_single_row_aggregate(sql_query):
+    """SELECT com agregação e sem GROUP BY (ex.: COUNT(*)): o resultado tem uma linha."""
+    text = top_level(sql_query)
+    return (re.match(r"\s*select\b", text, flags=re.IGNORECASE) is not None
+            and _AGGREGATE_RE.search(text) is not None
+            and re.search(r"\b(group\s+by|union|intersect|except|over)\b", text, flags=re.IGNORECASE) is None)
+
+def wrap_with_limit(sql_query, limit, engine='postgresql'):
+    """Acrescenta LIMIT à consulta, ou None se não for possível sem mudar o resultado.
+
+    Se a consulta já tiver LIMIT (ou FOR UPDATE etc.) no nível de fora, no
+    PostgreSQL ela vai para uma subconsulta; no MySQL não, pois a subconsulta
+    falha (erro 1060) quando duas colunas do resultado têm o mesmo nome.
+    """
+    statement = sql_query.strip().rstrip(";").rstrip()
+    if not _TAIL_CLAUSE_RE.search(top_level(statement)):
+        # Em linha nova: a instrução pode terminar em um comentário --
+        return f"{statement}\nLIMIT {int(limit)}"
+    if engine == 'postgresql':
+        return f"SELECT * FROM (\n{statement}\n) AS limited_query LIMIT {int(limit)}"
+    return None
+
+def check(db, sql_query, thresholds=None):
+    """Estima a consulta e decide se ela roda, roda com aviso, recebe um LIMIT ou é bloqueada.
+
+    db pode ser uma conexão ou um pool. Só consultas de leitura são estimadas;
+    as demais (ex.: SHOW TABLES) rodam sem estimativa.
+    """
+    if not ENABLED or not is_streamable_query(sql_query):
+        return Decision('run', sql_query, None, "")
+    with db_pool.borrow(db) as conn:
+        estimate = explain(conn, sql_query)
+        if estimate is None:
+            return Decision('run', sql_query, None, "")
+        limits = thresholds or THRESHOLDS[estimate.engine]
+        if estimate.engine == 'mysql' and is_single_row_aggregate(sql_query):
+            # O plano do MySQL só traz as linhas lidas das tabelas, não as do resultado agregado
+            estimate = estimate._replace(rows=1.0)
+
+        action, reason = 'run', ""
+        if estimate.rows > limits.limit_rows:
+            limited = wrap_with_limit(sql_query, limits.limit_rows, estimate.engine)
+            if limited is None:
+                action = 'warn'
+                reason = f"resultado estimado acima de {_fmt(limits.limit_rows)} linhas"
+            else:
+                sql_query = limited
+                estimate = explain(conn, sql_query)
+                # O plano do MySQL não desconta o LIMIT das linhas estimadas
+                estimate = estimate._replace(rows=min(estimate.rows, limits.limit_rows))
+                action = 'limit'
+                reason = f"resultado limitado a {_fmt(limits.limit_rows)} linhas"
+
+    if estimate.cost > limits.block_cost:
+        return Decision('block', sql_query, estimate,
+                        f"custo estimado {_fmt(estimate.cost)} acima do limite de {_fmt(limits.block_cost)}")
+    if action == 'run' and estimate.cost > limits.warn_cost:
+        action, reason = 'warn', f"custo estimado alto (acima de {_fmt(limits.warn_cost)})"
+    return Decision(action, sql_query, estimate, reason)
+
+def describe(decision):
+    """Texto curto com a estimativa e a decisão, para a CLI e a GUI."""
+    if decision.estimate is None:
+        return "Custo não estimado."
+    estimate = decision.estimate
+    text = (f"Estimativa: ~{_fmt(estimate.rows)} linhas, custo {_fmt(estimate.cost)}"
+            f" (maior etapa ~{_fmt(estimate.max_node_rows)} linhas)")
+    if decision.reason:
+        text += f" — {decision.reason}"
+    return text
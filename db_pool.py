@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- POOL DE CONEXÕES ---
+# Cada (motor, host, usuário, banco) tem seu próprio pool. Conexões devolvidas
+# voltam para a lista de ociosas em vez de serem fechadas, evitando pagar de
+# novo o handshake (TLS/autenticação) a cada listagem, conexão ou consulta.
+# O mesmo pool atende psycopg2 e PyMySQL: o psycopg2.pool não espera por uma
+# conexão livre nem verifica a saúde das conexões, e o PyMySQL não tem pool.
+
+MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+# Tempo máximo (s) esperando uma conexão livre quando o pool está cheio
+ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões ociosas há mais que isso (s) são testadas com SELECT 1 antes do uso
+HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+# Conexões mais velhas que isso (s) são recicladas ao serem devolvidas
+MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera."""
+
+def is_broken(conn):
+    """Indica se a conexão do driver já está fechada/quebrada."""
+    if getattr(conn, "closed", 0):  # psycopg2: closed != 0
+        return True
+    return getattr(conn, "open", True) is False  # PyMySQL: open == False
+
+def _reset(conn):
+    """Desfaz a transação pendente para devolver a conexão limpa. Retorna False se falhar."""
+    try:
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def _healthy(conn):
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+class PooledConnection:
+    """Conexão emprestada do pool. close() a devolve em vez de fechá-la."""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self.raw_connection = conn
+        self.created_at = created_at
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.putconn(self)
+
+    def __getattr__(self, name):
+        return getattr(self.raw_connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ConnectionPool:
+    """Pool de conexões DB-API com tamanho mínimo/máximo e verificação de saúde."""
+
+    def __init__(self, connect, min_size=MIN_SIZE, max_size=MAX_SIZE, acquire_timeout=ACQUIRE_TIMEOUT,
+                 health_check_after=HEALTH_CHECK_AFTER, max_lifetime=MAX_LIFETIME):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self._cond = threading.Condition()
+        self._idle = []  # [(conexão, criada_em, usada_em)], a mais recente no fim
+        self._total = 0
+        self._in_use = 0
+        self._closed = False
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        for _ in range(min(min_size, self.max_size)):
+            now = time.monotonic()
+            self._idle.append((self._new_connection(), now, now))
+            self._total += 1
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self.created += 1
+        return conn
+
+    def getconn(self, timeout=None):
+        """Empresta uma conexão, esperando até timeout segundos se o pool estiver cheio."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("O pool de conexões foi fechado.")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._total < self.max_size:
+                    # Reserva a vaga; a conexão é aberta fora do lock
+                    self._total += 1
+                    entry = None
+                    break
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"Nenhuma conexão livre após {timeout:g}s (máximo {self.max_size}).")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += time.monotonic() - start
+
+        try:
+            if entry is None:
+                conn, created_at = self._new_connection(), time.monotonic()
+            else:
+                conn, created_at, used_at = entry
+                if is_broken(conn) or (time.monotonic() - used_at > self.health_check_after and not _healthy(conn)):
+                    # Conexão quebrada enquanto ociosa: substitui por uma nova
+                    _close_quietly(conn)
+                    with self._cond:
+                        self.discarded += 1
+                    conn, created_at = self._new_connection(), time.monotonic()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn, created_at)
+
+    def putconn(self, pooled, discard=False):
+        """Devolve a conexão; conexões quebradas, velhas ou sujas são descartadas."""
+        conn = pooled.raw_connection
+        if not discard:
+            expired = time.monotonic() - pooled.created_at > self.max_lifetime
+            discard = self._closed or expired or is_broken(conn) or not _reset(conn)
+        if discard:
+            _close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._total -= 1
+                self.discarded += 1
+            else:
+                self._idle.append((conn, pooled.created_at, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "created": self.created,
+                "discarded": self.discarded,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            _close_quietly(conn)
+
+@contextmanager
+def borrow(db):
+    """Usa uma conexão do pool (se db for um ConnectionPool) ou a própria conexão informada."""
+    if isinstance(db, ConnectionPool):
+        conn = db.getconn()
+        try:
+            yield conn
+        finally:
+            conn.close()
+    else:
+        yield db
+
+# Pools por (motor, host, usuário, banco, hash da senha)
+_pools = {}
+_pools_lock = threading.Lock()
+# Lock por chave enquanto o pool é criado (abrir as conexões iniciais é uma ida ao banco)
+_creating = {}
+
+def get_pool(key, connect):
+    """Retorna o pool da chave, criando-o com a função connect na primeira vez.
+
+    A criação roda fora de _pools_lock: um banco lento ou inacessível não
+    trava o acesso aos pools dos outros bancos (nem all_stats).
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+        lock = _creating.setdefault(key, threading.Lock())
+    with lock:
+        with _pools_lock:
+            pool = _pools.get(key)
+        if pool is not None:
+            return pool
+        try:
+            created = ConnectionPool(connect)
+        finally:
+            with _pools_lock:
+                if _creating.get(key) is lock:
+                    del _creating[key]
+        with _pools_lock:
+            pool = _pools.setdefault(key, created)
+    if pool is not created:
+        # Outra thread criou o pool enquanto este era aberto (após uma falha na criação)
+        created.closeall()
+    return pool
+
+def all_stats():
+    """Estatísticas de todos os pools, por chave."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {key: pool.stats() for key, pool in pools.items()}
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
@@ -0,0 +1,204 @@
+import csv
+import gzip
+import io
+import os
+import time
+from collections import namedtuple
+
+import metrics
+from result_stream import DEFAULT_BATCH_SIZE, ResultStream, detect_engine, is_streamable_query
+
+# --- EXPORTAÇÃO EM STREAMING ---
+# A exportação reexecuta a consulta e grava direto no arquivo, sem montar o
+# resultado na memória:
+#   - CSV / CSV.gz no PostgreSQL: COPY (<consulta>) TO STDOUT, com o servidor
+#     gerando o CSV e o cliente só copiando bytes para o arquivo;
+#   - demais casos: as linhas chegam em lotes pelo ResultStream (cursor nomeado
+#     no PostgreSQL, SSCursor sem buffer no MySQL) e cada lote é gravado.
+# Parquet (pyarrow) grava um row group por lote. O arquivo é escrito com um
+# nome temporário e só ganha o nome final quando a exportação termina.
+
+FORMATS = ("csv", "csv.gz", "parquet")
+
+# Progresso informado a on_progress: linhas (estimadas no COPY), bytes gravados e segundos
+Progress = namedtuple("Progress", "rows bytes elapsed")
+ExportResult = namedtuple("ExportResult", "path format rows bytes elapsed method")
+
+# Intervalo mínimo (s) entre chamadas de on_progress
+PROGRESS_INTERVAL = 0.25
+
+def detect_format(path):
+    """Formato pela extensão do arquivo: .csv, .csv.gz/.gz ou .parquet."""
+    lowered = path.lower()
+    if lowered.endswith((".csv.gz", ".gz")):
+        return "csv.gz"
+    if lowered.endswith((".parquet", ".pq")):
+        return "parquet"
+    return "csv"
+
+def rows_per_second(result):
+    return result.rows / result.elapsed if result.elapsed > 0 else 0.0
+
+def describe(result):
+    """Resumo da exportação para a CLI e a GUI."""
+    return (f"{result.rows} linhas exportadas para {os.path.basename(result.path)} em {result.elapsed:.1f} s "
+            f"({rows_per_second(result):.0f} linhas/s, {result.bytes / 1024 / 1024:.1f} MiB, via {result.method})")
+
+class _Reporter:
+    """Chama on_progress no máximo a cada PROGRESS_INTERVAL segundos."""
+
+    def __init__(self, on_progress):
+        self.on_progress = on_progress
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def __call__(self, rows, nbytes, force=False):
+        if self.on_progress is None:
+            return
+        now = time.perf_counter()
+        if force or now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self.on_progress(Progress(rows, nbytes, now - self.start))
+
+class _CopyTarget:
+    """Arquivo de destino do COPY: conta bytes e linhas (fins de linha) enquanto grava."""
+
+    def __init__(self, raw, out, report):
+        self.raw = raw  # arquivo em disco, para contar os bytes gravados
+        self.out = out  # arquivo (ou fluxo gzip) onde o CSV é escrito
+        self.report = report
+        self.lines = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.out.write(data)
+        # Aproximado: campos com quebra de linha entre aspas contam a mais
+        self.lines += data.count(b"\n")
+        self.report(max(0, self.lines - 1), self.raw.tell())
+        return len(data)
+
+def _copy_csv(db, sql_query, raw, compress, report):
+    statement = sql_query.strip().rstrip(";")
+    out = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+    target = _CopyTarget(raw, out, report)
+    cursor = db.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER true)", target)
+        rows = cursor.rowcount if cursor.rowcount >= 0 else max(0, target.lines - 1)
+    finally:
+        cursor.close()
+        if compress:
+            out.close()
+    return rows
+
+def _csv_value(value):
+    # Nulos como campo vazio, como no COPY ... CSV
+    return "" if value is None else value
+
+def _stream_csv(stream, raw, compress, report):
+    if compress:
+        text = gzip.open(raw, "wt", newline="", encoding="utf-8")
+    else:
+        text = io.TextIOWrapper(raw, newline="", encoding="utf-8")
+    rows = 0
+    try:
+        writer = csv.writer(text)
+        writer.writerow(stream.columns)
+        for batch in stream.batches():
+            writer.writerows([_csv_value(v) for v in row] for row in batch)
+            rows += len(batch)
+            text.flush()
+            report(rows, raw.tell())
+    finally:
+        if compress:
+            text.close()  # Fecha o fluxo gzip; o arquivo em disco continua aberto
+        else:
+            text.flush()
+            text.detach()
+    return rows
+
+def _arrow_column(pa, values, field_type=None):
+    """Coluna Arrow; valores que não cabem no tipo da primeira página viram texto, se a coluna for texto."""
+    if field_type is None:
+        array = pa.array(values)
+        # Coluna só com nulos no primeiro lote: grava como texto
+        return array.cast(pa.string()) if pa.types.is_null(array.type) else array
+    try:
+        return pa.array(values, type=field_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not pa.types.is_string(field_type):
+            raise
+        return pa.array([None if v is None else str(v) for v in values], type=field_type)
+
+def _stream_parquet(stream, raw, report):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow).") from e
+
+    writer = None
+    rows = 0
+    try:
+        for batch in stream.batches():
+            data = [list(column) for column in zip(*batch)]
+            if writer is None:
+                arrays = [_arrow_column(pa, values) for values in data]
+                schema = pa.schema([pa.field(name, array.type) for name, array in zip(stream.columns, arrays)])
+                writer = pq.ParquetWriter(raw, schema)
+            else:
+                arrays = [_arrow_column(pa, values, field.type) for values, field in zip(data, writer.schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=writer.schema))
+            rows += len(batch)
+            report(rows, raw.tell())
+        if writer is None:
+            # Resultado vazio: arquivo só com o schema (colunas como texto)
+            writer = pq.ParquetWriter(raw, pa.schema([pa.field(name, pa.string()) for name in stream.columns]))
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def export_query(db, sql_query, path, fmt=None, on_progress=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Executa a consulta e grava o resultado em path (CSV, CSV.gz ou Parquet) em memória limitada.
+
+    on_progress(Progress) é chamado periodicamente; se levantar uma exceção, a
+    exportação é interrompida e o arquivo parcial é removido.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    if not is_streamable_query(sql_query):
+        raise ValueError("Só consultas de leitura (SELECT) podem ser exportadas.")
+    report = _Reporter(on_progress)
+    tmp_path = f"{path}.part"
+    use_copy = fmt != "parquet" and detect_engine(db) == 'postgresql'
+    try:
+        with metrics.span("export", format=fmt) as export_span, open(tmp_path, "wb") as raw:
+            if use_copy:
+                rows = _copy_csv(db, sql_query, raw, fmt == "csv.gz", report)
+                method = "COPY"
+            else:
+                with ResultStream(db, sql_query, batch_size) as stream:
+                    if fmt == "parquet":
+                        rows = _stream_parquet(stream, raw, report)
+                    else:
+                        rows = _stream_csv(stream, raw, fmt == "csv.gz", report)
+                method = "cursor"
+            nbytes = raw.tell()
+            export_span.set(method=method, rows=rows, bytes=nbytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    metrics.inc("export_rows_total", rows, format=fmt)
+    metrics.inc("export_bytes_total", nbytes, format=fmt)
+    report(rows, nbytes, force=True)
+    return ExportResult(path, fmt, rows, nbytes, report.elapsed(), method)
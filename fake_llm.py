@@ -0,0 +1,102 @@
+import os
+import random
+import re
+import threading
+import time
+
+# --- MODELO FALSO PARA TESTES OFFLINE ---
+# Imita a interface do google.generativeai.GenerativeModel usada pelo projeto
+# (generate_content / generate_content_async retornando um objeto com .text),
+# com latência e erros injetados. Ative com LLM_BACKEND=fake; latência e taxas
+# de erro vêm de FAKE_LLM_LATENCY, FAKE_LLM_JITTER, FAKE_LLM_ERROR_RATE e
+# FAKE_LLM_RATE_LIMIT_RATE.
+
+class FakeAPIError(Exception):
+    """Erro no formato das exceções da API (atributo code com o status HTTP)."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+
+def default_responder(prompt):
+    """SQL simples sobre a primeira tabela do schema contido no prompt."""
+    # Schema compacto ("tabela(coluna tipo, ...)") ou no formato "Tabela: nome"
+    match = re.search(r"^([\w.$]+)\(|^Tabela: (\S+)", prompt, flags=re.MULTILINE)
+    table = (match.group(1) or match.group(2)) if match else "dual"
+    return f"SELECT * FROM {table} LIMIT 10;"
+
+def split_chunks(text, chunk_chars=8):
+    """Divide o texto em pedaços, como os de uma resposta em streaming."""
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+
+class FakeModel:
+    """Modelo local com latência e erros (429 e 503) injetados.
+
+    Com stream=True, latency é o tempo até o primeiro pedaço e cada pedaço
+    seguinte leva chunk_latency.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, responder=None, seed=None,
+                 chunk_latency=0.02):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.responder = responder or default_responder
+        self.chunk_latency = chunk_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+            jitter=float(os.getenv("FAKE_LLM_JITTER", "0.0")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0.0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0.0")),
+        )
+
+    def _draw(self):
+        """Sorteia a latência e o erro (se houver) desta chamada."""
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return delay, FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, FakeAPIError(503, "The service is currently unavailable.")
+        return delay, None
+
+    def generate_content(self, prompt, stream=False):
+        delay, error = self._draw()
+        if stream:
+            return self._stream(prompt, delay, error)
+        time.sleep(delay)
+        if error:
+            raise error
+        return FakeResponse(self.responder(prompt))
+
+    def _stream(self, prompt, delay, error):
+        time.sleep(delay)
+        if error:
+            raise error
+        for i, chunk in enumerate(split_chunks(self.responder(prompt))):
+            if i:
+                time.sleep(self.chunk_latency)
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt):
+        import asyncio
+
+        delay, error = self._draw()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return FakeResponse(self.responder(prompt))
@@ -1,12 +1,28 @@
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
-import csv
+import os
+import threading
+import time
 import script
+import query_control
+import cost_guard
+import export
+import result_stream
+import background
+import schema_pruning
+import results_grid
+import result_set
+import metrics
 
 # Configurar o tema global
 ctk.set_appearance_mode("dark")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
+# Linhas de um resultado mantidas na memória e exibidas; o restante só pela exportação
+GUI_MAX_ROWS = int(os.getenv("GUI_MAX_ROWS", "200000"))
+# Lotes de resultado aguardando a thread do Tk; acima disso a leitura do banco espera
+GUI_MAX_PENDING_BATCHES = int(os.getenv("GUI_MAX_PENDING_BATCHES", "8"))
+
 class App:
     def __init__(self, root):
         self.root = root
@@ -28,12 +44,33 @@ class App:
         self.root.minsize(1000, 750)  # Tamanho mínimo maior
         
         # Variáveis da aplicação
-        self.db = None
+        # Pool de conexões do banco selecionado e conexão da consulta em andamento
+        self.pool = None
+        self.active_db = None
+        # Última SQL executada (sem o LIMIT da estimativa de custo), usada na exportação
+        self.last_sql = None
+        # Paginador do último resultado (modo página a página); mantém uma conexão emprestada
+        self.pager = None
         self.db_engine = None
         self.schema = None
         
         # Variável para controlar rolagem contextual
         self.scrolling_widget = None
+
+        # Rede e banco rodam fora do loop do Tk
+        self.worker = background.BackgroundWorker(self.root, max_pending=GUI_MAX_PENDING_BATCHES)
+
+        # Cancelamento da pergunta em andamento
+        self.cancel_requested = False
+        self.cancel_started = 0.0
+
+        # Etapa em andamento e tempos das etapas concluídas (barra de status)
+        self.current_stage = None
+        self.stage_started = 0.0
+        self.stage_timings = []
+        self.stage_ticker = None
+        # Tempo gasto na thread do Tk exibindo os lotes do resultado atual (etapa "render")
+        self.render_time = 0.0
         
         # Cores personalizadas
         self.colors = {
@@ -74,6 +111,9 @@ class App:
         
         # Criar a interface
         self.create_ui()
+
+        # Com a janela pronta, importa drivers, pandas e Gemini em segundo plano (ver script.preload)
+        threading.Thread(target=script.preload, daemon=True).start()
         
     def setup_mouse_wheel_scrolling(self):
         """Configurar rolagem contextual com mouse wheel e touchpad"""
@@ -84,8 +124,8 @@ class App:
                     # Rolar o textbox do schema
                     self.schema_text.yview_scroll(int(-1 * self._get_scroll_delta(event)), "units")
                 elif self.scrolling_widget == "results":
-                    # Rolar o frame de resultados
-                    self.results_scrollable._parent_canvas.yview_scroll(int(-1 * self._get_scroll_delta(event)), "units")
+                    # Rolar a tabela de resultados (linhas virtualizadas)
+                    self.results_grid.scroll_rows(-3 * self._get_scroll_delta(event))
                 return
             
             # Rolagem global padrão
@@ -128,6 +168,10 @@ class App:
             self.scrolling_widget = widget_name
         
         def on_leave(event):
+            # Ignorar a saída para um widget filho (o mouse continua sobre o widget)
+            hovered = widget.winfo_containing(event.x_root, event.y_root)
+            if hovered is not None and (str(hovered) == str(widget) or str(hovered).startswith(str(widget) + ".")):
+                return
             self.scrolling_widget = None
         
         # Bind eventos de entrada e saída do mouse
@@ -297,66 +341,130 @@ class App:
             messagebox.showerror("Entrada Inválida", "SGBD e Usuário são obrigatórios para listar os bancos.")
             return
 
-        try:
-            self.status_label.configure(text="* Listando bancos de dados...", text_color=("#f59e0b", "#fbbf24"))
-            self.root.update()
-
-            available_dbs = script.list_databases(db_engine, user, password)
-
-            if available_dbs:
-                self.dbname_combo.configure(values=available_dbs, state="normal")
-                self.dbname_combo.set(available_dbs[0])
-                self.connect_button.configure(state="normal")
-                self.status_label.configure(text="* Bancos listados. Selecione um e conecte.", text_color=self.colors['accent'])
-            else:
-                messagebox.showwarning("Aviso", "Nenhum banco de dados de usuário foi encontrado.")
-                self.status_label.configure(text="* Nenhum banco de dados encontrado.", text_color=self.colors['warning'])
-                self.dbname_combo.configure(values=[], state="disabled")
-                self.connect_button.configure(state="disabled")
+        self.list_dbs_button.configure(state="disabled")
+        self.start_stage("Listando bancos de dados")
+        self.worker.submit(
+            script.list_databases, db_engine, user, password,
+            on_success=self.on_databases_listed,
+            on_error=self.on_list_databases_error
+        )
 
-        except Exception as e:
-            messagebox.showerror("Erro de Credenciais", f"Não foi possível listar os bancos. Verifique o usuário e senha.\n\nErro: {e}")
-            self.status_label.configure(text="* Erro ao listar bancos.", text_color=self.colors['danger'])
+    def on_databases_listed(self, available_dbs):
+        self.list_dbs_button.configure(state="normal")
+        self.stop_stage()
+        if available_dbs:
+            self.dbname_combo.configure(values=available_dbs, state="normal")
+            self.dbname_combo.set(available_dbs[0])
+            self.connect_button.configure(state="normal")
+            self.status_label.configure(text="* Bancos listados. Selecione um e conecte.", text_color=self.colors['accent'])
+        else:
+            messagebox.showwarning("Aviso", "Nenhum banco de dados de usuário foi encontrado.")
+            self.status_label.configure(text="* Nenhum banco de dados encontrado.", text_color=self.colors['warning'])
             self.dbname_combo.configure(values=[], state="disabled")
             self.connect_button.configure(state="disabled")
 
+    def on_list_databases_error(self, e):
+        self.list_dbs_button.configure(state="normal")
+        self.stop_stage()
+        messagebox.showerror("Erro de Credenciais", f"Não foi possível listar os bancos. Verifique o usuário e senha.\n\nErro: {e}")
+        self.status_label.configure(text="* Erro ao listar bancos.", text_color=self.colors['danger'])
+        self.dbname_combo.configure(values=[], state="disabled")
+        self.connect_button.configure(state="disabled")
+
     def connect_and_load_schema(self):
         # self.db_engine e user já são definidos na listagem, mas pegamos de novo por segurança
-        self.db_engine = self.db_engine_combo.get().strip().lower()
+        db_engine = self.db_engine_combo.get().strip().lower()
         user = self.user_entry.get().strip()
         password = self.password_entry.get().strip()
         dbname = self.dbname_combo.get().strip()
 
-        if not all([self.db_engine, user, dbname]):
+        if not all([db_engine, user, dbname]):
             messagebox.showerror("Erro de Conexão", "SGBD, Usuário e um Banco de Dados selecionado são obrigatórios.")
             return
 
-        try:
-            self.status_label.configure(text="* Conectando ao banco de dados...", text_color=("#f59e0b", "#fbbf24"))
-            self.root.update()
-            
-            self.db = script.connect_db(self.db_engine, user, password, dbname)
-            messagebox.showinfo("Conexão", f"Conectado ao banco de dados '{dbname}' com sucesso!")
-            
-            self.status_label.configure(text="* Carregando schema...", text_color=("#f59e0b", "#fbbf24"))
-            self.root.update()
-            
-            self.schema = script.get_schema(self.db, self.db_engine)
-            self.schema_text.configure(state="normal")
-            self.schema_text.delete("1.0", "end")
-            self.schema_text.insert("1.0", self.schema)
-            self.schema_text.configure(state="disabled")
-            
-            self.generate_sql_button.configure(state="normal")
-            
-            self.status_label.configure(text="* Pronto para consultas!", text_color=("#10b981", "#34d399"))
-        except Exception as e:
-            messagebox.showerror("Erro de Conexão", f"Não foi possível conectar ou carregar o schema: {e}")
-            if self.db:
-                self.db.close()
-                self.db = None
-            self.generate_sql_button.configure(state="disabled")
-            self.status_label.configure(text="* Erro na conexão", text_color=("#ef4444", "#f87171"))
+        self.connect_button.configure(state="disabled")
+        self.start_stage("Conectando ao banco de dados")
+        self.worker.submit(
+            self.load_connection, db_engine, user, password, dbname,
+            on_success=self.on_connection_loaded,
+            on_error=self.on_connection_error
+        )
+
+    def load_connection(self, db_engine, user, password, dbname):
+        """Conecta e carrega o schema (executa na thread de trabalho)."""
+        start = time.perf_counter()
+        pool = script.get_pool(db_engine, user, password, dbname)
+        self.worker.post(self.start_stage, "Carregando schema")
+        # A conexão é emprestada do pool só durante o carregamento
+        schema, from_cache = script.get_schema_cached(pool, db_engine, user, dbname)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        # A troca acontece aqui, na mesma thread que executa as consultas; o pool
+        # anterior continua aberto para uma reconexão rápida ao mesmo banco
+        self.detach_pager()
+        self.pool, self.db_engine, self.schema = pool, db_engine, schema
+        return dbname, from_cache, total_ms
+
+    def on_connection_loaded(self, result):
+        dbname, from_cache, total_ms = result
+        self.stop_stage()
+        self.connect_button.configure(state="normal")
+
+        self.schema_text.configure(state="normal")
+        self.schema_text.delete("1.0", "end")
+        self.schema_text.insert("1.0", self.schema)
+        self.schema_text.configure(state="disabled")
+
+        self.generate_sql_button.configure(state="normal")
+        self.update_page_controls(None)
+
+        origem = "schema do cache" if from_cache else "schema introspectado"
+        self.status_label.configure(
+            text=f"* Pronto para consultas! ({origem}, conexão em {total_ms:.0f} ms; {self.describe_pool()})",
+            text_color=("#10b981", "#34d399")
+        )
+        messagebox.showinfo("Conexão", f"Conectado ao banco de dados '{dbname}' com sucesso!")
+
+    def on_connection_error(self, e):
+        self.stop_stage()
+        self.connect_button.configure(state="normal")
+        messagebox.showerror("Erro de Conexão", f"Não foi possível conectar ou carregar o schema: {e}")
+        self.status_label.configure(text="* Erro na conexão", text_color=("#ef4444", "#f87171"))
+
+    # --- Etapas e tempos exibidos ao vivo na barra de status ---
+
+    def start_stage(self, name):
+        """Marca o início de uma etapa; a barra de status mostra o tempo decorrido."""
+        now = time.perf_counter()
+        if self.current_stage is not None:
+            self.stage_timings.append((self.current_stage, now - self.stage_started))
+        self.current_stage = name
+        self.stage_started = now
+        if self.stage_ticker is None:
+            self.tick_stage()
+
+    def stop_stage(self):
+        """Encerra a etapa atual e retorna [(etapa, segundos)] desde o último reset."""
+        if self.current_stage is not None:
+            self.stage_timings.append((self.current_stage, time.perf_counter() - self.stage_started))
+        self.current_stage = None
+        if self.stage_ticker is not None:
+            self.root.after_cancel(self.stage_ticker)
+            self.stage_ticker = None
+        timings, self.stage_timings = self.stage_timings, []
+        return timings
+
+    def tick_stage(self):
+        elapsed = time.perf_counter() - self.stage_started
+        done = " · ".join(f"{name} {secs:.1f}s" for name, secs in self.stage_timings)
+        queued = self.worker.pending - 1
+        text = f"* {self.current_stage}... {elapsed:.1f}s"
+        if done:
+            text += f"  ({done})"
+        if queued > 0:
+            text += f"  [+{queued} na fila]"
+        self.status_label.configure(text=text, text_color=("#f59e0b", "#fbbf24"))
+        self.stage_ticker = self.root.after(100, self.tick_stage)
 
     def create_schema_section(self, parent):
         # Frame do schema
@@ -425,6 +533,68 @@ class App:
             hover_color="#059669"
         )
         self.generate_sql_button.grid(row=0, column=1)
+
+        # Botão de cancelar a consulta em andamento
+        self.cancel_button = ctk.CTkButton(
+            input_frame,
+            text="Cancelar",
+            command=self.cancel_current_query,
+            state="disabled",
+            font=ctk.CTkFont(size=13, weight="bold"),
+            height=40,
+            width=100,
+            fg_color=self.colors['danger'],
+            hover_color="#dc2626"
+        )
+        self.cancel_button.grid(row=0, column=2, padx=(12, 0))
+
+        # Opções do cache de respostas pergunta -> SQL
+        cache_frame = ctk.CTkFrame(input_frame, fg_color="transparent")
+        cache_frame.grid(row=1, column=0, columnspan=3, pady=(12, 0), sticky="w")
+
+        self.use_cache_var = ctk.BooleanVar(value=True)
+        self.use_cache_checkbox = ctk.CTkCheckBox(
+            cache_frame,
+            text="Reaproveitar SQL e resultados do cache",
+            variable=self.use_cache_var,
+            font=ctk.CTkFont(size=12)
+        )
+        self.use_cache_checkbox.grid(row=0, column=0, padx=(0, 15))
+
+        self.clear_cache_button = ctk.CTkButton(
+            cache_frame,
+            text="Limpar cache",
+            command=self.clear_sql_cache,
+            font=ctk.CTkFont(size=12, weight="bold"),
+            height=28,
+            width=110,
+            fg_color=("#6b7280", "#4b5563"),
+            hover_color=("#4b5563", "#374151")
+        )
+        self.clear_cache_button.grid(row=0, column=1)
+
+        # Resultado lido página a página em vez de inteiro
+        self.use_paging_var = ctk.BooleanVar(value=False)
+        self.use_paging_checkbox = ctk.CTkCheckBox(
+            cache_frame,
+            text="Paginar resultados",
+            variable=self.use_paging_var,
+            font=ctk.CTkFont(size=12)
+        )
+        self.use_paging_checkbox.grid(row=0, column=2, padx=(15, 0))
+
+        # Tempos por etapa e contadores da sessão (metrics.py)
+        self.metrics_button = ctk.CTkButton(
+            cache_frame,
+            text="Métricas",
+            command=self.show_metrics,
+            font=ctk.CTkFont(size=12, weight="bold"),
+            height=28,
+            width=90,
+            fg_color=("#6b7280", "#4b5563"),
+            hover_color=("#4b5563", "#374151")
+        )
+        self.metrics_button.grid(row=0, column=3, padx=(15, 0))
         
     def create_status_section(self, parent):
         # Frame de status
@@ -460,7 +630,16 @@ class App:
             font=ctk.CTkFont(family="Courier", size=13, weight="bold"),
             text_color=("#059669", "#10b981")
         )
-        self.sql_output_text.grid(row=1, column=0, padx=25, pady=(0, 25), sticky="ew")
+        self.sql_output_text.grid(row=1, column=0, padx=25, pady=(0, 10), sticky="ew")
+
+        # Estimativa de custo da consulta (EXPLAIN), exibida antes da execução
+        self.cost_label = ctk.CTkLabel(
+            sql_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            anchor="w"
+        )
+        self.cost_label.grid(row=2, column=0, padx=25, pady=(0, 20), sticky="ew")
         
     def create_results_section(self, parent):
         # Frame de resultados
@@ -483,11 +662,11 @@ class App:
         )
         section_title.grid(row=0, column=0, columnspan=3)
         
-        # Botão para salvar CSV (posicionado à direita com padding)
-        self.save_csv_button = ctk.CTkButton(
+        # Botão para exportar o resultado completo (posicionado à direita com padding)
+        self.export_button = ctk.CTkButton(
             title_frame,
-            text="Salvar CSV",
-            command=self.save_results_to_csv,
+            text="Exportar",
+            command=self.export_results,
             font=ctk.CTkFont(size=12, weight="bold"),
             height=32,
             width=100,
@@ -495,140 +674,178 @@ class App:
             fg_color=("#3b82f6", "#60a5fa"),
             hover_color=("#2563eb", "#3b82f6")
         )
-        self.save_csv_button.grid(row=0, column=2, sticky="e", padx=(0, 15))
-        
-        # Frame scrollable para resultados
-        self.results_scrollable = ctk.CTkScrollableFrame(
-            results_frame,
-            height=220,
-            label_text="Dados retornados pela consulta"
+        self.export_button.grid(row=0, column=2, sticky="e", padx=(0, 15))
+
+        # Navegação entre páginas (modo "Paginar resultados")
+        page_frame = ctk.CTkFrame(title_frame, fg_color="transparent")
+        page_frame.grid(row=0, column=0, sticky="w", padx=(15, 0))
+
+        self.prev_page_button = ctk.CTkButton(
+            page_frame,
+            text="◀ Anterior",
+            command=lambda: self.request_page("previous"),
+            font=ctk.CTkFont(size=12, weight="bold"),
+            height=32,
+            width=90,
+            state="disabled"
+        )
+        self.prev_page_button.grid(row=0, column=0)
+
+        self.page_label = ctk.CTkLabel(
+            page_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color=("gray40", "gray70")
+        )
+        self.page_label.grid(row=0, column=1, padx=10)
+
+        self.next_page_button = ctk.CTkButton(
+            page_frame,
+            text="Próxima ▶",
+            command=lambda: self.request_page("next"),
+            font=ctk.CTkFont(size=12, weight="bold"),
+            height=32,
+            width=90,
+            state="disabled"
         )
-        self.results_scrollable.grid(row=1, column=0, padx=25, pady=(0, 25), sticky="ew")
+        self.next_page_button.grid(row=0, column=2)
         
-        # Container para resultados
-        self.results_container = self.results_scrollable
+        # Tabela virtualizada: só as linhas visíveis têm widgets
+        self.results_grid = results_grid.VirtualResultsGrid(results_frame, visible_rows=10)
+        self.results_grid.grid(row=1, column=0, padx=25, pady=(0, 25), sticky="ew")
         self.create_results_placeholder()
         
         # Configurar rolagem contextual para os resultados
-        self.setup_contextual_scrolling(self.results_scrollable, "results")
+        self.setup_contextual_scrolling(self.results_grid, "results")
         
-        # Variáveis para armazenar dados dos resultados para CSV
+        # Linhas exibidas (valores originais, formatados só na exibição)
         self.current_results = None
         self.current_columns = None
         
     def create_results_placeholder(self):
-        placeholder = ctk.CTkLabel(
-            self.results_container,
-            text="Os resultados da consulta aparecerão aqui",
-            font=ctk.CTkFont(size=13),
-            text_color=("#6b7280", "#9ca3af")
-        )
-        placeholder.pack(pady=20)
+        self.results_grid.show_message("Os resultados da consulta aparecerão aqui")
         
     def clear_results(self):
-        for widget in self.results_container.winfo_children():
-            widget.destroy()
-        # Limpar dados armazenados e desabilitar botão CSV
+        self.results_grid.clear()
+        # Limpar dados armazenados e desabilitar o botão de exportação
         self.current_results = None
         self.current_columns = None
-        if hasattr(self, 'save_csv_button'):
-            self.save_csv_button.configure(state="disabled")
+        if hasattr(self, 'export_button'):
+            self.export_button.configure(state="disabled")
             
     def display_results(self, resultados, colunas):
+        """Exibe um resultado completo de uma só vez."""
+        self.begin_results(colunas)
+        if colunas:
+            self.append_results(resultados)
+            self.finish_results()
+
+    def begin_results(self, colunas, first_row_number=1):
+        """Prepara a tabela de resultados para receber linhas em lotes."""
         self.clear_results()
         
         if not colunas:
-            success_label = ctk.CTkLabel(
-                self.results_container,
-                text="Comando executado com sucesso!",
-                font=ctk.CTkFont(size=13, weight="bold"),
-                text_color=self.colors['success']
-            )
-            success_label.pack(pady=20)
-            # Não há resultados para salvar
-            self.current_results = None
-            self.current_columns = None
-            self.save_csv_button.configure(state="disabled")
+            self.results_grid.show_message("Comando executado com sucesso!", text_color=self.colors['success'])
             return
             
-        # Armazenar dados para CSV (incluindo coluna de índice)
-        csv_columns = ["#"] + colunas
-        csv_results = []
-        for i, linha in enumerate(resultados):
-            csv_row = [str(i + 1)] + [str(valor) for valor in linha]
-            csv_results.append(csv_row)
-        
-        self.current_columns = csv_columns
-        self.current_results = csv_results
-        self.save_csv_button.configure(state="normal")
-            
-        # Criar cabeçalho com coluna de índice
-        header_frame = ctk.CTkFrame(self.results_container)
-        header_frame.pack(fill="x", padx=12, pady=(12, 8))
-        
-        # Adicionar coluna de índice como primeira coluna
-        index_header = ctk.CTkLabel(
-            header_frame,
-            text="#",
-            font=ctk.CTkFont(size=12, weight="bold"),
-            width=50,
-            anchor="center"
-        )
-        index_header.grid(row=0, column=0, padx=4, pady=4, sticky="ew")
-        
-        # Adicionar as outras colunas
-        for i, coluna in enumerate(colunas):
-            header_label = ctk.CTkLabel(
-                header_frame,
-                text=coluna,
-                font=ctk.CTkFont(size=12, weight="bold"),
-                width=140,
-                anchor="w"  # Alinhamento à esquerda
-            )
-            header_label.grid(row=0, column=i+1, padx=4, pady=4, sticky="ew")
-            
-        # Criar linhas de dados
-        if resultados:
-            for row_idx, linha in enumerate(resultados):
-                row_frame = ctk.CTkFrame(
-                    self.results_container,
-                    fg_color=("gray90", "gray20") if row_idx % 2 == 0 else "transparent"
-                )
-                row_frame.pack(fill="x", padx=12, pady=2)
-                
-                # Adicionar número sequencial como primeira coluna
-                index_label = ctk.CTkLabel(
-                    row_frame,
-                    text=str(row_idx + 1),
-                    font=ctk.CTkFont(size=11),
-                    width=50,
-                    anchor="center"
-                )
-                index_label.grid(row=0, column=0, padx=4, pady=4, sticky="ew")
-                
-                # Adicionar os dados das outras colunas
-                for col_idx, valor in enumerate(linha):
-                    cell_text = str(valor)[:45] + "..." if len(str(valor)) > 45 else str(valor)
-                    cell_label = ctk.CTkLabel(
-                        row_frame,
-                        text=cell_text,
-                        font=ctk.CTkFont(size=11),
-                        width=140,
-                        anchor="w"
-                    )
-                    cell_label.grid(row=0, column=col_idx+1, padx=4, pady=4, sticky="ew")
+        self.current_columns = list(colunas)
+        self.render_time = 0.0
+        # Guardado por coluna, em arrays tipados; o texto só é gerado para as células visíveis
+        self.current_results = result_set.ResultSet(colunas)
+        self.results_grid.set_columns(colunas)
+        self.results_grid.set_source(self.current_results, first_row_number)
+
+    def append_results(self, linhas):
+        """Acrescenta um lote de linhas; a tabela só redesenha o que está visível."""
+        start = time.perf_counter()
+        self.current_results.append(linhas)
+        self.results_grid.rows_appended()
+        self.render_time += time.perf_counter() - start
+
+    def finish_results(self):
+        """Finaliza a exibição depois do último lote."""
+        if self.current_results is not None:
+            metrics.record_stage("render", self.render_time, interface="gui", rows=len(self.current_results))
+        if self.current_results:
+            self.export_button.configure(state="normal")
+            return
+        self.results_grid.show_message("Nenhum resultado encontrado")
+        # Não há resultados para salvar
+        self.current_results = None
+        self.current_columns = None
+        self.export_button.configure(state="disabled")
+
+    def show_page(self, page):
+        """Exibe uma página do paginador e atualiza os botões de navegação."""
+        if page is None:
+            return
+        self.begin_results(page.columns, page.number * self.pager.page_size + 1 if self.pager else 1)
+        if page.columns:
+            self.append_results(page.rows)
+            self.finish_results()
+        self.update_page_controls(page)
+
+    def update_page_controls(self, page):
+        """Habilita Anterior/Próxima conforme a página (None: sem paginação)."""
+        if page is None:
+            self.page_label.configure(text="")
         else:
-            no_data_label = ctk.CTkLabel(
-                self.results_container,
-                text="Nenhum resultado encontrado",
-                font=ctk.CTkFont(size=13),
-                text_color=("#6b7280", "#9ca3af")
-            )
-            no_data_label.pack(pady=20)
-            # Não há resultados para salvar
-            self.current_results = None
-            self.current_columns = None
-            self.save_csv_button.configure(state="disabled")
+            self.page_label.configure(text=f"Página {page.number + 1}" + ("" if page.has_next else " (última)"))
+        self.prev_page_button.configure(state="normal" if page is not None and page.has_prev else "disabled")
+        self.next_page_button.configure(state="normal" if page is not None and page.has_next else "disabled")
+
+    def request_page(self, direction):
+        """Busca a página seguinte ('next') ou anterior ('previous') na thread de trabalho."""
+        self.prev_page_button.configure(state="disabled")
+        self.next_page_button.configure(state="disabled")
+        self.status_label.configure(text="* Buscando página...", text_color=self.colors['accent'])
+        self.worker.submit(self.fetch_page, direction, on_success=self.on_page_loaded, on_error=self.on_page_error)
+
+    def fetch_page(self, direction):
+        """Executa na thread de trabalho; o paginador é lido aqui porque uma nova pergunta pode tê-lo trocado."""
+        pager = self.pager
+        if pager is None:
+            return None
+        start = time.perf_counter()
+        page = pager.next() if direction == "next" else pager.previous()
+        return page, time.perf_counter() - start
+
+    def on_page_loaded(self, result):
+        if result is None:
+            return
+        page, elapsed = result
+        self.show_page(page)
+        self.status_label.configure(
+            text=f"* Página {page.number + 1} carregada em {elapsed * 1000:.0f} ms ({len(page.rows)} linhas)",
+            text_color=("#10b981", "#34d399")
+        )
+
+    def on_page_error(self, e):
+        # Fechar o paginador faz uma ida ao banco: fica na thread de trabalho
+        self.worker.submit(self.detach_pager)
+        self.update_page_controls(None)
+        self.status_label.configure(text="* Erro ao buscar a página", text_color=("#ef4444", "#f87171"))
+        messagebox.showerror("Erro na Consulta", f"Erro ao buscar a página: {e}")
+
+    def close_pager(self):
+        """Fecha o paginador atual e devolve a conexão ao pool (bloqueia: só ao fechar a janela)."""
+        pager, self.pager = self.pager, None
+        self.release_pager(pager)
+
+    def detach_pager(self):
+        """Na thread de trabalho: fecha o paginador atual ali mesmo e só atualiza os botões na thread do Tk."""
+        pager, self.pager = self.pager, None
+        if pager is not None:
+            # Fechar o cursor do servidor e desfazer a transação é uma ida ao banco
+            self.release_pager(pager)
+            self.worker.post(self.update_page_controls, None)
+
+    def release_pager(self, pager):
+        if pager is not None:
+            try:
+                pager.close()
+            except Exception as e:
+                print(f"Erro ao fechar o paginador: {e}")
 
     def generate_and_execute_sql(self):
         natural_query = self.natural_query_entry.get().strip()
@@ -636,65 +853,286 @@ class App:
             messagebox.showwarning("Entrada Inválida", "Por favor, digite sua pergunta em linguagem natural.")
             return
         
-        if not self.db or not self.schema:
+        if not self.pool or not self.schema:
             messagebox.showerror("Erro", "Não conectado ao banco de dados ou schema não carregado.")
             return
 
-        try:
-            self.status_label.configure(text="* Gerando SQL... Isso pode levar alguns segundos.", text_color=("#f59e0b", "#fbbf24"))
-            self.generate_sql_button.configure(state="disabled")
-            self.root.update()
-            
-            self.sql_output_text.delete("1.0", "end")
-            self.clear_results()
-            
-            sql_query = script.generate_sql(self.schema, natural_query)
-            self.sql_output_text.insert("1.0", sql_query)
+        # Perguntas enviadas enquanto outra roda entram na fila do worker
+        self.worker.submit(
+            self.run_question, natural_query, self.use_cache_var.get(), self.use_paging_var.get(),
+            on_success=self.on_question_done,
+            on_error=lambda e: self.show_query_error(natural_query, e)
+        )
+        if self.worker.pending > 1:
+            self.natural_query_entry.delete(0, "end")
+        if self.current_stage is not None:
+            self.tick_stage_now()
 
-            self.status_label.configure(text="* Executando consulta...", text_color=("#f59e0b", "#fbbf24"))
-            self.root.update()
+    def tick_stage_now(self):
+        if self.stage_ticker is not None:
+            self.root.after_cancel(self.stage_ticker)
+        self.tick_stage()
 
-            resultados, colunas = script.execute_sql(self.db, sql_query)
-            self.display_results(resultados, colunas)
-                
-            self.status_label.configure(text="* Consulta concluída com sucesso!", text_color=("#10b981", "#34d399"))
-        except Exception as e:
-            messagebox.showerror("Erro na Consulta", f"Erro ao gerar SQL ou executar a consulta: {e}")
-            error_label = ctk.CTkLabel(
-                self.results_container,
-                text=f"Erro: {e}",
-                font=ctk.CTkFont(size=13),
-                text_color=("#ef4444", "#f87171")
-            )
-            error_label.pack(pady=20)
-            self.status_label.configure(text="* Erro na consulta", text_color=("#ef4444", "#f87171"))
+    def run_question(self, natural_query, use_cache, use_paging=False):
+        """Gera a SQL, executa e envia os lotes à interface (executa na thread de trabalho)."""
+        post = self.worker.post
+        self.cancel_requested = False
+        # O resultado paginado anterior deixa de ser navegável
+        self.detach_pager()
+        self.last_sql = None
+        post(self.begin_question)
+        # Uma pergunta = um trace (metrics.py); as etapas de script.py ficam como spans filhos
+        with metrics.span("question", interface="gui", use_cache=use_cache) as question:
+            try:
+                info = {}
+                post(self.start_stage, "Gerando SQL")
+
+                def on_text(text):
+                    # Cada trecho aparece na caixa "SQL Gerada" assim que chega
+                    post(self.append_generated_sql, text)
+                    self.check_cancelled()
+
+                sql_query = script.generate_sql_stream(
+                    self.schema, natural_query, use_cache=use_cache, info=info, on_text=on_text,
+                    validate=lambda sql: cost_guard.check(self.pool, sql), db_engine=self.db_engine,
+                )
+                post(self.show_generated_sql, sql_query)
+                self.check_cancelled()
+
+                # Estimativa do plano (já feita durante o streaming, se a SQL não mudou depois)
+                decision = info['validation'] or cost_guard.check(self.pool, sql_query)
+                post(self.show_cost_estimate, decision)
+                if decision.action == 'block':
+                    raise cost_guard.CostGuardError(decision)
+                # A exportação reexecuta a SQL completa, sem o LIMIT, gravando em disco aos poucos
+                self.last_sql = sql_query
+                if use_paging and result_stream.is_streamable_query(sql_query):
+                    question.set(paging=True)
+                    return info, self.run_paged(sql_query)
+                sql_query = decision.sql
+
+                post(self.start_stage, "Executando consulta")
+                # Ao ser devolvida, a conexão passa por rollback (importante para PostgreSQL
+                # em caso de erro na transação) e, se quebrou, é descartada pelo pool
+                with self.pool.getconn() as db:
+                    self.active_db = db
+                    # Resultados já vistos, com os dados inalterados, vêm do cache de resultados
+                    stream = script.stream_sql_cached(db, sql_query) if use_cache else script.stream_sql(db, sql_query)
+                    post(self.begin_results, stream.columns)
+                    shown, truncated = 0, False
+                    if stream.columns:
+                        post(self.start_stage, "Lendo resultados")
+                        for batch in stream.batches():
+                            if len(batch) > GUI_MAX_ROWS - shown:
+                                batch, truncated = batch[:GUI_MAX_ROWS - shown], True
+                            if batch:
+                                # Espera se a janela ainda não exibiu os lotes anteriores
+                                self.worker.post_wait(self.append_results, batch)
+                                shown += len(batch)
+                            if truncated or self.cancel_requested:
+                                stream.close()
+                                self.check_cancelled()
+                                break
+                        post(self.finish_results)
+                    else:
+                        stream.close()
+            finally:
+                self.active_db = None
+            question.set(rows=shown, truncated=truncated, result_cache_hit=getattr(stream, "from_cache", False))
+        origem = " do cache de resultados" if getattr(stream, "from_cache", False) else ""
+        limite = f", limitado a {GUI_MAX_ROWS} (exporte para obter todas)" if truncated else ""
+        return info, f"{shown} linhas{origem}{limite}"
+
+    def run_paged(self, sql_query):
+        """Abre o paginador e exibe a primeira página (executa na thread de trabalho).
+
+        Só a página atual é lida, então o LIMIT da estimativa de custo não é aplicado.
+        """
+        post = self.worker.post
+        post(self.start_stage, "Buscando primeira página")
+        pager = script.open_pager(self.pool, sql_query, self.db_engine)
+        try:
+            self.active_db = pager.db
+            page = pager.first()
+        except BaseException:
+            pager.close()
+            raise
         finally:
-            self.generate_sql_button.configure(state="normal")
+            self.active_db = None
+        self.pager = pager
+        post(self.show_page, page)
+        modo = "chave" if pager.mode == "keyset" else "cursor"
+        return f"página 1 com {len(page.rows)} linhas, paginação por {modo}"
 
-    def on_closing(self):
-        if self.db:
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise query_control.QueryCancelledError("Consulta cancelada pelo usuário.")
+
+    def cancel_current_query(self):
+        """Cancela a pergunta em andamento (geração ou consulta no servidor)."""
+        self.cancel_requested = True
+        self.cancel_started = time.perf_counter()
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text="* Cancelando...", text_color=self.colors['warning'])
+        db = self.active_db
+        if db is None:
+            # Ainda gerando a SQL: run_question para antes de executar
+            return
+
+        def cancel():
             try:
-                self.db.close()
-                print("Conexão com o banco de dados fechada.")
+                query_control.cancel_query(db)
             except Exception as e:
-                print(f"Erro ao fechar a conexão com o banco: {e}")
-        self.root.destroy()
+                self.worker.post(messagebox.showerror, "Erro", f"Não foi possível cancelar a consulta: {e}")
+
+        # O cancelamento no MySQL abre uma conexão auxiliar: fora da thread do Tk
+        threading.Thread(target=cancel, daemon=True).start()
+
+    def begin_question(self):
+        self.sql_output_text.delete("1.0", "end")
+        self.cost_label.configure(text="")
+        self.clear_results()
+        self.update_page_controls(None)
+        self.stage_timings = []
+        self.cancel_button.configure(state="normal")
+
+    def append_generated_sql(self, text):
+        self.sql_output_text.insert("end", text)
+        self.sql_output_text.see("end")
+
+    def show_generated_sql(self, sql_query):
+        self.sql_output_text.delete("1.0", "end")
+        self.sql_output_text.insert("1.0", sql_query)
 
-    def save_results_to_csv(self):
-        if not self.current_results or not self.current_columns:
-            messagebox.showwarning("Nenhum resultado para salvar", "Não há resultados para salvar como CSV.")
+    def show_cost_estimate(self, decision):
+        colors = {
+            'run': ("gray40", "gray70"),
+            'limit': self.colors['warning'],
+            'warn': self.colors['warning'],
+            'block': ("#ef4444", "#f87171"),
+        }
+        self.cost_label.configure(text=cost_guard.describe(decision), text_color=colors[decision.action])
+
+    def on_question_done(self, result):
+        info, linhas = result
+        timings = self.stop_stage()
+        self.cancel_button.configure(state="disabled")
+        origem = "SQL do cache" if info['cache_hit'] else f"SQL gerada pelo modelo: {script.describe_generation(info)}"
+        etapas = " · ".join(f"{name} {secs:.1f}s" for name, secs in timings)
+        self.status_label.configure(
+            text=f"* Consulta concluída com sucesso! ({origem}; {schema_pruning.describe_report(info['prune'])}; "
+                 f"{linhas}; {etapas}; {self.describe_pool()})",
+            text_color=("#10b981", "#34d399")
+        )
+
+    def describe_pool(self):
+        """Resumo do pool de conexões atual para a barra de status."""
+        if not self.pool:
+            return "sem pool"
+        stats = self.pool.stats()
+        return (f"conexões: {stats['in_use']} em uso, {stats['idle']} ociosas, "
+                f"espera {stats['wait_time'] * 1000:.0f} ms")
+
+    def show_query_error(self, natural_query, e):
+        self.stop_stage()
+        self.cancel_button.configure(state="disabled")
+        if query_control.is_cancel_error(e):
+            if self.cancel_requested:
+                latency_ms = (time.perf_counter() - self.cancel_started) * 1000
+                message = f"* Consulta cancelada (em {latency_ms:.0f} ms)"
+            else:
+                message = "* Tempo limite da consulta excedido"
+            self.results_grid.show_message(message[2:], text_color=self.colors['warning'])
+            self.status_label.configure(text=message, text_color=self.colors['warning'])
+            return
+        # Não reaproveitar do cache uma SQL que falhou
+        script.invalidate_sql_cache(self.schema, natural_query)
+        if isinstance(e, cost_guard.CostGuardError):
+            message = f"Consulta bloqueada: {e}"
+            self.results_grid.show_message(message, text_color=self.colors['warning'])
+            self.status_label.configure(text=f"* {message}", text_color=self.colors['warning'])
             return
+        self.results_grid.show_message(f"Erro: {e}", text_color=("#ef4444", "#f87171"))
+        self.status_label.configure(text="* Erro na consulta", text_color=("#ef4444", "#f87171"))
+        messagebox.showerror("Erro na Consulta", f"Erro ao gerar SQL ou executar a consulta: {e}")
 
+    def clear_sql_cache(self):
         try:
-            filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
-            if filename:
-                with open(filename, 'w', newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerow(self.current_columns)
-                    writer.writerows(self.current_results)
-                messagebox.showinfo("Salvo com Sucesso", "Os resultados foram salvos com sucesso!")
+            script.invalidate_sql_cache()
+            script.get_result_cache().invalidate()
+            self.status_label.configure(text="* Caches de SQL e de resultados esvaziados.", text_color=self.colors['accent'])
         except Exception as e:
-            messagebox.showerror("Erro ao salvar CSV", f"Erro ao salvar os resultados como CSV: {e}")
+            messagebox.showerror("Erro", f"Não foi possível limpar o cache de SQL: {e}")
+
+    def show_metrics(self):
+        messagebox.showinfo("Métricas", metrics.describe())
+
+    def on_closing(self):
+        self.worker.shutdown()
+        self.close_pager()
+        try:
+            script.close_pools()
+            print("Conexões com o banco de dados fechadas.")
+        except Exception as e:
+            print(f"Erro ao fechar as conexões com o banco: {e}")
+        self.root.destroy()
+
+    def export_results(self):
+        """Reexecuta a última consulta gravando direto no arquivo (CSV, CSV.gz ou Parquet)."""
+        if not self.last_sql:
+            messagebox.showwarning("Nenhum resultado para exportar", "Não há consulta para exportar.")
+            return
+
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("CSV compactado", "*.csv.gz"), ("Parquet", "*.parquet")]
+        )
+        if not filename:
+            return
+        self.cancel_requested = False
+        self.export_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.start_stage("Exportando")
+        self.worker.submit(
+            self.run_export, self.last_sql, filename,
+            on_success=self.on_export_done, on_error=self.on_export_error
+        )
+
+    def run_export(self, sql_query, filename):
+        """Executa na thread de trabalho; o progresso vai para a barra de status."""
+        def on_progress(progress):
+            self.check_cancelled()
+            self.worker.post(self.show_export_progress, progress)
+
+        with self.pool.getconn() as db:
+            self.active_db = db
+            try:
+                return export.export_query(db, sql_query, filename, on_progress=on_progress)
+            finally:
+                self.active_db = None
+
+    def show_export_progress(self, progress):
+        rate = progress.rows / progress.elapsed if progress.elapsed > 0 else 0
+        self.status_label.configure(
+            text=f"* Exportando... {progress.rows} linhas ({rate:.0f} linhas/s, {progress.bytes / 1024 / 1024:.1f} MiB)",
+            text_color=self.colors['accent']
+        )
+
+    def on_export_done(self, result):
+        self.stop_stage()
+        self.cancel_button.configure(state="disabled")
+        self.export_button.configure(state="normal")
+        self.status_label.configure(text=f"* {export.describe(result)}", text_color=("#10b981", "#34d399"))
+
+    def on_export_error(self, e):
+        self.stop_stage()
+        self.cancel_button.configure(state="disabled")
+        self.export_button.configure(state="normal")
+        if query_control.is_cancel_error(e):
+            self.status_label.configure(text="* Exportação cancelada", text_color=self.colors['warning'])
+            return
+        self.status_label.configure(text="* Erro na exportação", text_color=("#ef4444", "#f87171"))
+        messagebox.showerror("Erro ao exportar", f"Erro ao exportar os resultados: {e}")
 
 if __name__ == "__main__":
     # Configurar a janela principal
@@ -0,0 +1,286 @@
+import re
+from collections import namedtuple
+from itertools import groupby
+
+# --- INTROSPECÇÃO DO SCHEMA EM MASSA ---
+# Em vez de uma consulta por tabela (N+1 idas ao servidor), cada motor lê
+# todas as tabelas e colunas com uma única consulta ao catálogo, já ordenada.
+# Mais duas consultas trazem, de todas as tabelas de uma vez, as chaves
+# (primárias e estrangeiras) e os índices; a estimativa de linhas vem junto
+# com as colunas (pg_class.reltuples / information_schema.TABLES.TABLE_ROWS).
+# O resultado é um modelo estruturado (Table) que também pode ser formatado
+# em texto e lido de volta (format_schema / parse_schema), já que o schema
+# circula como texto pela interface, pelos caches e pelos prompts.
+
+# columns: [(coluna, tipo)]; primary_key: (coluna, ...); rows: linhas estimadas ou None
+Table = namedtuple("Table", "name columns primary_key foreign_keys indexes rows", defaults=((), (), (), None))
+# ref_columns pode ser vazio quando o catálogo não informa as colunas referenciadas (SQLite)
+ForeignKey = namedtuple("ForeignKey", "columns ref_table ref_columns")
+Index = namedtuple("Index", "name columns unique")
+
+# PostgreSQL: todos os schemas de usuário (exclui pg_catalog, information_schema,
+# pg_toast, pg_temp_* etc.). O LEFT JOIN mantém tabelas sem colunas visíveis.
+# reltuples é -1 (PostgreSQL 14+) ou 0 em tabelas nunca analisadas.
+POSTGRES_COLUMNS_QUERY = """
+    SELECT t.table_schema, t.table_name, c.column_name, c.data_type, pc.reltuples::bigint
+    FROM information_schema.tables t
+    LEFT JOIN information_schema.columns c
+        ON c.table_schema = t.table_schema
+       AND c.table_name = t.table_name
+    LEFT JOIN pg_namespace pn ON pn.nspname = t.table_schema
+    LEFT JOIN pg_class pc ON pc.relnamespace = pn.oid AND pc.relname = t.table_name
+    WHERE t.table_schema <> 'information_schema'
+      AND t.table_schema NOT LIKE 'pg\\_%'
+    ORDER BY t.table_schema, t.table_name, c.ordinal_position
+"""
+
+# Uma linha por coluna de cada chave, na ordem da chave:
+# (schema, tabela, 'p' ou 'f', nome, coluna, schema_ref, tabela_ref, coluna_ref)
+POSTGRES_KEYS_QUERY = """
+    SELECT n.nspname, c.relname, con.contype, con.conname, a.attname, fn.nspname, fc.relname, fa.attname
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, fattnum, ord)
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    LEFT JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+    LEFT JOIN pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+    WHERE con.contype IN ('p', 'f')
+      AND n.nspname <> 'information_schema'
+      AND n.nspname NOT LIKE 'pg\\_%'
+    ORDER BY n.nspname, c.relname, con.contype, con.conname, k.ord
+"""
+
+# Uma linha por coluna de cada índice: (schema, tabela, índice, único, primário, coluna).
+# Colunas de expressão vêm nulas; colunas INCLUDE ficam de fora.
+POSTGRES_INDEXES_QUERY = """
+    SELECT n.nspname, c.relname, i.relname, ix.indisunique, ix.indisprimary, a.attname
+    FROM pg_index ix
+    JOIN pg_class c ON c.oid = ix.indrelid
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum AND k.attnum > 0
+    WHERE k.ord <= ix.indnkeyatts
+      AND n.nspname <> 'information_schema'
+      AND n.nspname NOT LIKE 'pg\\_%'
+    ORDER BY n.nspname, c.relname, i.relname, k.ord
+"""
+
+# MySQL: o "schema" é o próprio banco conectado. COLUMN_TYPE é o mesmo valor
+# exibido na coluna Type do DESCRIBE (ex.: varchar(255), int unsigned).
+# TABLE_ROWS é exata no MyISAM e estimada no InnoDB; nula em views.
+MYSQL_COLUMNS_QUERY = """
+    SELECT t.TABLE_SCHEMA, t.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, t.TABLE_ROWS
+    FROM information_schema.TABLES t
+    LEFT JOIN information_schema.COLUMNS c
+        ON c.TABLE_SCHEMA = t.TABLE_SCHEMA
+       AND c.TABLE_NAME = t.TABLE_NAME
+    WHERE t.TABLE_SCHEMA = DATABASE()
+    ORDER BY t.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+MYSQL_KEYS_QUERY = """
+    SELECT TABLE_SCHEMA, TABLE_NAME, IF(CONSTRAINT_NAME = 'PRIMARY', 'p', 'f') AS kind, CONSTRAINT_NAME,
+           COLUMN_NAME, REFERENCED_TABLE_SCHEMA, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE()
+      AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+    ORDER BY TABLE_NAME, kind, CONSTRAINT_NAME, ORDINAL_POSITION
+"""
+
+# COLUMN_NAME é nulo em índices funcionais (MySQL 8.0.13+)
+MYSQL_INDEXES_QUERY = """
+    SELECT TABLE_SCHEMA, TABLE_NAME, INDEX_NAME, NON_UNIQUE = 0, INDEX_NAME = 'PRIMARY', COLUMN_NAME
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+"""
+
+# SQLite (fixtures locais dos benchmarks): pragma_table_info como função de tabela.
+# Sem estimativa de linhas (sqlite_stat1 só existe depois de ANALYZE).
+SQLITE_COLUMNS_QUERY = """
+    SELECT 'main', m.name, p.name, p.type, NULL
+    FROM sqlite_master m
+    LEFT JOIN pragma_table_info(m.name) p
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY m.name, p.cid
+"""
+
+SQLITE_KEYS_QUERY = """
+    SELECT 'main', m.name, 'p', 'pk', p.name, NULL, NULL, NULL, p.pk AS ord
+    FROM sqlite_master m
+    JOIN pragma_table_info(m.name) p
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\' AND p.pk > 0
+    UNION ALL
+    SELECT 'main', m.name, 'f', 'fk' || f.id, f."from", 'main', f."table", f."to", f.seq
+    FROM sqlite_master m
+    JOIN pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY 2, 3, 4, ord
+"""
+
+SQLITE_INDEXES_QUERY = """
+    SELECT 'main', m.name, il.name, il."unique", il.origin = 'pk', ii.name
+    FROM sqlite_master m
+    JOIN pragma_index_list(m.name) il
+    JOIN pragma_index_info(il.name) ii
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite\\_%' ESCAPE '\\'
+    ORDER BY m.name, il.name, ii.seqno
+"""
+
+QUERIES = {
+    'postgresql': (POSTGRES_COLUMNS_QUERY, POSTGRES_KEYS_QUERY, POSTGRES_INDEXES_QUERY),
+    'mysql': (MYSQL_COLUMNS_QUERY, MYSQL_KEYS_QUERY, MYSQL_INDEXES_QUERY),
+    'sqlite': (SQLITE_COLUMNS_QUERY, SQLITE_KEYS_QUERY, SQLITE_INDEXES_QUERY),
+}
+
+def qualified_table_name(db_engine, table_schema, table_name):
+    """Nome da tabela como deve aparecer no schema enviado ao modelo.
+
+    Tabelas do schema 'public' (PostgreSQL) e do banco atual (MySQL) mantêm o
+    nome simples; as demais são qualificadas como schema.tabela.
+    """
+    if db_engine == 'postgresql' and table_schema != 'public':
+        return f"{table_schema}.{table_name}"
+    return table_name
+
+def _fetch_all(db, query):
+    cursor = db.cursor()
+    try:
+        cursor.execute(query)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def round_rows(rows):
+    """Arredonda a estimativa para 2 algarismos significativos (None se desconhecida).
+
+    O valor vai para o texto do schema, que é chave dos caches: pequenas
+    variações da estimativa não devem mudar o texto.
+    """
+    if rows is None or rows <= 0:
+        return None
+    rows = int(rows)
+    digits = len(str(rows))
+    if digits <= 2:
+        return rows
+    scale = 10 ** (digits - 2)
+    return round(rows / scale) * scale
+
+def fetch_tables(db, db_engine):
+    """Lê tabelas, colunas, chaves, índices e estimativas de linhas com três consultas ao catálogo.
+
+    Retorna uma lista de Table na ordem em que devem ser exibidas.
+    """
+    try:
+        columns_query, keys_query, indexes_query = QUERIES[db_engine]
+    except KeyError:
+        raise ValueError("Motor de banco de dados inválido. Escolha 'mysql' ou 'postgresql'.") from None
+
+    rows = _fetch_all(db, columns_query)
+    keys = _fetch_all(db, keys_query)
+    indexes = _fetch_all(db, indexes_query)
+
+    def name(table_schema, table_name):
+        return qualified_table_name(db_engine, table_schema, table_name)
+
+    primary_keys = {}
+    foreign_keys = {}
+    for (table_schema, table_name, kind, _), group in groupby(keys, key=lambda row: row[:4]):
+        group = list(group)
+        table = name(table_schema, table_name)
+        columns = tuple(row[4] for row in group)
+        if kind == 'p':
+            primary_keys[table] = columns
+        else:
+            ref_columns = tuple(row[7] for row in group)
+            foreign_keys.setdefault(table, []).append(ForeignKey(
+                columns, name(group[0][5], group[0][6]), ref_columns if all(ref_columns) else ()))
+
+    table_indexes = {}
+    for (table_schema, table_name, index_name), group in groupby(indexes, key=lambda row: row[:3]):
+        group = list(group)
+        columns = tuple(row[5] for row in group)
+        # A chave primária já aparece como tal; índices de expressão não dizem quais colunas filtrar
+        if group[0][4] or not all(columns):
+            continue
+        table_indexes.setdefault(name(table_schema, table_name), []).append(
+            Index(index_name, columns, bool(group[0][3])))
+
+    tables = []
+    for (table_schema, table_name), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        group = list(group)
+        table = name(table_schema, table_name)
+        # Colunas nulas vêm do LEFT JOIN de tabelas sem colunas visíveis
+        columns = [(row[2], row[3]) for row in group if row[2] is not None]
+        tables.append(Table(table, columns, primary_keys.get(table, ()), tuple(foreign_keys.get(table, ())),
+                            tuple(table_indexes.get(table, ())), round_rows(group[0][4])))
+    return tables
+
+def _names(columns):
+    return ", ".join(columns)
+
+def format_table(table):
+    """Bloco "Tabela: / - coluna: tipo" de uma tabela, com chaves, índices e linhas estimadas."""
+    header = f"Tabela: {table.name}"
+    if table.rows is not None:
+        header += f" (~{table.rows} linhas)"
+    lines = [header] + [f"  - {col_name}: {col_type}" for col_name, col_type in table.columns]
+    if table.primary_key:
+        lines.append(f"  Chave primária: {_names(table.primary_key)}")
+    for fk in table.foreign_keys:
+        target = f"{fk.ref_table}({_names(fk.ref_columns)})" if fk.ref_columns else fk.ref_table
+        lines.append(f"  Chave estrangeira: {_names(fk.columns)} -> {target}")
+    for index in table.indexes:
+        kind = "Índice único" if index.unique else "Índice"
+        lines.append(f"  {kind}: {index.name} ({_names(index.columns)})")
+    return "\n".join(lines) + "\n\n"
+
+def format_schema(tables):
+    """Formata as tabelas no texto "Tabela: / - coluna: tipo" exibido e usado como chave dos caches."""
+    if not tables:
+        return ""
+    return "".join(format_table(table) for table in tables).rstrip("\n") + "\n"
+
+_HEADER_RE = re.compile(r"Tabela: (?P<name>.+?)(?: \(~(?P<rows>\d+) linhas\))?")
+_FOREIGN_KEY_RE = re.compile(r"(?P<columns>.+?) -> (?P<table>[^(]+?)(?:\((?P<ref>.*)\))?")
+_INDEX_RE = re.compile(r"(?P<name>.+?) \((?P<columns>.*)\)")
+
+def _split_names(text):
+    return tuple(part.strip() for part in text.split(","))
+
+def parse_schema(schema):
+    """Converte o texto de format_schema de volta em [Table].
+
+    Schemas antigos, só com "Tabela: / - coluna: tipo", viram tabelas sem
+    chaves, índices nem estimativa de linhas.
+    """
+    tables = []
+    for line in schema.splitlines():
+        if line.startswith("Tabela: "):
+            header = _HEADER_RE.fullmatch(line.rstrip())
+            rows = header.group("rows")
+            tables.append(Table(header.group("name"), [], rows=int(rows) if rows else None))
+        elif not tables:
+            continue
+        elif line.startswith("  - "):
+            col_name, _, col_type = line[4:].partition(": ")
+            tables[-1].columns.append((col_name, col_type))
+        elif line.startswith("  "):
+            label, _, value = line.strip().partition(": ")
+            table = tables[-1]
+            if label == "Chave primária":
+                tables[-1] = table._replace(primary_key=_split_names(value))
+            elif label == "Chave estrangeira":
+                match = _FOREIGN_KEY_RE.fullmatch(value)
+                ref = match.group("ref")
+                fk = ForeignKey(_split_names(match.group("columns")), match.group("table").strip(),
+                                _split_names(ref) if ref else ())
+                tables[-1] = table._replace(foreign_keys=table.foreign_keys + (fk,))
+            elif label in ("Índice", "Índice único"):
+                match = _INDEX_RE.fullmatch(value)
+                index = Index(match.group("name"), _split_names(match.group("columns")), label == "Índice único")
+                tables[-1] = table._replace(indexes=table.indexes + (index,))
+    return tables
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from fake_llm import FakeResponse, split_chunks
+
+# --- GRAVAÇÃO E REPRODUÇÃO DAS CHAMADAS AO MODELO ---
+# Com LLM_MODE=record, cada prompt enviado ao modelo e a resposta recebida são
+# gravados em um "cassette" (arquivo JSONL, uma chamada por linha) indexado
+# pelo hash do modelo + prompt. Com LLM_MODE=replay, as respostas vêm do
+# cassette, sem rede e sem chave de API, opcionalmente com latência simulada.
+# O modo padrão (live) chama o modelo normalmente.
+
+MODE = os.getenv("LLM_MODE", "live").strip().lower()
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+# Latência simulada no replay: segundos fixos ou "recorded" (a latência gravada)
+REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "0")
+
+class CassetteMissError(Exception):
+    """O prompt não está gravado no cassette."""
+
+def prompt_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+
+class Cassette:
+    """Arquivo JSONL de chamadas gravadas; a última gravação de um prompt prevalece."""
+
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Linha truncada por uma gravação interrompida
+                        continue
+                    self._entries[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def record(self, key, model_name, prompt, text, latency):
+        entry = {
+            "key": key,
+            "model": model_name,
+            # Só um trecho do prompt, para facilitar a leitura do arquivo
+            "prompt_preview": prompt[-300:],
+            "text": text,
+            "latency": round(latency, 4),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+class RecordingModel:
+    """Chama o modelo real e grava prompt e resposta no cassette."""
+
+    def __init__(self, model, cassette, model_name):
+        self.model = model
+        self.cassette = cassette
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False):
+        start = time.perf_counter()
+        if stream:
+            return self._record_stream(prompt, self.model.generate_content(prompt, stream=True), start)
+        response = self.model.generate_content(prompt)
+        self.cassette.record(prompt_key(self.model_name, prompt), self.model_name, prompt, response.text,
+                             time.perf_counter() - start)
+        return response
+
+    def _record_stream(self, prompt, chunks, start):
+        parts = []
+        for chunk in chunks:
+            parts.append(getattr(chunk, "text", ""))
+            yield chunk
+        # Só grava respostas recebidas por inteiro
+        self.cassette.record(prompt_key(self.model_name, prompt), self.model_name, prompt, "".join(parts),
+                             time.perf_counter() - start)
+
+    async def generate_content_async(self, prompt):
+        import asyncio
+
+        start = time.perf_counter()
+        if hasattr(self.model, "generate_content_async"):
+            response = await self.model.generate_content_async(prompt)
+        else:
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
+        self.cassette.record(prompt_key(self.model_name, prompt), self.model_name, prompt, response.text,
+                             time.perf_counter() - start)
+        return response
+
+class ReplayModel:
+    """Responde com as chamadas gravadas no cassette, sem acessar a rede."""
+
+    def __init__(self, cassette, model_name, latency=REPLAY_LATENCY):
+        self.cassette = cassette
+        self.model_name = model_name
+        self.latency = latency
+
+    def _lookup(self, prompt):
+        entry = self.cassette.get(prompt_key(self.model_name, prompt))
+        if entry is None:
+            raise CassetteMissError(
+                f"Prompt não gravado em {self.cassette.path}; rode com LLM_MODE=record para gravá-lo.")
+        delay = entry.get("latency", 0.0) if self.latency == "recorded" else float(self.latency)
+        return FakeResponse(entry["text"]), delay
+
+    def generate_content(self, prompt, stream=False):
+        response, delay = self._lookup(prompt)
+        if stream:
+            return self._replay_stream(response.text, delay)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    def _replay_stream(self, text, delay):
+        chunks = split_chunks(text)
+        for chunk in chunks:
+            # A latência simulada é distribuída entre os pedaços
+            if delay:
+                time.sleep(delay / len(chunks))
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt):
+        import asyncio
+
+        response, delay = self._lookup(prompt)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
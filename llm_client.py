@@ -0,0 +1,303 @@
+import os
+import random
+import threading
+import time
+
+import metrics
+from prompts import CHARS_PER_TOKEN
+
+# --- CLIENTE DO MODELO COM LIMITE DE TAXA E NOVAS TENTATIVAS ---
+# Todas as chamadas ao modelo (CLI, GUI e batch) passam por um único
+# LLMClient por processo, que:
+#   - respeita a cota com um token bucket (requisições por minuto + rajada);
+#   - limita as chamadas simultâneas com concorrência adaptativa (AIMD):
+#     cada sucesso aumenta o limite aos poucos e cada 429 o corta pela metade;
+#   - refaz chamadas que falharam com 429 ou 5xx, com espera exponencial
+#     e jitter, para que clientes em paralelo não tentem todos ao mesmo tempo.
+
+# Cota de requisições por minuto e tamanho máximo da rajada
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))
+BURST = int(os.getenv("LLM_BURST", "5"))
+# Máximo de chamadas simultâneas (o limite adaptativo fica entre 1 e este valor)
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+# Espera base e máxima (s) entre tentativas
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# Códigos HTTP que valem uma nova tentativa
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+
+def error_code(e):
+    """Código HTTP do erro da API (google.api_core.exceptions.*.code), ou None."""
+    code = getattr(e, "code", None)
+    return code if isinstance(code, int) else None
+
+def is_rate_limited(e):
+    return error_code(e) == 429
+
+def is_retryable(e):
+    return error_code(e) in RETRYABLE_CODES
+
+def chunk_text(chunk):
+    """Texto de um pedaço do stream (vazio se o pedaço não tiver texto, ex.: só metadados)."""
+    try:
+        return chunk.text
+    except (ValueError, AttributeError):
+        return ""
+
+def record_usage(prompt, text, usage=None, cached_tokens=0):
+    """Registra os tokens da chamada e os retorna em um dict.
+
+    Usa o usage_metadata da API quando existe; senão, estima pelo tamanho do
+    texto, somando ao prompt os cached_tokens do prefixo em cache de contexto.
+    input inclui os tokens em cache.
+    """
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    if prompt_tokens:
+        source = "api"
+        response_tokens = getattr(usage, "candidates_token_count", None) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+    else:
+        source = "estimate"
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + cached_tokens
+        response_tokens = len(text) // CHARS_PER_TOKEN
+    metrics.observe("llm_prompt_tokens", prompt_tokens, buckets=metrics.SIZE_BUCKETS, source=source)
+    metrics.observe("llm_response_tokens", response_tokens, buckets=metrics.SIZE_BUCKETS, source=source)
+    if cached_tokens:
+        metrics.observe("llm_cached_tokens", cached_tokens, buckets=metrics.SIZE_BUCKETS, source=source)
+    metrics.annotate(prompt_tokens=prompt_tokens, response_tokens=response_tokens, cached_tokens=cached_tokens,
+                     tokens_source=source)
+    return {"input": prompt_tokens, "cached": cached_tokens, "output": response_tokens, "source": source}
+
+def _update(target, values):
+    if target is not None:
+        target.update(values)
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Espera antes da tentativa attempt (0, 1, ...): exponencial com jitter completo."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    """Token bucket thread-safe: rate tokens por segundo, até capacity acumulados."""
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, capacity=BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Reserva um token e retorna quantos segundos esperar até ele existir."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # Saldo negativo: o token reservado só existirá no futuro
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def acquire_async(self):
+        import asyncio
+
+        await asyncio.sleep(self.reserve())
+
+class AdaptiveLimiter:
+    """Limite de chamadas simultâneas com aumento aditivo e redução multiplicativa.
+
+    Funciona tanto entre threads quanto em corrotinas (a versão assíncrona
+    espera a vez com asyncio.sleep, sem bloquear o loop).
+    """
+
+    def __init__(self, max_limit=MAX_CONCURRENCY, initial=None):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(initial or self.max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _try_acquire(self):
+        if self.in_flight < max(1, int(self.limit)):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._cond:
+            while not self._try_acquire():
+                self._cond.wait()
+
+    async def acquire_async(self, poll=0.05):
+        import asyncio
+
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return
+            await asyncio.sleep(poll)
+
+    def release(self, outcome="ok"):
+        """Libera a vaga; outcome é 'ok', 'rate_limited' ou 'error'."""
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            elif outcome == "rate_limited":
+                self.limit = max(1.0, self.limit / 2)
+            self._cond.notify_all()
+
+class LLMClient:
+    """Envolve um modelo com generate_content(prompt) aplicando limite de taxa e novas tentativas."""
+
+    def __init__(self, model, bucket=None, limiter=None, max_retries=MAX_RETRIES):
+        self.model = model
+        self.bucket = bucket or TokenBucket()
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_retries = max_retries
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+        for name, value in increments.items():
+            if value:
+                metrics.inc(f"llm_{name}_total", value)
+
+    def _after_error(self, e, attempt):
+        """Registra o erro e retorna a espera antes da próxima tentativa (ou levanta).
+
+        A vaga do limitador é liberada por quem chamou.
+        """
+        rate_limited = is_rate_limited(e)
+        if not is_retryable(e) or attempt >= self.max_retries:
+            self._count(failures=1, rate_limited=int(rate_limited))
+            raise e
+        self._count(retries=1, rate_limited=int(rate_limited))
+        return backoff_delay(attempt)
+
+    def generate_content(self, prompt, model=None, usage=None):
+        """Chamada bloqueante, para a CLI, a thread de trabalho da GUI e o batch.
+
+        model substitui o modelo do cliente nesta chamada (ex.: um modelo ligado
+        a um prefixo em cache de contexto); usage (dict), se informado, recebe
+        os tokens da chamada (ver record_usage).
+        """
+        model = model or self.model
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.limiter.acquire()
+            self._count(requests=1)
+            outcome = "error"
+            try:
+                response = model.generate_content(prompt)
+                outcome = "ok"
+            except Exception as e:
+                outcome = "rate_limited" if is_rate_limited(e) else "error"
+                delay = self._after_error(e, attempt)
+            finally:
+                # Também em Ctrl-C (KeyboardInterrupt): a vaga nunca fica presa
+                self.limiter.release(outcome)
+            if outcome != "ok":
+                time.sleep(delay)
+                continue
+            _update(usage, record_usage(prompt, chunk_text(response), getattr(response, "usage_metadata", None),
+                                        getattr(model, "cached_tokens", 0)))
+            return response
+
+    def generate_content_stream(self, prompt, model=None, usage=None):
+        """Gera os pedaços de texto da resposta à medida que chegam (stream=True).
+
+        Só há nova tentativa se o erro vier antes do primeiro pedaço: depois
+        disso o texto parcial já foi entregue a quem chamou. model e usage
+        como em generate_content; usage é preenchido ao fim da resposta.
+        """
+        model = model or self.model
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.limiter.acquire()
+            self._count(requests=1)
+            received = False
+            released = False
+            parts = []
+            usage_metadata = None
+            try:
+                start = time.perf_counter()
+                for chunk in model.generate_content(prompt, stream=True):
+                    # A contagem de tokens da API vem no último pedaço
+                    usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                    text = chunk_text(chunk)
+                    if text:
+                        if not received:
+                            metrics.observe("llm_first_chunk_seconds", time.perf_counter() - start)
+                        received = True
+                        parts.append(text)
+                        yield text
+            except Exception as e:
+                if received:
+                    self._count(failures=1)
+                    raise
+                released = True
+                self.limiter.release("rate_limited" if is_rate_limited(e) else "error")
+                delay = self._after_error(e, attempt)
+            else:
+                released = True
+                self.limiter.release("ok")
+                _update(usage, record_usage(prompt, "".join(parts), usage_metadata, getattr(model, "cached_tokens", 0)))
+                return
+            finally:
+                # Interrompido no meio (erro após o primeiro pedaço, Ctrl-C ou quem
+                # chamou parou de consumir o gerador)
+                if not released:
+                    self.limiter.release("error")
+            time.sleep(delay)
+
+    async def generate_content_async(self, prompt, model=None, usage=None):
+        """Versão assíncrona: usa generate_content_async do modelo quando existe."""
+        # Importado só nas chamadas assíncronas (servidor, batch): a CLI e a GUI não o carregam
+        import asyncio
+
+        model = model or self.model
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire_async()
+            await self.limiter.acquire_async()
+            self._count(requests=1)
+            outcome = "error"
+            try:
+                if hasattr(model, "generate_content_async"):
+                    response = await model.generate_content_async(prompt)
+                else:
+                    response = await asyncio.to_thread(model.generate_content, prompt)
+                outcome = "ok"
+            except Exception as e:
+                outcome = "rate_limited" if is_rate_limited(e) else "error"
+                delay = self._after_error(e, attempt)
+            finally:
+                # Também se a tarefa for cancelada (CancelledError)
+                self.limiter.release(outcome)
+            if outcome != "ok":
+                await asyncio.sleep(delay)
+                continue
+            _update(usage, record_usage(prompt, chunk_text(response), getattr(response, "usage_metadata", None),
+                                        getattr(model, "cached_tokens", 0)))
+            return response
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "concurrency_limit": self.limiter.limit,
+                "in_flight": self.limiter.in_flight,
+            }
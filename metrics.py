@@ -0,0 +1,393 @@
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- MÉTRICAS E RASTREAMENTO POR ETAPA ---
+# Cada etapa do pipeline (carga do schema, montagem do prompt, chamada ao
+# modelo, execução, leitura e exibição) é medida com span(nome). A duração vai
+# para o histograma stage_seconds{stage=...}, e contadores registram acertos de
+# cache, novas tentativas, tokens, linhas e bytes. Tudo fica em memória, em um
+# registro por processo, e pode ser exportado como:
+#   - texto no formato do Prometheus (prometheus_text(); METRICS_PROMETHEUS_FILE
+#     grava o arquivo ao sair, para o textfile collector do node_exporter);
+#   - JSON lines (METRICS_JSONL): uma linha por span e um resumo ao sair;
+#   - spans no formato OTLP/JSON do OpenTelemetry (METRICS_OTEL_SPANS), uma
+#     requisição ExportTraceServiceRequest por linha, como no file exporter
+#     do OpenTelemetry Collector.
+# Spans abertos dentro de outro (ex.: "llm" dentro de "question") ficam no
+# mesmo trace, com o span externo como pai.
+
+ENABLED = os.getenv("METRICS", "on").lower() not in ("0", "off", "false", "no")
+PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_FILE")
+JSONL_PATH = os.getenv("METRICS_JSONL")
+OTEL_SPANS_PATH = os.getenv("METRICS_OTEL_SPANS")
+SERVICE_NAME = os.getenv("METRICS_SERVICE_NAME", "text-to-sql")
+
+# Prefixo dos nomes no Prometheus
+PREFIX = "text_to_sql_"
+
+# Limites dos buckets (s) dos histogramas de latência e dos de contagem (tokens, linhas)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Descrições (# HELP) das métricas conhecidas
+HELP = {
+    "stage_seconds": "Duração de cada etapa do pipeline, em segundos.",
+    "stage_errors_total": "Etapas que terminaram com erro.",
+    "cache_requests_total": "Consultas aos caches de schema, SQL e resultados.",
+    "llm_requests_total": "Chamadas ao modelo, incluindo novas tentativas.",
+    "llm_retries_total": "Novas tentativas após erros 429/5xx.",
+    "llm_rate_limited_total": "Respostas 429 do modelo.",
+    "llm_failures_total": "Chamadas ao modelo que falharam definitivamente.",
+    "llm_first_chunk_seconds": "Tempo até o primeiro trecho da resposta em streaming.",
+    "llm_prompt_tokens": "Tokens do prompt por chamada.",
+    "llm_response_tokens": "Tokens da resposta por chamada.",
+    "llm_cached_tokens": "Tokens do prompt lidos do cache de contexto por chamada.",
+    "rows_fetched_total": "Linhas lidas do banco.",
+    "result_rows": "Linhas por consulta lida do banco.",
+    "export_rows_total": "Linhas exportadas.",
+    "export_bytes_total": "Bytes gravados em exportações.",
+    "result_cache_bytes_total": "Bytes lidos e gravados no cache de resultados.",
+    "singleflight_calls_total": "Chamadas que executaram (leader) ou esperaram uma idêntica em andamento (coalesced).",
+    "http_requests_total": "Requisições atendidas pelo modo servidor, por endpoint e status.",
+}
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Histograma com buckets fixos (contagens não cumulativas; o último é +Inf)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        # bisect_left: um valor igual ao limite conta no bucket (le = "menor ou igual")
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self):
+        """[(limite, contagem acumulada)], terminando em +Inf, como no Prometheus."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Quantil aproximado por interpolação dentro do bucket (como histogram_quantile).
+
+        O resultado fica entre o menor e o maior valor observados.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        lower = 0.0
+        previous = 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if bound == float("inf"):
+                    return self.max
+                inside = total - previous
+                estimate = lower + (bound - lower) * ((rank - previous) / inside if inside else 0)
+                return min(max(estimate, self.min), self.max)
+            lower, previous = bound, total
+        return self.max
+
+class Registry:
+    """Contadores e histogramas do processo, identificados por nome e rótulos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        if not ENABLED:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not ENABLED:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get((name, _label_key(labels)))
+
+    def histograms(self, name):
+        """{rótulos: Histogram} de todas as séries com o nome."""
+        with self._lock:
+            return {labels: h for (n, labels), h in self._histograms.items() if n == name}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Estado atual como dicionário serializável em JSON."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                           "min": h.min, "max": h.max,
+                           "buckets": [[_format_number(bound), total] for bound, total in h.cumulative()]}
+                          for (name, labels), h in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        """Métricas no formato texto de exposição do Prometheus (versão 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            declared = set()
+            for (name, labels), value in counters:
+                if name not in declared:
+                    declared.add(name)
+                    if name in HELP:
+                        lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                    lines.append(f"# TYPE {PREFIX}{name} counter")
+                lines.append(f"{PREFIX}{name}{_format_labels(labels)} {_format_number(value)}")
+            for (name, labels), h in histograms:
+                if name not in declared:
+                    declared.add(name)
+                    if name in HELP:
+                        lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for bound, total in h.cumulative():
+                    bucket_labels = labels + (("le", _format_number(bound)),)
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(bucket_labels)} {total}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {_format_number(h.sum)}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+prometheus_text = REGISTRY.prometheus_text
+snapshot = REGISTRY.snapshot
+
+# --- SPANS ---
+
+_current_span = contextvars.ContextVar("metrics_current_span", default=None)
+_write_lock = threading.Lock()
+
+class Span:
+    """Uma etapa medida: nome, atributos, início/fim (ns desde a época) e trace."""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "error", "_start")
+
+    def __init__(self, name, attributes, parent=None):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        """Duração em segundos (até agora, se o span ainda estiver aberto)."""
+        if self.end_ns is None:
+            return time.perf_counter() - self._start
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def end(self, error=None):
+        """Encerra o span (só a primeira chamada conta) e registra a duração."""
+        if self.end_ns is not None:
+            return
+        elapsed = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(elapsed * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+            inc("stage_errors_total", stage=self.name, error=type(error).__name__)
+        observe("stage_seconds", elapsed, stage=self.name)
+        _emit(self)
+
+def current_span():
+    return _current_span.get()
+
+def start_span(name, **attributes):
+    """Abre um span filho do span atual, para etapas que não cabem em um bloco with.
+
+    Quem abre precisa chamar span.end(). O span não vira o atual.
+    """
+    return Span(name, attributes, _current_span.get())
+
+@contextmanager
+def span(name, **attributes):
+    """Mede o bloco como uma etapa; spans abertos dentro dele ficam como filhos."""
+    current = Span(name, attributes, _current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current_span.reset(token)
+
+def annotate(**attributes):
+    """Acrescenta atributos ao span atual (sem efeito fora de um span)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def record_stage(name, seconds, **attributes):
+    """Registra uma etapa já medida (ex.: a soma dos trechos de exibição dos lotes)."""
+    if not ENABLED:
+        return
+    finished = Span(name, attributes, _current_span.get())
+    finished.end_ns = time.time_ns()
+    finished.start_ns = finished.end_ns - int(seconds * 1e9)
+    observe("stage_seconds", seconds, stage=name)
+    _emit(finished)
+
+# --- EXPORTAÇÃO ---
+
+def _append_line(path, record):
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}  # int64 vai como string no OTLP/JSON
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otel_attributes(attributes):
+    return [{"key": k, "value": _otel_value(v)} for k, v in attributes.items() if v is not None]
+
+def to_otel(finished):
+    """Span como ExportTraceServiceRequest em OTLP/JSON."""
+    record = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": _otel_attributes(finished.attributes),
+        # STATUS_CODE_ERROR = 2, STATUS_CODE_UNSET = 0
+        "status": {"code": 2, "message": finished.error} if finished.error else {"code": 0},
+    }
+    if finished.parent_id:
+        record["parentSpanId"] = finished.parent_id
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otel_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "text-to-sql"}, "spans": [record]}],
+    }]}
+
+def to_json(finished):
+    return {
+        "type": "span",
+        "name": finished.name,
+        "trace_id": finished.trace_id,
+        "span_id": finished.span_id,
+        "parent_id": finished.parent_id,
+        "start": finished.start_ns / 1e9,
+        "duration_ms": (finished.end_ns - finished.start_ns) / 1e6,
+        "error": finished.error,
+        "attributes": finished.attributes,
+    }
+
+def _emit(finished):
+    if not ENABLED:
+        return
+    try:
+        if JSONL_PATH:
+            _append_line(JSONL_PATH, to_json(finished))
+        if OTEL_SPANS_PATH:
+            _append_line(OTEL_SPANS_PATH, to_otel(finished))
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar o span '{finished.name}': {e}")
+
+def write_prometheus(path=None):
+    """Grava o texto do Prometheus de forma atômica (o textfile collector não lê arquivos pela metade)."""
+    path = path or PROMETHEUS_PATH
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+def flush():
+    """Grava o arquivo do Prometheus e um resumo no JSON lines, se configurados."""
+    if not ENABLED:
+        return
+    try:
+        if PROMETHEUS_PATH:
+            write_prometheus()
+        if JSONL_PATH:
+            _append_line(JSONL_PATH, {"type": "metrics", "time": time.time(), **snapshot()})
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar as métricas: {e}")
+
+atexit.register(flush)
+
+def describe():
+    """Resumo legível das etapas (contagem, média e percentis aproximados) e dos contadores."""
+    lines = []
+    for labels, h in sorted(REGISTRY.histograms("stage_seconds").items()):
+        stage = dict(labels).get("stage", "?")
+        p50, p95, p99 = (h.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+        lines.append(f"{stage:<12} {h.count:>5}x  média {h.sum / h.count * 1000:>8.1f} ms  "
+                     f"p50 ~{p50:.0f}  p95 ~{p95:.0f}  p99 ~{p99:.0f} ms")
+    for counter in snapshot()["counters"]:
+        labels = ", ".join(f"{k}={v}" for k, v in counter["labels"].items())
+        lines.append(f"{counter['name']}{f' ({labels})' if labels else ''}: {counter['value']}")
+    return "\n".join(lines) if lines else "Nenhuma métrica registrada ainda."
@@ -0,0 +1,330 @@
+import itertools
+import os
+import re
+from collections import namedtuple
+
+from result_stream import ResultStream, _strip_comments, detect_engine, is_streamable_query
+
+# --- PAGINAÇÃO DE RESULTADOS ---
+# Em vez de buscar o resultado inteiro, as consultas são lidas página a página.
+# Quando a consulta é um SELECT simples de uma tabela cuja chave primária
+# aparece no resultado, usa-se paginação por chave (keyset): cada página é
+#     SELECT * FROM (<consulta>) AS page_q WHERE (pk) > (última pk) ORDER BY pk LIMIT n
+# e o banco usa o índice da chave, então qualquer página custa o mesmo que a
+# primeira. Nos demais casos, a consulta roda uma vez em um cursor: no
+# PostgreSQL um cursor nomeado com SCROLL (voltar é um MOVE no servidor); no
+# MySQL um cursor sem buffer, reexecutado quando se volta para uma página anterior.
+# Em ambos os casos só a página atual fica na memória.
+
+PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "200"))
+
+# rows: linhas da página; number: índice da página (0 = primeira)
+Page = namedtuple("Page", "rows columns number has_next has_prev")
+
+POSTGRES_PK_QUERY = """
+    SELECT a.attname
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+    WHERE i.indrelid = %s::regclass AND i.indisprimary
+    ORDER BY array_position(i.indkey::int2[], a.attnum)
+"""
+
+MYSQL_PK_QUERY = """
+    SELECT COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+    ORDER BY ORDINAL_POSITION
+"""
+
+SQLITE_PK_QUERY = "SELECT name FROM pragma_table_info(?) WHERE pk > 0 ORDER BY pk"
+
+# SELECT <colunas> FROM <tabela> [alias] <resto>
+_SIMPLE_SELECT_RE = re.compile(
+    r"^\s*select\s+(?P<columns>.+?)\s+from\s+(?P<table>[\w.\"`]+)"
+    r"(?:\s+(?:as\s+)?(?!(?:%s)\b)(?P<alias>\w+))?(?P<rest>.*)$"
+    % "where|order|group|having|limit|offset|fetch|join|inner|left|right|full|cross|natural|union|intersect|except|window|for",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+# Construções com que a paginação por chave mudaria o resultado; um ORDER BY
+# que sobrou no resto é um que _ORDER_BY_RE não entendeu (ex.: lower(nome))
+_NOT_KEYSET_RE = re.compile(
+    r"\b(join|group\s+by|order\s+by|having|union|intersect|except|limit|offset|fetch|window|for\s+update)\b|,",
+    flags=re.IGNORECASE,
+)
+_ORDER_BY_RE = re.compile(r"\border\s+by\s+(?P<order>[^()]*)$", flags=re.IGNORECASE | re.DOTALL)
+
+_cursor_ids = itertools.count(1)
+
+def _unquote(identifier):
+    return identifier.strip().strip('"`')
+
+def _split_top_level(text):
+    """Divide por vírgulas fora de parênteses."""
+    parts, depth, current = [], 0, []
+    for c in text:
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        if c == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(c)
+    parts.append("".join(current))
+    return [part.strip() for part in parts]
+
+def _outside_parens(text):
+    """O texto sem os trechos entre parênteses (subconsultas, chamadas de função)."""
+    while True:
+        stripped = re.sub(r"\([^()]*\)", "", text)
+        if stripped == text:
+            return text
+        text = stripped
+
+def parse_simple_select(sql_query):
+    """Analisa um SELECT de uma única tabela.
+
+    Retorna (tabela, prefixos, colunas, corpo_sem_order_by, [(coluna, desc), ...])
+    ou None se a consulta tiver junções, agrupamentos, LIMIT etc.
+    """
+    body = _strip_comments(sql_query).strip().rstrip(";").strip()
+    match = _SIMPLE_SELECT_RE.match(body)
+    if not match or re.match(r"distinct\b", match.group("columns"), flags=re.IGNORECASE):
+        return None
+    rest = match.group("rest")
+    order = []
+    order_match = _ORDER_BY_RE.search(rest)
+    if order_match:
+        for item in _split_top_level(order_match.group("order")):
+            parts = item.split()
+            if not parts or len(parts) > 2 or (len(parts) == 2 and parts[1].lower() not in ("asc", "desc")):
+                return None
+            order.append((_unquote(parts[0].split(".")[-1]), len(parts) == 2 and parts[1].lower() == "desc"))
+        body = body[:len(body) - len(rest) + order_match.start()].rstrip()
+        rest = rest[:order_match.start()]
+    # Subconsultas no WHERE são permitidas; fora delas, nada de junções, LIMIT etc.
+    if _NOT_KEYSET_RE.search(_outside_parens(rest)):
+        return None
+    table = _unquote(match.group("table"))
+    prefixes = {table.split(".")[-1].lower(), table.lower()}
+    if match.group("alias"):
+        prefixes.add(match.group("alias").lower())
+    return table, prefixes, _split_top_level(match.group("columns")), body, order
+
+def primary_key_columns(db, db_engine, table):
+    """Colunas da chave primária da tabela, na ordem da chave ([] se não houver)."""
+    if db_engine == 'postgresql':
+        query, params = POSTGRES_PK_QUERY, (table,)
+    elif db_engine == 'mysql':
+        query, params = MYSQL_PK_QUERY, (table.split(".")[-1],)
+    else:
+        query, params = SQLITE_PK_QUERY, (table,)
+    cursor = db.cursor()
+    try:
+        cursor.execute(query, params)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _column_visible(column, items, prefixes):
+    """Indica se a coluna aparece no resultado com o próprio nome."""
+    for item in items:
+        name = item.lower().replace('"', "").replace("`", "")
+        if name == "*" or (name.endswith(".*") and name[:-2] in prefixes):
+            return True
+        qualifier, _, bare = name.rpartition(".")
+        if bare == column.lower() and (not qualifier or qualifier in prefixes):
+            return True
+    return False
+
+def find_keyset(db, db_engine, sql_query):
+    """Retorna (corpo_sem_order_by, colunas_da_chave, decrescente) ou None se não der para usar keyset."""
+    if not is_streamable_query(sql_query):
+        return None
+    parsed = parse_simple_select(sql_query)
+    if parsed is None:
+        return None
+    table, prefixes, items, body, order = parsed
+    try:
+        key = primary_key_columns(db, db_engine, table)
+    except Exception:
+        db.rollback()
+        return None
+    if not key or not all(_column_visible(column, items, prefixes) for column in key):
+        return None
+    if order:
+        # A ordem pedida precisa ser exatamente a da chave, num único sentido
+        if [name.lower() for name, _ in order] != [column.lower() for column in key]:
+            return None
+        if len({desc for _, desc in order}) > 1:
+            return None
+        return body, key, order[0][1]
+    return body, key, False
+
+class KeysetPager:
+    """Páginas por chave: cada página é uma consulta nova, a partir da última chave vista."""
+
+    mode = "keyset"
+
+    def __init__(self, db, body, key_columns, descending=False, page_size=PAGE_SIZE, on_close=None):
+        self.db = db
+        self.page_size = page_size
+        self.on_close = on_close
+        self.key_columns = key_columns
+        engine = detect_engine(db)
+        quote = '`' if engine == 'mysql' else '"'
+        placeholder = '%s' if engine in ('postgresql', 'mysql') else '?'
+        # Só a consulta com parâmetros precisa de '%' literal escapado: a da
+        # primeira página roda sem parâmetros e os drivers não desfazem o '%%'
+        param_body = body.replace("%", "%%") if placeholder == '%s' else body
+        keys = ", ".join(f"{quote}{column}{quote}" for column in key_columns)
+        direction = " DESC" if descending else ""
+        order = ", ".join(f"{quote}{column}{quote}{direction}" for column in key_columns)
+        comparison = "<" if descending else ">"
+        self._first_query = f"SELECT * FROM (\n{body}\n) AS page_q ORDER BY {order} LIMIT {page_size + 1}"
+        self._next_query = (f"SELECT * FROM (\n{param_body}\n) AS page_q WHERE ({keys}) {comparison} "
+                            f"({', '.join([placeholder] * len(key_columns))}) ORDER BY {order} LIMIT {page_size + 1}")
+        # _after[i]: chave da última linha da página i - 1 (None para a primeira página)
+        self._after = [None]
+        self.number = 0
+
+    def _fetch(self, number):
+        after = self._after[number]
+        cursor = self.db.cursor()
+        try:
+            if after is None:
+                cursor.execute(self._first_query)
+            else:
+                cursor.execute(self._next_query, after)
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+        finally:
+            cursor.close()
+            # Cada página é uma consulta independente: não deixa transação aberta entre elas
+            self.db.rollback()
+        has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if has_next and len(self._after) == number + 1:
+            positions = [columns.index(column) for column in self.key_columns]
+            self._after.append(tuple(rows[-1][i] for i in positions))
+        self.number = number
+        return Page(rows, columns, number, has_next, number > 0)
+
+    def first(self):
+        return self._fetch(0)
+
+    def next(self):
+        if self.number + 1 >= len(self._after):
+            return None
+        return self._fetch(self.number + 1)
+
+    def previous(self):
+        if self.number == 0:
+            return None
+        return self._fetch(self.number - 1)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+class CursorPager:
+    """Páginas lidas de um cursor: SCROLL no PostgreSQL, reexecução ao voltar nos demais."""
+
+    mode = "cursor"
+
+    def __init__(self, db, sql_query, page_size=PAGE_SIZE, on_close=None):
+        self.db = db
+        self.sql_query = sql_query
+        self.page_size = page_size
+        self.on_close = on_close
+        self.number = 0
+        self._scrollable = detect_engine(db) == 'postgresql' and is_streamable_query(sql_query)
+        self._cursor = None
+        self._stream = None
+        self._rows = None
+        self._extra = []
+        self._position = 0
+        self._has_next = False
+
+    def _open(self):
+        if self._scrollable:
+            self._cursor = self.db.cursor(name=f"tts_page_{next(_cursor_ids)}", scrollable=True)
+            self._cursor.execute(self.sql_query)
+        else:
+            if self._stream is not None:
+                self._stream.close()
+            self._stream = ResultStream(self.db, self.sql_query, self.page_size)
+            self._rows = iter(self._stream)
+            self._extra = []
+            self._position = 0
+
+    def _fetch(self, number):
+        if self._scrollable:
+            if self._cursor is None:
+                self._open()
+            # MOVE ABSOLUTE n deixa o cursor na linha n; o FETCH seguinte começa na n + 1
+            self._cursor.scroll(number * self.page_size, mode="absolute")
+            rows = self._cursor.fetchmany(self.page_size + 1)
+            columns = [desc[0] for desc in self._cursor.description] if self._cursor.description else []
+        else:
+            start = number * self.page_size
+            if self._stream is None or start < self._position:
+                # Cursor sem buffer não volta: reexecuta e descarta as linhas anteriores
+                self._open()
+            # A linha extra da página anterior (se houver) é a primeira desta
+            rows, self._extra = self._extra, []
+            skip = start - self._position
+            if skip > 0:
+                # Pula até o início da página
+                skip, rows = skip - len(rows), []
+                for _ in itertools.islice(self._rows, skip):
+                    pass
+            self._position = start
+            rows += itertools.islice(self._rows, self.page_size + 1 - len(rows))
+            columns = self._stream.columns
+            if len(rows) > self.page_size:
+                # A linha extra só indicava que há próxima página
+                self._extra = rows[self.page_size:]
+            self._position += min(len(rows), self.page_size)
+        self._has_next = len(rows) > self.page_size
+        self.number = number
+        return Page(rows[:self.page_size], columns, number, self._has_next, number > 0)
+
+    def first(self):
+        return self._fetch(0)
+
+    def next(self):
+        if not self._has_next:
+            return None
+        return self._fetch(self.number + 1)
+
+    def previous(self):
+        if self.number == 0:
+            return None
+        return self._fetch(self.number - 1)
+
+    def close(self):
+        cursor, self._cursor = self._cursor, None
+        stream, self._stream = self._stream, None
+        on_close, self.on_close = self.on_close, None
+        try:
+            if cursor is not None:
+                cursor.close()
+            if stream is not None:
+                stream.close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+def open_pager(db, sql_query, db_engine, page_size=PAGE_SIZE, on_close=None):
+    """Escolhe a paginação por chave quando possível e, senão, por cursor.
+
+    on_close é chamado quando o paginador fecha (ex.: para devolver a conexão ao pool).
+    """
+    keyset = find_keyset(db, db_engine, sql_query)
+    if keyset is not None:
+        body, key_columns, descending = keyset
+        return KeysetPager(db, body, key_columns, descending, page_size, on_close)
+    return CursorPager(db, sql_query, page_size, on_close)
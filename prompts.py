@@ -0,0 +1,200 @@
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+import introspection
+
+# --- PROMPT COMPACTO E PRÉ-COMPILADO ---
+# O schema vai para o modelo em uma linha por tabela, "tabela(coluna tipo, ...)",
+# com um vocabulário curto de tipos (ex.: "character varying(255)" -> "txt"),
+# em vez do texto "Tabela: / - coluna: tipo" exibido na interface. Chaves,
+# índices e linhas estimadas vêm como marcadores curtos (pk, fk>t.c, idx, ~48k)
+# para que o modelo prefira junções e filtros por colunas indexadas.
+# O prompt é dividido em duas partes:
+#   - prefixo: instruções + schema + exemplos, igual para todas as perguntas
+#     sobre o mesmo schema; é montado uma vez por schema e reaproveitado (e pode
+#     ir para o cache de contexto do modelo, ver context_cache.py);
+#   - pergunta: o único trecho que muda a cada chamada.
+# Os templates são divididos nos pontos de substituição uma única vez, na
+# importação: montar o prompt é só concatenar strings.
+
+# Estimativa grosseira usada nos relatórios de tamanho do prompt
+CHARS_PER_TOKEN = 4
+
+# Incremente sempre que o texto do prompt mudar, para que respostas antigas do
+# cache de SQL não sejam reaproveitadas
+PROMPT_VERSION = 3
+
+# Tipos do catálogo (PostgreSQL, MySQL e SQLite, em minúsculas) -> abreviação.
+# A primeira expressão que casar com o tipo inteiro vale; tipos desconhecidos
+# (enum(...), interval etc.) são mantidos como estão.
+TYPE_ABBREVIATIONS = [
+    (r"bool(ean)?|tinyint\(1\)|bit(\(1\))?", "bool"),
+    (r"(bigint|int8|bigserial)(\(\d+\))?( unsigned)?", "big"),
+    (r"(integer|int|int[24]|smallint|tinyint|mediumint|serial|smallserial)(\(\d+\))?( unsigned)?", "int"),
+    (r"(numeric|decimal|dec|money)(\(\d+(,\s*\d+)?\))?( unsigned)?", "dec"),
+    (r"(real|double precision|double|float[48]?)(\(\d+(,\s*\d+)?\))?( unsigned)?", "real"),
+    (r"(character varying|varchar|character|char|bpchar|nchar|nvarchar|text|tinytext|mediumtext|longtext"
+     r"|citext|name|clob)(\(\d+\))?", "txt"),
+    (r"timestamp with time zone|timestamptz|timestamp\(\d\) with time zone", "tstz"),
+    (r"timestamp( without time zone)?|datetime|timestamp\(\d\)( without time zone)?|datetime\(\d\)", "ts"),
+    (r"date", "date"),
+    (r"time( with(out)? time zone)?|timetz|time\(\d\)", "time"),
+    (r"jsonb?", "json"),
+    (r"uuid", "uuid"),
+    (r"bytea|blob|tinyblob|mediumblob|longblob|(var)?binary(\(\d+\))?", "bin"),
+    (r"array", "arr"),
+]
+_TYPE_PATTERNS = [(re.compile(pattern), abbreviation) for pattern, abbreviation in TYPE_ABBREVIATIONS]
+
+TYPE_LEGEND = ("int=inteiro, big=inteiro de 64 bits, dec=decimal, real=ponto flutuante, txt=texto, "
+               "bool=booleano, date=data, ts=data e hora, tstz=data e hora com fuso, time=hora, json, uuid, "
+               "bin=binário, arr=array")
+
+MARKER_LEGEND = ("pk=chave primária, fk>t.c=chave estrangeira para t.c, idx=indexada, uniq=indexada e única, "
+                 "idx(a,b)/uniq(a,b)=índice composto, ~N=linhas estimadas (k=mil, M=milhão)")
+
+PREFIX_TEMPLATE = """### INSTRUÇÕES ###
+Você é um tradutor de linguagem natural para SQL altamente eficiente.
+Sua única tarefa é retornar um código SQL bruto e executável, baseado no schema e na pergunta do usuário.
+NUNCA adicione texto antes ou depois do código SQL.
+NUNCA use formatação Markdown como ```sql.
+NUNCA adicione explicações ou comentários.
+
+### SCHEMA DO BANCO DE DADOS ###
+Uma linha por tabela: tabela(coluna tipo, ...). Tipos: {legend}.
+Marcadores: {markers}.
+Prefira junções por fk e filtros ou ordenações por colunas pk, idx, uniq ou pela 1ª coluna de um índice composto.
+Em tabelas grandes (~N alto), evite ler a tabela inteira sem necessidade.
+{schema}
+
+### EXEMPLOS DE RESPOSTA ###
+Pergunta: "Quantos alunos existem no total?"
+SQL: SELECT COUNT(*) FROM aluno;
+
+Pergunta: "Mostre o nome de todos os cursos."
+SQL: SELECT nome_curso FROM curso;
+
+Pergunta: "liste todas as tabelas"
+SQL: SHOW TABLES;
+
+"""
+
+QUESTION_TEMPLATE = """### TAREFA ATUAL ###
+Pergunta: "{pergunta}"
+SQL:"""
+
+def _compile(template, *fields):
+    """Divide o template nos campos, na ordem: ["texto", "campo", "texto", ...]."""
+    parts = [template]
+    for field in fields:
+        head, marker, tail = parts.pop().partition("{" + field + "}")
+        if not marker:
+            raise ValueError(f"Campo {field} não encontrado no template")
+        parts += [head, field, tail]
+    return parts
+
+_PREFIX_PARTS = _compile(PREFIX_TEMPLATE.replace("{legend}", TYPE_LEGEND).replace("{markers}", MARKER_LEGEND),
+                         "schema")
+_QUESTION_PARTS = _compile(QUESTION_TEMPLATE, "pergunta")
+
+def _render(parts, **values):
+    # Posições pares são texto fixo e ímpares, nomes de campos
+    return "".join(values[part] if i % 2 else part for i, part in enumerate(parts))
+
+class Prompt(namedtuple("Prompt", "prefix question")):
+    """Prompt dividido em prefixo fixo (por schema) e trecho da pergunta."""
+
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return self.prefix + self.question
+
+def abbreviate_type(col_type):
+    lowered = col_type.strip().lower()
+    for pattern, abbreviation in _TYPE_PATTERNS:
+        if pattern.fullmatch(lowered):
+            return abbreviation
+    return col_type.strip()
+
+def _column_name(name):
+    # Nomes com espaços ou pontuação ficam entre aspas para não confundir a lista
+    return name if re.fullmatch(r"[\w$]+", name) else f'"{name}"'
+
+def compact_rows(rows):
+    """Estimativa de linhas curta: 950, 48k, 1.2M."""
+    for limit, suffix in ((1_000_000_000, "G"), (1_000_000, "M"), (1000, "k")):
+        if rows >= limit:
+            return f"{rows / limit:.1f}".rstrip("0").rstrip(".") + suffix
+    return str(rows)
+
+def _names(columns):
+    return ",".join(_column_name(name) for name in columns)
+
+def compact_table(table):
+    """Uma linha por tabela: colunas com tipo e marcadores, depois linhas estimadas e chaves compostas."""
+    markers = {}
+
+    def mark(column, marker):
+        markers.setdefault(column, []).append(marker)
+
+    extras = [f"~{compact_rows(table.rows)}"] if table.rows is not None else []
+    if len(table.primary_key) == 1:
+        mark(table.primary_key[0], "pk")
+    elif table.primary_key:
+        extras.append(f"pk({_names(table.primary_key)})")
+    for fk in table.foreign_keys:
+        if len(fk.columns) == 1:
+            mark(fk.columns[0], f"fk>{fk.ref_table}" + (f".{fk.ref_columns[0]}" if fk.ref_columns else ""))
+        else:
+            extras.append(f"fk({_names(fk.columns)})>{fk.ref_table}"
+                          + (f"({_names(fk.ref_columns)})" if fk.ref_columns else ""))
+    kinds = {}
+    for index in table.indexes:
+        kind = "uniq" if index.unique else "idx"
+        key = tuple(index.columns)
+        # Índices repetidos sobre as mesmas colunas aparecem uma vez só (o único prevalece)
+        if kinds.get(key) != "uniq":
+            kinds[key] = kind
+    for columns, kind in kinds.items():
+        if len(columns) == 1:
+            mark(columns[0], kind)
+        else:
+            extras.append(f"{kind}({_names(columns)})")
+
+    line = f"{table.name}(" + ", ".join(
+        " ".join([_column_name(name), abbreviate_type(col_type)] + markers.get(name, []))
+        for name, col_type in table.columns) + ")"
+    return " ".join([line] + extras)
+
+def compact_schema(schema):
+    """Converte o texto de introspection.format_schema para uma linha por tabela com tipos abreviados."""
+    return "\n".join(compact_table(table) for table in introspection.parse_schema(schema))
+
+# Prefixos já montados, por schema (o schema podado muda com a pergunta). A
+# chave é o próprio texto: o hash de uma str é calculado uma vez e guardado
+# nela, então buscar o schema completo de novo não relê o texto.
+_prefix_cache = OrderedDict()
+_prefix_lock = threading.Lock()
+_PREFIX_CACHE_SIZE = 32
+
+def prefix_for(schema):
+    """Prefixo do prompt para o schema, montado só na primeira vez."""
+    with _prefix_lock:
+        prefix = _prefix_cache.get(schema)
+        if prefix is not None:
+            _prefix_cache.move_to_end(schema)
+            return prefix
+    prefix = _render(_PREFIX_PARTS, schema=compact_schema(schema))
+    with _prefix_lock:
+        _prefix_cache[schema] = prefix
+        while len(_prefix_cache) > _PREFIX_CACHE_SIZE:
+            _prefix_cache.popitem(last=False)
+    return prefix
+
+def build_prompt(schema, pergunta):
+    return Prompt(prefix_for(schema), _render(_QUESTION_PARTS, pergunta=pergunta))
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
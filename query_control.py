@@ -0,0 +1,113 @@
+import contextvars
+import os
+import threading
+import time
+
+from result_stream import detect_engine
+
+# --- TEMPO LIMITE E CANCELAMENTO DE CONSULTAS ---
+# Uma SQL gerada ruim (ex.: um produto cartesiano) não pode rodar para sempre.
+# O tempo limite é aplicado pelo próprio servidor em cada instrução
+# (statement_timeout no PostgreSQL, MAX_EXECUTION_TIME no MySQL) e a consulta
+# em andamento pode ser cancelada de outra thread: connection.cancel() no
+# psycopg2 e KILL QUERY por uma conexão auxiliar no MySQL.
+
+# Tempo máximo (segundos) de cada instrução; 0 desativa
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "60"))
+
+# Códigos de erro do MySQL para consulta interrompida / tempo limite excedido
+MYSQL_INTERRUPTED_ERRORS = (1317, 3024, 1969)
+
+class QueryCancelledError(Exception):
+    """A consulta foi cancelada pelo usuário antes de terminar."""
+
+def set_query_timeout(db, seconds=QUERY_TIMEOUT):
+    """Aplica o tempo limite por instrução na sessão da conexão."""
+    timeout_ms = int(seconds * 1000)
+    engine = detect_engine(db)
+    cursor = db.cursor()
+    try:
+        if engine == 'postgresql':
+            cursor.execute("SET statement_timeout = %s", (timeout_ms,))
+            # SET dentro de uma transação seria desfeito por um rollback posterior
+            db.commit()
+        elif engine == 'mysql':
+            try:
+                # MySQL 5.7+: vale para SELECTs
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (timeout_ms,))
+            except Exception:
+                # MariaDB: max_statement_time, em segundos
+                cursor.execute("SET SESSION max_statement_time = %s", (seconds,))
+    finally:
+        cursor.close()
+
+def cancel_query(db):
+    """Cancela a instrução em execução na conexão. Pode ser chamada de qualquer thread."""
+    engine = detect_engine(db)
+    if engine == 'postgresql':
+        db.cancel()
+    elif engine == 'mysql':
+        import pymysql
+        user = db.user.decode() if isinstance(db.user, bytes) else db.user
+        side = pymysql.connect(host=db.host, port=db.port, user=user, password=db.password)
+        try:
+            with side.cursor() as cursor:
+                cursor.execute("KILL QUERY %s", (db.thread_id(),))
+        finally:
+            side.close()
+    else:
+        raise ValueError("Cancelamento não suportado para esta conexão.")
+
+def is_cancel_error(e):
+    """Indica se o erro veio de cancelamento ou de tempo limite excedido no servidor."""
+    if isinstance(e, QueryCancelledError):
+        return True
+    if type(e).__name__ == "QueryCanceledError":  # psycopg2.extensions.QueryCanceledError
+        return True
+    args = getattr(e, "args", ())
+    return bool(args) and args[0] in MYSQL_INTERRUPTED_ERRORS
+
+def run_cancellable(db, func, *args):
+    """Executa func(*args) em uma thread; Ctrl-C cancela a instrução no servidor.
+
+    Sem isso, o Ctrl-C só seria tratado quando o driver devolvesse o controle,
+    ou seja, depois que a consulta terminasse.
+    """
+    outcome = {}
+    done = threading.Event()
+    # A thread herda o span atual (metrics.py), para que as etapas fiquem no mesmo trace
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            outcome['result'] = context.run(func, *args)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            done.set()
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    cancel_started = None
+    # Espera pelo Event e não por join(): um Ctrl-C durante o join pode deixar
+    # is_alive() falso com a thread ainda rodando, e o erro do cancelamento se perderia
+    while not done.is_set():
+        try:
+            done.wait(0.1)
+        except KeyboardInterrupt:
+            if cancel_started is None:
+                print("\nCancelando a consulta...")
+                cancel_started = time.perf_counter()
+                try:
+                    cancel_query(db)
+                except Exception as e:
+                    # Ex.: a conexão auxiliar do KILL QUERY foi recusada. A consulta
+                    # continua na thread e segura a conexão: segue esperando por ela,
+                    # e um novo Ctrl-C tenta cancelar de novo
+                    print(f"Não foi possível cancelar a consulta: {e}")
+                    cancel_started = None
+    if cancel_started is not None:
+        print(f"Cancelamento concluído em {(time.perf_counter() - cancel_started) * 1000:.0f} ms.")
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('result')
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+import metrics
+from schema_cache import get_cache_dir
+
+# --- CACHE DE RESPOSTAS PERGUNTA -> SQL ---
+# Evita chamar o Gemini de novo para uma pergunta já respondida contra o mesmo
+# schema. A chave combina a pergunta normalizada, o hash do schema, o nome do
+# modelo e a versão do template do prompt. Há duas camadas: um LRU em memória
+# e um SQLite persistente, ambos com TTL e limite de tamanho.
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+DEFAULT_TTL = float(os.getenv("SQL_CACHE_TTL", str(7 * 24 * 3600)))  # segundos
+
+def normalize_question(pergunta):
+    """Normaliza a pergunta para que variações triviais compartilhem a mesma entrada."""
+    pergunta = re.sub(r"\s+", " ", pergunta.strip().lower())
+    return pergunta.rstrip(" ?.!;")
+
+def make_key(pergunta, schema, model_name, template_version):
+    """Gera a chave do cache para (pergunta normalizada, schema, modelo, template)."""
+    schema_hash = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+    raw = "\x1f".join([normalize_question(pergunta), schema_hash, model_name, str(template_version)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Cache LRU em memória + SQLite persistente para SQL geradas pelo modelo."""
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path or os.path.join(get_cache_dir(), "response_cache.sqlite3")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # chave -> (sql, criado_em)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    sql TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key, sql, created_at):
+        self._memory[key] = (sql, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Retorna a SQL em cache para a chave, ou None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                metrics.inc("cache_requests_total", cache="sql", result="hit")
+                return entry[0]
+            self._memory.pop(key, None)
+
+            with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+                row = conn.execute("SELECT sql, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and not self._expired(row[1]):
+                    conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                    conn.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    metrics.inc("cache_requests_total", cache="sql", result="hit")
+                    return row[0]
+                if row:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+
+            self.misses += 1
+            metrics.inc("cache_requests_total", cache="sql", result="miss")
+            return None
+
+    def put(self, key, sql):
+        now = time.time()
+        with self._lock:
+            self._remember(key, sql, now)
+            with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, sql, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, sql, now, now)
+                )
+                # Remove do disco as entradas menos usadas além do limite
+                conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                conn.commit()
+
+    def invalidate(self, key=None):
+        """Remove a entrada informada (ou todo o cache, se key for None)."""
+        with self._lock:
+            with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+                if key is None:
+                    self._memory.clear()
+                    conn.execute("DELETE FROM responses")
+                else:
+                    self._memory.pop(key, None)
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
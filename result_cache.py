@@ -0,0 +1,386 @@
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+
+import metrics
+from result_stream import DEFAULT_BATCH_SIZE, _strip_comments, detect_engine, is_streamable_query
+from schema_cache import get_cache_dir
+
+# --- CACHE DE RESULTADOS DAS CONSULTAS ---
+# Reexecutar a mesma SQL (a mesma pergunta de novo, uma nova exportação) não
+# precisa ir ao banco se os dados não mudaram. A chave combina a SQL
+# normalizada, o banco/usuário e uma "versão dos dados" barata das tabelas
+# citadas na consulta:
+#   - PostgreSQL: n_tup_ins/upd/del de pg_stat_user_tables (e o relfilenode,
+#     que muda com TRUNCATE). Tabelas particionadas ou com herança entram com
+#     todas as filhas. Os contadores podem atrasar cerca de 1 s em relação ao
+#     commit; o TTL limita o efeito disso.
+#   - MySQL: UPDATE_TIME/CREATE_TIME de information_schema.TABLES, também para
+#     tabelas de outros bancos (banco.tabela). Como UPDATE_TIME tem resolução
+#     de 1 s, tabelas alteradas no último segundo não são cacheadas.
+# As tabelas citadas são procuradas por todos os identificadores da consulta
+# (sem aspas: na caixa do banco; entre aspas: como escritos). Se a consulta
+# cita uma view, a versão cobre todas as tabelas do banco. Se nenhuma tabela
+# for encontrada, ou alguma não tiver versão (tabela estrangeira, do
+# catálogo, sem estatísticas), a consulta roda sem cache.
+# Os resultados ficam em disco em formato colunar (uma lista por coluna,
+# pickle + zlib), com um índice SQLite e remoção LRU pelo total de bytes.
+# RESULT_CACHE=off desativa.
+
+ENABLED = os.getenv("RESULT_CACHE", "on").strip().lower() not in ("0", "off", "false", "no")
+DEFAULT_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Resultados maiores que isso não são guardados
+DEFAULT_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", "200000"))
+DEFAULT_TTL = float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))  # segundos
+
+# Funções cujo resultado muda a cada execução: consultas com elas não são cacheadas
+_VOLATILE_RE = re.compile(
+    r"\b(now|current_date|current_time|current_timestamp|localtime|localtimestamp|clock_timestamp|"
+    r"statement_timestamp|transaction_timestamp|timeofday|sysdate|curdate|curtime|utc_date|utc_time|"
+    r"utc_timestamp|unix_timestamp|random|rand|uuid|uuid_short|gen_random_uuid|nextval|setseed|"
+    r"pg_sleep|sleep|txid_current|connection_id|last_insert_id|found_rows)\b",
+    flags=re.IGNORECASE,
+)
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+_QUOTED_RE = re.compile(r'"((?:[^"]|"")+)"')
+_BACKTICK_RE = re.compile(r"`([^`]+)`")
+_MYSQL_IDENTIFIER = r"(?:`[^`]+`|[A-Za-z_][A-Za-z0-9_$]*)"
+_QUALIFIED_RE = re.compile(rf"({_MYSQL_IDENTIFIER})\s*\.\s*({_MYSQL_IDENTIFIER})")
+
+POSTGRES_IDENTITY_QUERY = """
+    SELECT current_database() || '@' || coalesce(host(inet_server_addr()), 'local') || ':'
+           || coalesce(inet_server_port()::text, '') || '/' || current_user
+"""
+
+# Relações com o nome de algum identificador da consulta, mais as partições e
+# tabelas filhas (que um SELECT na tabela mãe também lê)
+POSTGRES_VERSION_QUERY = """
+    WITH RECURSIVE rels(oid) AS (
+        SELECT c.oid
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'm', 'v', 'f')
+          AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+          AND c.relname = ANY(%(words)s)
+        UNION
+        SELECT i.inhrelid FROM pg_inherits i JOIN rels ON i.inhparent = rels.oid
+    )
+    SELECT c.oid, c.relkind, c.relfilenode, s.n_tup_ins + s.n_tup_upd + s.n_tup_del
+    FROM rels
+    JOIN pg_class c ON c.oid = rels.oid
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    ORDER BY c.oid
+"""
+
+# Consulta que cita uma view: todas as tabelas do banco
+POSTGRES_ALL_TABLES_QUERY = """
+    SELECT c.oid, c.relkind, c.relfilenode, s.n_tup_ins + s.n_tup_upd + s.n_tup_del
+    FROM pg_stat_user_tables s
+    JOIN pg_class c ON c.oid = s.relid
+    ORDER BY c.oid
+"""
+
+MYSQL_IDENTITY_QUERY = "SELECT CONCAT(DATABASE(), '@', @@hostname, ':', @@port, '/', CURRENT_USER()), NOW()"
+
+MYSQL_VERSION_QUERY = """
+    SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, UPDATE_TIME, CREATE_TIME, TABLE_SCHEMA = DATABASE()
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() OR TABLE_SCHEMA IN %(schemas)s
+    ORDER BY TABLE_SCHEMA, TABLE_NAME
+"""
+
+# Bancos do próprio MySQL: consultas a eles não são cacheadas
+MYSQL_SYSTEM_SCHEMAS = {"information_schema", "mysql", "performance_schema", "sys"}
+
+def normalize_sql(sql_query):
+    """Remove comentários, espaços repetidos e o ';' final (literais não são alterados de caixa)."""
+    return re.sub(r"\s+", " ", _strip_comments(sql_query)).strip().rstrip(";").strip()
+
+def is_cacheable(sql_query):
+    """Só consultas de leitura sem funções voláteis (NOW(), RANDOM()...)."""
+    return is_streamable_query(sql_query) and not _VOLATILE_RE.search(_strip_comments(sql_query))
+
+def make_key(sql_query, identity, version):
+    raw = "\x1f".join([normalize_sql(sql_query), identity, version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _referenced_words(sql_query, case_sensitive_quotes=False):
+    """Identificadores da consulta: um superconjunto das tabelas citadas.
+
+    Com case_sensitive_quotes (PostgreSQL), os entre aspas duplas mantêm a caixa.
+    """
+    text = _strip_comments(sql_query)
+    words = {word.lower() for word in _WORD_RE.findall(text)}
+    quoted = {name.replace('""', '"') for name in _QUOTED_RE.findall(text)}
+    words |= quoted if case_sensitive_quotes else {name.lower() for name in quoted}
+    words |= {name.lower() for name in _BACKTICK_RE.findall(text)}
+    return sorted(words)
+
+def _qualified_names(sql_query):
+    """Pares (banco, tabela) de nomes qualificados, em minúsculas (alias.coluna também aparece)."""
+    return {(schema.strip("`").lower(), name.strip("`").lower())
+            for schema, name in _QUALIFIED_RE.findall(_strip_comments(sql_query))}
+
+def _postgres_version(cursor, sql_query):
+    cursor.execute(POSTGRES_IDENTITY_QUERY)
+    identity = cursor.fetchone()[0]
+    cursor.execute(POSTGRES_VERSION_QUERY, {"words": _referenced_words(sql_query, case_sensitive_quotes=True)})
+    relations = cursor.fetchall()
+    if any(relkind == 'v' for _, relkind, _, _ in relations):
+        cursor.execute(POSTGRES_ALL_TABLES_QUERY)
+        relations = cursor.fetchall()
+    # Tabelas mãe particionadas não têm dados próprios: valem as partições
+    relations = [relation for relation in relations if relation[1] != 'p']
+    if not relations or any(relkind == 'f' or changes is None for _, relkind, _, changes in relations):
+        return None
+    return identity, ",".join(f"{oid}:{relfilenode}:{changes}" for oid, _, relfilenode, changes in relations)
+
+def _mysql_version(cursor, sql_query):
+    try:
+        # MySQL 8 guarda em cache as estatísticas de information_schema.TABLES por até 24 h
+        cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+    except Exception:
+        pass  # MySQL 5.7/MariaDB: a variável não existe e as estatísticas já são atuais
+    words = set(_referenced_words(sql_query))
+    qualified = _qualified_names(sql_query)
+    if any(schema in MYSQL_SYSTEM_SCHEMAS for schema, _ in qualified):
+        return None
+    cursor.execute(MYSQL_IDENTITY_QUERY)
+    identity, now = cursor.fetchone()
+    cursor.execute(MYSQL_VERSION_QUERY, {"schemas": tuple(sorted({schema for schema, _ in qualified})) or ("",)})
+    tables = cursor.fetchall()
+    referenced = [t for t in tables
+                  if (t[5] and t[1].lower() in words) or (t[0].lower(), t[1].lower()) in qualified]
+    if any(t[2] == 'VIEW' for t in referenced):
+        referenced = [t for t in tables if t[2] != 'VIEW']
+    if not referenced or any(t[2] != 'BASE TABLE' for t in referenced):
+        return None
+    updates = [t[3] for t in referenced if t[3] is not None]
+    if updates and now is not None and (now - max(updates)).total_seconds() < 1:
+        return None
+    return identity, ",".join(f"{schema}.{name}:{updated}:{created}"
+                              for schema, name, _, updated, created, _ in referenced)
+
+def data_version(db, sql_query):
+    """Retorna (identidade do banco, versão dos dados das tabelas citadas) ou None se não der para versionar.
+
+    None também quando nenhuma tabela citada é encontrada ou alguma delas não tem versão.
+    """
+    engine = detect_engine(db)
+    if engine not in ('postgresql', 'mysql'):
+        return None
+    cursor = db.cursor()
+    try:
+        if engine == 'postgresql':
+            return _postgres_version(cursor, sql_query)
+        return _mysql_version(cursor, sql_query)
+    finally:
+        cursor.close()
+        db.rollback()
+
+def to_columns(rows, n_columns):
+    """Linhas -> uma lista por coluna (comprime melhor que tuplas de tipos misturados)."""
+    if not rows:
+        return [[] for _ in range(n_columns)]
+    return [list(column) for column in zip(*rows)]
+
+def to_rows(columns_data):
+    return list(zip(*columns_data))
+
+class ResultCache:
+    """Resultados de consultas em disco (colunar, comprimido), com índice SQLite e remoção LRU."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, max_rows=DEFAULT_MAX_ROWS, ttl=DEFAULT_TTL):
+        self.directory = directory or os.path.join(get_cache_dir(), "results")
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, "index.sqlite3")
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with closing(sqlite3.connect(self.index_path, timeout=5)) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    bytes INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def _remove_files(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """Retorna (linhas, colunas) em cache para a chave, ou None."""
+        with self._lock:
+            with closing(sqlite3.connect(self.index_path, timeout=5)) as conn:
+                row = conn.execute("SELECT created_at FROM results WHERE key = ?", (key,)).fetchone()
+                payload = None
+                nbytes = 0
+                if row and not (self.ttl > 0 and time.time() - row[0] > self.ttl):
+                    try:
+                        with open(self._path(key), "rb") as f:
+                            blob = f.read()
+                        nbytes = len(blob)
+                        payload = pickle.loads(zlib.decompress(blob))
+                    except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+                        payload = None
+                if payload is None:
+                    if row:
+                        # Expirada ou arquivo ilegível
+                        conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                        conn.commit()
+                        self._remove_files([key])
+                    self.misses += 1
+                    metrics.inc("cache_requests_total", cache="result", result="miss")
+                    return None
+                conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            self.hits += 1
+        metrics.inc("cache_requests_total", cache="result", result="hit")
+        metrics.inc("result_cache_bytes_total", nbytes, direction="read")
+        return to_rows(payload["data"]), payload["columns"]
+
+    def put(self, key, rows, columns):
+        """Guarda o resultado; retorna False se ele for grande demais para o cache."""
+        if len(rows) > self.max_rows:
+            return False
+        columns = list(columns)
+        payload = {"columns": columns, "data": to_columns(rows, len(columns))}
+        blob = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        if len(blob) > self.max_bytes:
+            return False
+        now = time.time()
+        with self._lock:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, self._path(key))
+            with closing(sqlite3.connect(self.index_path, timeout=5)) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, bytes, rows, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, len(blob), len(rows), now, now)
+                )
+                # Remove as entradas menos usadas até o total caber em max_bytes
+                evicted = [k for (k,) in conn.execute("""
+                    SELECT key FROM (
+                        SELECT key, SUM(bytes) OVER (ORDER BY last_used DESC, key) AS running
+                        FROM results
+                    ) WHERE running > ?
+                """, (self.max_bytes,))]
+                conn.executemany("DELETE FROM results WHERE key = ?", [(k,) for k in evicted])
+                conn.commit()
+            self._remove_files(evicted)
+        metrics.inc("result_cache_bytes_total", len(blob), direction="write")
+        return True
+
+    def invalidate(self, key=None):
+        """Remove a entrada informada (ou todo o cache, se key for None)."""
+        with self._lock:
+            with closing(sqlite3.connect(self.index_path, timeout=5)) as conn:
+                if key is None:
+                    keys = [k for (k,) in conn.execute("SELECT key FROM results")]
+                    conn.execute("DELETE FROM results")
+                else:
+                    keys = [key]
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                conn.commit()
+            self._remove_files(keys)
+
+    def stats(self):
+        with self._lock:
+            with closing(sqlite3.connect(self.index_path, timeout=5)) as conn:
+                entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+class CachedResult:
+    """Resultado vindo do cache, com a mesma interface de leitura do ResultStream."""
+
+    from_cache = True
+
+    def __init__(self, rows, columns, latency, batch_size=DEFAULT_BATCH_SIZE):
+        self.rows = rows
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rowcount = len(rows)
+        self.rows_fetched = 0
+        self.first_batch_latency = latency
+
+    def batches(self):
+        for start in range(0, len(self.rows), self.batch_size):
+            batch = self.rows[start:start + self.batch_size]
+            self.rows_fetched += len(batch)
+            yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CachingStream:
+    """Envolve um ResultStream e guarda o resultado no cache se ele for lido até o fim.
+
+    As linhas só são acumuladas até o limite de linhas do cache; um stream
+    interrompido (cancelamento, erro) não é guardado.
+    """
+
+    from_cache = False
+
+    def __init__(self, stream, cache, key):
+        self.stream = stream
+        self.cache = cache
+        self.key = key
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def batches(self):
+        kept = []
+        for batch in self.stream.batches():
+            if kept is not None:
+                if len(kept) + len(batch) > self.cache.max_rows:
+                    kept = None
+                else:
+                    kept.extend(batch)
+            yield batch
+        if kept is not None and self.stream.columns:
+            self.cache.put(self.key, kept, self.stream.columns)
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
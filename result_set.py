@@ -0,0 +1,219 @@
+import bisect
+
+# --- RESULTADO EM COLUNAS ---
+# Em vez de uma lista de tuplas do driver (um objeto Python por célula e uma
+# tupla por linha), o resultado é guardado por coluna, lote a lote, em arrays
+# NumPy tipados: inteiros, reais e booleanos ocupam 8 (ou 1) bytes por célula,
+# com uma máscara de nulos só quando a coluna tem nulos. Colunas de outros
+# tipos (texto, datas, Decimal) ficam em arrays de objetos.
+# A conversão para pandas não copia os arrays, e a formatação para texto só
+# acontece nas células exibidas (results_grid) ou exportadas.
+# O NumPy só é importado quando o primeiro resultado é montado: importá-lo com
+# o módulo pesaria na abertura da GUI e da CLI (ver benchmarks/bench_startup.py).
+
+_KIND_DTYPES = {'int': 'int64', 'float': 'float64', 'bool': 'bool'}
+_PY_KINDS = {int: 'int', float: 'float', bool: 'bool'}
+
+def _column_kind(values):
+    """'int', 'float', 'bool', 'object' ou 'null' (só nulos)."""
+    types = set(map(type, values))
+    types.discard(type(None))
+    if not types:
+        return 'null'
+    kinds = {_PY_KINDS.get(t, 'object') for t in types}
+    if len(kinds) == 1:
+        return kinds.pop()
+    return 'float' if kinds == {'int', 'float'} else 'object'
+
+def _final_kind(kinds):
+    """Tipo da coluna inteira a partir dos tipos dos lotes."""
+    kinds = set(kinds) - {'null'}
+    if not kinds:
+        return 'object'
+    if len(kinds) == 1:
+        return kinds.pop()
+    return 'float' if kinds == {'int', 'float'} else 'object'
+
+class _Chunk:
+    """Valores de uma coluna em um lote: array tipado + máscara de nulos (ou None)."""
+
+    __slots__ = ("kind", "values", "mask")
+
+    def __init__(self, values):
+        import numpy as np
+
+        kind = _column_kind(values)
+        mask = None
+        array = None
+        if kind in _KIND_DTYPES:
+            filled = values
+            if None in values:
+                mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+                fill = float("nan") if kind == 'float' else 0
+                filled = [fill if v is None else v for v in values]
+            try:
+                array = np.array(filled, dtype=_KIND_DTYPES[kind])
+            except OverflowError:
+                # Inteiros fora do int64 ficam como objetos
+                kind, mask = 'object', None
+        if array is None:
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+        self.kind = kind
+        self.values = array
+        self.mask = mask
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, i):
+        if self.mask is not None and self.mask[i]:
+            return None
+        value = self.values[i]
+        return value.item() if self.kind in _KIND_DTYPES else value
+
+    def as_kind(self, kind):
+        """(valores, máscara) convertidos para o tipo final da coluna."""
+        import numpy as np
+
+        if kind == self.kind:
+            return self.values, self.mask
+        if self.kind == 'null' and kind in _KIND_DTYPES:
+            # Lote só com nulos em uma coluna tipada
+            values = np.full(len(self.values), np.nan) if kind == 'float' else \
+                np.zeros(len(self.values), dtype=_KIND_DTYPES[kind])
+            return values, np.ones(len(self.values), dtype=bool)
+        if kind == 'float' and self.kind == 'int':
+            values = self.values.astype('float64')
+            if self.mask is not None:
+                values[self.mask] = np.nan
+            return values, self.mask
+        values = np.empty(len(self.values), dtype=object)
+        values[:] = [self.get(i) for i in range(len(self.values))]
+        return values, None
+
+class ResultSet:
+    """Resultado de uma consulta guardado por coluna.
+
+    Também se comporta como uma sequência de tuplas (len, índice, iteração),
+    que é o que a tabela da GUI e o código antigo esperam.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._chunks = [[] for _ in self.columns]  # por coluna, um _Chunk por lote
+        self._starts = []  # linha inicial de cada lote
+        self._rows = 0
+        self._merged = {}  # coluna -> (valores, máscara) concatenados, sob demanda
+        self.truncated = False  # from_stream parou em max_rows antes do fim
+
+    @classmethod
+    def from_rows(cls, rows, columns):
+        result = cls(columns)
+        result.append(rows)
+        return result
+
+    @classmethod
+    def from_stream(cls, stream, max_rows=None):
+        """Monta o resultado lote a lote a partir de um ResultStream (até max_rows linhas, se informado)."""
+        result = cls(stream.columns)
+        for batch in stream.batches():
+            if max_rows is not None and len(result) + len(batch) > max_rows:
+                result.append(batch[:max_rows - len(result)])
+                result.truncated = True
+                break
+            result.append(batch)
+        return result
+
+    def append(self, batch):
+        """Acrescenta um lote de linhas (tuplas do driver)."""
+        if not batch:
+            return
+        for col_chunks, values in zip(self._chunks, zip(*batch)):
+            col_chunks.append(_Chunk(list(values)))
+        self._starts.append(self._rows)
+        self._rows += len(batch)
+        self._merged.clear()
+
+    def __len__(self):
+        return self._rows
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._rows
+        if not 0 <= i < self._rows:
+            raise IndexError("índice fora do resultado")
+        chunk = bisect.bisect_right(self._starts, i) - 1
+        return chunk, i - self._starts[chunk]
+
+    def value(self, i, col):
+        chunk, j = self._locate(i)
+        return self._chunks[col][chunk].get(j)
+
+    def __getitem__(self, i):
+        chunk, j = self._locate(i)
+        return tuple(col_chunks[chunk].get(j) for col_chunks in self._chunks)
+
+    def __iter__(self):
+        for chunk in range(len(self._starts)):
+            parts = [col_chunks[chunk] for col_chunks in self._chunks]
+            for j in range(len(parts[0]) if parts else 0):
+                yield tuple(part.get(j) for part in parts)
+
+    def column(self, col):
+        """(valores, máscara de nulos ou None) da coluna inteira, como arrays NumPy."""
+        import numpy as np
+
+        if col not in self._merged:
+            chunks = self._chunks[col]
+            if not chunks:
+                return np.empty(0, dtype=object), None
+            kind = _final_kind(c.kind for c in chunks)
+            parts = [c.as_kind(kind) for c in chunks]
+            if len(parts) == 1:
+                merged = parts[0]
+            else:
+                values = np.concatenate([v for v, _ in parts])
+                masks = [m if m is not None else np.zeros(len(v), dtype=bool) for v, m in parts]
+                merged = (values, np.concatenate(masks) if any(m is not None for _, m in parts) else None)
+            self._merged[col] = merged
+        return self._merged[col]
+
+    def argsort(self, col, descending=False):
+        """Ordem das linhas pela coluna (nulos por último; na ordem inversa, primeiro).
+
+        Retorna None para colunas de objetos, que a GUI ordena em Python.
+        """
+        import numpy as np
+
+        values, mask = self.column(col)
+        if values.dtype == object:
+            return None
+        nulls = mask if mask is not None else np.zeros(len(values), dtype=bool)
+        order = np.lexsort((values, nulls))
+        return (order[::-1] if descending else order).tolist()
+
+    def to_pandas(self, index=None):
+        """DataFrame que usa os mesmos arrays (sem cópia); nulos numéricos viram tipos anuláveis do pandas."""
+        # Importado só aqui: o pandas pesa na abertura da GUI e da CLI
+        import pandas as pd
+
+        arrays = []
+        for col in range(len(self.columns)):
+            values, mask = self.column(col)
+            if mask is not None and values.dtype == 'int64':
+                values = pd.arrays.IntegerArray(values, mask)
+            elif mask is not None and values.dtype == bool:
+                values = pd.arrays.BooleanArray(values, mask)
+            # float: os nulos já estão como NaN no próprio array
+            arrays.append(values)
+        # Nomes repetidos (ex.: dois "id" em um JOIN) não cabem em um dict: usa posições e renomeia
+        df = pd.DataFrame(dict(enumerate(arrays)), index=index, copy=False)
+        df.columns = self.columns
+        return df
+
+    @property
+    def nbytes(self):
+        """Bytes dos arrays (nas colunas de objetos, só as referências)."""
+        return sum(c.values.nbytes + (c.mask.nbytes if c.mask is not None else 0)
+                   for col_chunks in self._chunks for c in col_chunks)
@@ -0,0 +1,174 @@
+import itertools
+import os
+import re
+import time
+
+import metrics
+
+# --- EXECUÇÃO COM LEITURA EM STREAMING ---
+# Em vez de cursor.fetchall(), os resultados são lidos em lotes (fetchmany)
+# a partir de cursores do lado do servidor: cursores nomeados no psycopg2 e
+# SSCursor no PyMySQL. Assim um SELECT * em uma tabela enorme não precisa
+# caber inteiro na memória e o primeiro lote fica disponível logo.
+
+DEFAULT_BATCH_SIZE = int(os.getenv("FETCH_BATCH_SIZE", "1000"))
+
+# Início de uma transação só de leitura, por motor (a conexão devolvida ao
+# pool passa por rollback, que encerra a transação)
+READ_ONLY_STATEMENTS = {
+    'postgresql': "SET TRANSACTION READ ONLY",
+    'mysql': "START TRANSACTION READ ONLY",
+}
+
+# Contador para nomes únicos de cursores nomeados no PostgreSQL
+_cursor_ids = itertools.count(1)
+
+def detect_engine(db):
+    """Identifica o motor a partir do tipo da conexão ('postgresql', 'mysql' ou None)."""
+    # Conexões emprestadas de um pool (db_pool.PooledConnection) embrulham a do driver
+    module = type(getattr(db, "raw_connection", db)).__module__
+    if module.startswith("psycopg2"):
+        return 'postgresql'
+    if module.startswith("pymysql"):
+        return 'mysql'
+    return None
+
+def _strip_comments(sql_query):
+    sql_query = re.sub(r"--[^\n]*", " ", sql_query)
+    return re.sub(r"/\*.*?\*/", " ", sql_query, flags=re.DOTALL)
+
+def is_streamable_query(sql_query):
+    """Indica se a instrução pode ir para um cursor nomeado (DECLARE ... CURSOR FOR).
+
+    Só consultas simples de leitura: um único SELECT/WITH/VALUES/TABLE, sem
+    SELECT ... INTO nem CTEs que modificam dados.
+    """
+    body = _strip_comments(sql_query).strip().rstrip(";").strip()
+    if ";" in body:
+        return False
+    if not re.match(r"^\(*\s*(select|with|values|table)\b", body, flags=re.IGNORECASE):
+        return False
+    if re.search(r"\b(insert|update|delete|merge|into)\b", body, flags=re.IGNORECASE):
+        return False
+    return True
+
+class ResultStream:
+    """Executa uma instrução e entrega as linhas em lotes de até batch_size.
+
+    O primeiro lote é buscado já na abertura: ao retornar, columns está
+    disponível e first_batch_latency mede o tempo até as primeiras linhas.
+    on_close, se informado, é chamado uma vez quando o stream fecha (ex.: para
+    devolver a conexão ao pool). Com read_only, a instrução roda em uma
+    transação só de leitura (PostgreSQL e MySQL): o próprio banco recusa
+    escritas, inclusive as feitas por funções chamadas no SELECT.
+    """
+
+    def __init__(self, db, sql_query, batch_size=DEFAULT_BATCH_SIZE, on_close=None, read_only=False):
+        self.db = db
+        self.on_close = on_close
+        self.sql_query = sql_query
+        self.batch_size = batch_size
+        self.db_engine = detect_engine(db)
+        self.columns = []
+        self.rowcount = -1
+        self.rows_fetched = 0
+        self.first_batch_latency = None
+        self._pending = []
+        self._exhausted = False
+
+        self._fetch_span = None
+        start = time.perf_counter()
+        # "execute": até o primeiro lote; "fetch": do primeiro lote até o stream fechar
+        execution = metrics.start_span("execute", engine=self.engine_label)
+        try:
+            if read_only:
+                self._begin_read_only()
+            self._cursor = self._open_cursor()
+            self._cursor.execute(sql_query)
+            if self._named or self._cursor.description:
+                # Em cursores nomeados a descrição só existe após o primeiro fetch
+                self._pending = self._cursor.fetchmany(batch_size)
+            if self._cursor.description:
+                self.columns = [desc[0] for desc in self._cursor.description]
+            else:
+                self._exhausted = True
+            self.rowcount = self._cursor.rowcount
+        except Exception as e:
+            execution.end(error=e)
+            self.close()
+            raise
+        self.first_batch_latency = time.perf_counter() - start
+        execution.set(server_cursor=self._named)
+        execution.end()
+        self._fetch_span = metrics.start_span("fetch", engine=self.engine_label)
+        if len(self._pending) < batch_size:
+            self._exhausted = True
+
+    @property
+    def engine_label(self):
+        return self.db_engine or "other"
+
+    def _begin_read_only(self):
+        statement = READ_ONLY_STATEMENTS.get(self.db_engine)
+        if statement is None:
+            raise ValueError("Transação só de leitura não suportada para esta conexão.")
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    def _open_cursor(self):
+        self._named = False
+        if self.db_engine == 'postgresql' and is_streamable_query(self.sql_query):
+            self._named = True
+            cursor = self.db.cursor(name=f"tts_stream_{next(_cursor_ids)}")
+            cursor.itersize = self.batch_size
+            return cursor
+        if self.db_engine == 'mysql':
+            import pymysql.cursors
+            return self.db.cursor(pymysql.cursors.SSCursor)
+        return self.db.cursor()
+
+    def batches(self):
+        """Gera os lotes de linhas (listas de tuplas) conforme chegam do servidor."""
+        try:
+            if self._pending:
+                batch, self._pending = self._pending, []
+                self.rows_fetched += len(batch)
+                yield batch
+            while not self._exhausted:
+                batch = self._cursor.fetchmany(self.batch_size)
+                if len(batch) < self.batch_size:
+                    self._exhausted = True
+                if batch:
+                    self.rows_fetched += len(batch)
+                    yield batch
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        cursor, self._cursor = getattr(self, "_cursor", None), None
+        on_close, self.on_close = self.on_close, None
+        fetch_span, self._fetch_span = getattr(self, "_fetch_span", None), None
+        if fetch_span is not None:
+            fetch_span.set(rows=self.rows_fetched)
+            fetch_span.end()
+            metrics.inc("rows_fetched_total", self.rows_fetched, engine=self.engine_label)
+            metrics.observe("result_rows", self.rows_fetched, buckets=metrics.SIZE_BUCKETS, engine=self.engine_label)
+        try:
+            if cursor is not None:
+                cursor.close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
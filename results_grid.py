@@ -0,0 +1,220 @@
+import customtkinter as ctk
+
+# --- TABELA DE RESULTADOS VIRTUALIZADA ---
+# A tabela antiga criava um CTkFrame por linha e um CTkLabel por célula, o que
+# congelava a janela com dezenas de milhares de linhas. Aqui existe apenas um
+# conjunto fixo de linhas de widgets (as visíveis); ao rolar, os mesmos widgets
+# são reaproveitados com o conteúdo da nova posição. As linhas são lidas da
+# fonte (qualquer sequência com len() e índice) só quando ficam visíveis, e a
+# formatação das células também só acontece nesse momento.
+
+class VirtualResultsGrid(ctk.CTkFrame):
+    """Exibe uma fonte de linhas renderizando apenas a janela visível."""
+
+    def __init__(self, master, visible_rows=10, column_width=140, index_width=50, max_cell_chars=45, **kwargs):
+        super().__init__(master, **kwargs)
+        self.visible_rows = visible_rows
+        self.column_width = column_width
+        self.index_width = index_width
+        self.max_cell_chars = max_cell_chars
+
+        self.columns = []
+        self.source = []
+        self.order = None  # permutação de índices da fonte quando ordenada
+        self.sort_column = None
+        self.sort_desc = False
+        self.offset = 0
+        self.first_row_number = 1  # número exibido na primeira linha (páginas seguintes não começam em 1)
+        self._rendered_total = 0
+
+        self.header_buttons = []
+        self.row_widgets = []  # [frame, label_indice, [labels_celulas], paridade]
+
+        self.grid_columnconfigure(0, weight=1)
+        self.header_frame = ctk.CTkFrame(self)
+        self.body_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.message_label = ctk.CTkLabel(
+            self,
+            text="",
+            font=ctk.CTkFont(size=13),
+            text_color=("#6b7280", "#9ca3af")
+        )
+        self.message_label.grid(row=2, column=0, columnspan=2, pady=20)
+
+    def format_cell(self, valor):
+        text = str(valor)
+        return text[:self.max_cell_chars] + "..." if len(text) > self.max_cell_chars else text
+
+    def show_message(self, text, text_color=("#6b7280", "#9ca3af")):
+        """Esconde a tabela e mostra apenas uma mensagem."""
+        self.header_frame.grid_remove()
+        self.body_frame.grid_remove()
+        self.scrollbar.grid_remove()
+        self.message_label.configure(text=text, text_color=text_color)
+        self.message_label.grid()
+
+    def clear(self):
+        self.source = []
+        self.order = None
+        self.offset = 0
+        self.show_message("")
+
+    def set_columns(self, colunas):
+        """Recria o cabeçalho e o conjunto fixo de linhas para as colunas informadas."""
+        for widget in self.header_frame.winfo_children() + self.body_frame.winfo_children():
+            widget.destroy()
+        self.columns = list(colunas)
+        self.sort_column = None
+        self.sort_desc = False
+
+        index_header = ctk.CTkLabel(
+            self.header_frame,
+            text="#",
+            font=ctk.CTkFont(size=12, weight="bold"),
+            width=self.index_width,
+            anchor="center"
+        )
+        index_header.grid(row=0, column=0, padx=4, pady=4, sticky="ew")
+
+        # Clicar no cabeçalho ordena pela coluna (sem recriar widgets)
+        self.header_buttons = []
+        for i, coluna in enumerate(self.columns):
+            button = ctk.CTkButton(
+                self.header_frame,
+                text=coluna,
+                command=lambda i=i: self.sort_by(i),
+                font=ctk.CTkFont(size=12, weight="bold"),
+                width=self.column_width,
+                anchor="w",
+                fg_color="transparent",
+                hover_color=("gray80", "gray30"),
+                text_color=("#111827", "#f9fafb")
+            )
+            button.grid(row=0, column=i + 1, padx=4, pady=4, sticky="ew")
+            self.header_buttons.append(button)
+
+        self.row_widgets = []
+        for r in range(self.visible_rows):
+            row_frame = ctk.CTkFrame(self.body_frame, fg_color="transparent")
+            row_frame.grid(row=r, column=0, sticky="ew", pady=2)
+            index_label = ctk.CTkLabel(
+                row_frame,
+                text="",
+                font=ctk.CTkFont(size=11),
+                width=self.index_width,
+                anchor="center"
+            )
+            index_label.grid(row=0, column=0, padx=4, pady=4, sticky="ew")
+            cell_labels = []
+            for c in range(len(self.columns)):
+                cell_label = ctk.CTkLabel(
+                    row_frame,
+                    text="",
+                    font=ctk.CTkFont(size=11),
+                    width=self.column_width,
+                    anchor="w"
+                )
+                cell_label.grid(row=0, column=c + 1, padx=4, pady=4, sticky="ew")
+                cell_labels.append(cell_label)
+            self.row_widgets.append([row_frame, index_label, cell_labels, None])
+
+        self.message_label.grid_remove()
+        self.header_frame.grid(row=0, column=0, sticky="ew", padx=12, pady=(12, 8))
+        self.body_frame.grid(row=1, column=0, sticky="ew", padx=12)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+    def set_source(self, source, first_row_number=1):
+        """Define a fonte de linhas (sequência com len() e acesso por índice)."""
+        self.source = source
+        self.first_row_number = first_row_number
+        self.order = None
+        self.offset = 0
+        self.render()
+
+    def rows_appended(self):
+        """Avisa que a fonte cresceu (ex.: novo lote do ResultStream)."""
+        if self.order is not None:
+            # Linhas novas entram no fim da ordenação atual
+            self.order.extend(range(len(self.order), len(self.source)))
+        elif self._rendered_total >= self.offset + self.visible_rows:
+            # A janela visível já estava cheia: só a barra de rolagem muda
+            self._update_scrollbar()
+            return
+        self.render()
+
+    def sort_by(self, col_idx):
+        """Ordena pela coluna; um segundo clique inverte a ordem."""
+        if self.sort_column == col_idx:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column = col_idx
+            self.sort_desc = False
+
+        source = self.source
+        indices = range(len(source))
+
+        def key(i):
+            valor = source[i][col_idx]
+            # Nulos sempre por último (ou primeiro, na ordem inversa)
+            return (valor is None, 0 if valor is None else valor)
+
+        def text_key(i):
+            valor = source[i][col_idx]
+            return (valor is None, "" if valor is None else str(valor))
+
+        # Resultado colunar (result_set.ResultSet): ordena a coluna tipada com NumPy
+        order = source.argsort(col_idx, self.sort_desc) if hasattr(source, "argsort") else None
+        try:
+            self.order = order if order is not None else sorted(indices, key=key, reverse=self.sort_desc)
+        except TypeError:
+            # Tipos misturados na coluna: ordena pelo texto
+            self.order = sorted(indices, key=text_key, reverse=self.sort_desc)
+
+        for i, button in enumerate(self.header_buttons):
+            arrow = (" ▼" if self.sort_desc else " ▲") if i == col_idx else ""
+            button.configure(text=self.columns[i] + arrow)
+        self.offset = 0
+        self.render()
+
+    def scroll_rows(self, delta):
+        self.offset += int(delta)
+        self.render()
+
+    def _on_scrollbar(self, *args):
+        total = len(self.source)
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = self.visible_rows if args[2] == "pages" else 1
+            self.offset += int(args[1]) * step
+        self.render()
+
+    def render(self):
+        """Preenche as linhas de widgets com o conteúdo da janela visível."""
+        total = len(self.source)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+
+        for i, widgets in enumerate(self.row_widgets):
+            row_frame, index_label, cell_labels, parity = widgets
+            pos = self.offset + i
+            if pos >= total:
+                row_frame.grid_remove()
+                continue
+            row_index = self.order[pos] if self.order is not None else pos
+            linha = self.source[row_index]
+            index_label.configure(text=str(row_index + self.first_row_number))
+            for cell_label, valor in zip(cell_labels, linha):
+                cell_label.configure(text=self.format_cell(valor))
+            if parity != pos % 2:
+                row_frame.configure(fg_color=("gray90", "gray20") if pos % 2 == 0 else "transparent")
+                widgets[3] = pos % 2
+            row_frame.grid()
+
+        self._rendered_total = total
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.source)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
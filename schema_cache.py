@@ -0,0 +1,154 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+# --- CACHE LOCAL DO SCHEMA ---
+# O schema introspectado é guardado em um SQLite no diretório de cache do
+# usuário, indexado por (motor, host, banco, usuário). Ao conectar, uma
+# consulta barata calcula a "impressão digital" do catálogo; a introspecção
+# completa só é refeita quando ela muda.
+
+# Incremente quando o formato do texto do schema mudar (ver
+# introspection.format_schema): entradas antigas deixam de valer
+FORMAT_VERSION = 2
+
+APP_CACHE_NAME = "text-to-sql"
+
+def get_cache_dir():
+    """Retorna (e cria) o diretório de cache do usuário para a aplicação."""
+    base = os.getenv("TEXT_TO_SQL_CACHE_DIR")
+    if not base:
+        if sys.platform == "win32":
+            root = os.getenv("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+        elif sys.platform == "darwin":
+            root = os.path.expanduser("~/Library/Caches")
+        else:
+            root = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        base = os.path.join(root, APP_CACHE_NAME)
+    os.makedirs(base, exist_ok=True)
+    return base
+
+# PostgreSQL: relfilenode muda em reescritas da tabela e xmin muda a cada
+# alteração da linha no catálogo (ALTER TABLE, GRANT, novas colunas...).
+# Índices entram como relações ('i', 'I') e as restrições (chaves primárias e
+# estrangeiras) pelo pg_constraint. As estimativas de linhas não mudam a
+# impressão digital: ficam com o valor da última introspecção.
+POSTGRES_FINGERPRINT_QUERY = """
+    WITH rels AS (
+        SELECT c.oid, c.relfilenode, c.xmin
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname <> 'information_schema'
+          AND n.nspname NOT LIKE 'pg\\_%'
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f', 'i', 'I')
+    )
+    SELECT md5(
+        coalesce((SELECT string_agg(oid::text || ':' || relfilenode::text || ':' || xmin::text, ','
+                                    ORDER BY oid)
+                  FROM rels), '')
+        || '|' ||
+        coalesce((SELECT string_agg(a.attrelid::text || ':' || a.attnum::text || ':' || a.xmin::text, ','
+                                    ORDER BY a.attrelid, a.attnum)
+                  FROM pg_attribute a
+                  JOIN rels r ON r.oid = a.attrelid
+                  WHERE a.attnum > 0), '')
+        || '|' ||
+        coalesce((SELECT string_agg(con.oid::text || ':' || con.xmin::text, ',' ORDER BY con.oid)
+                  FROM pg_constraint con
+                  JOIN rels r ON r.oid = con.conrelid), '')
+    )
+"""
+
+# MySQL: CREATE_TIME muda quando a tabela é recriada/alterada e UPDATE_TIME
+# quando é modificada; índices e chaves estrangeiras entram pelos nomes e
+# colunas. O hash é calculado localmente para não depender do limite de
+# tamanho do GROUP_CONCAT.
+MYSQL_FINGERPRINT_QUERY = """
+    SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+    UNION ALL
+    SELECT CONCAT(TABLE_NAME, '.', INDEX_NAME), SEQ_IN_INDEX, COLUMN_NAME
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE()
+    UNION ALL
+    SELECT CONCAT(TABLE_NAME, '.', CONSTRAINT_NAME), REFERENCED_TABLE_NAME, NULL
+    FROM information_schema.REFERENTIAL_CONSTRAINTS
+    WHERE CONSTRAINT_SCHEMA = DATABASE()
+    ORDER BY 1, 2, 3
+"""
+
+def schema_fingerprint(db, db_engine):
+    """Calcula a impressão digital do catálogo com uma única consulta."""
+    cursor = db.cursor()
+    try:
+        if db_engine == 'postgresql':
+            cursor.execute(POSTGRES_FINGERPRINT_QUERY)
+            return cursor.fetchone()[0]
+        elif db_engine == 'mysql':
+            cursor.execute(MYSQL_FINGERPRINT_QUERY)
+            digest = hashlib.md5()
+            for row in cursor.fetchall():
+                digest.update("|".join(str(value) for value in row).encode("utf-8"))
+                digest.update(b"\n")
+            return digest.hexdigest()
+        raise ValueError("Motor de banco de dados inválido. Escolha 'mysql' ou 'postgresql'.")
+    finally:
+        cursor.close()
+
+class SchemaCache:
+    """Armazena schemas introspectados em um arquivo SQLite local."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), "schema_cache.sqlite3")
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_cache (
+                    engine TEXT NOT NULL,
+                    host TEXT NOT NULL,
+                    database TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    schema_text TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (engine, host, database, user)
+                )
+            """)
+            conn.commit()
+
+    def get(self, key, fingerprint):
+        """Retorna o schema salvo para a chave se a impressão digital ainda for a mesma."""
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            row = conn.execute(
+                "SELECT fingerprint, schema_text FROM schema_cache "
+                "WHERE engine = ? AND host = ? AND database = ? AND user = ?",
+                key
+            ).fetchone()
+        if row and row[0] == f"{FORMAT_VERSION}:{fingerprint}":
+            return row[1]
+        return None
+
+    def put(self, key, fingerprint, schema):
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_cache "
+                "(engine, host, database, user, fingerprint, schema_text, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, f"{FORMAT_VERSION}:{fingerprint}", schema, time.time())
+            )
+            conn.commit()
+
+    def invalidate(self, key=None):
+        """Remove a entrada da chave informada (ou todas, se key for None)."""
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn:
+            if key is None:
+                conn.execute("DELETE FROM schema_cache")
+            else:
+                conn.execute(
+                    "DELETE FROM schema_cache WHERE engine = ? AND host = ? AND database = ? AND user = ?",
+                    key
+                )
+            conn.commit()
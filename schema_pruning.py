@@ -0,0 +1,225 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, namedtuple
+
+import introspection
+import prompts
+
+# --- PODA DO SCHEMA POR RELEVÂNCIA ---
+# Em bancos grandes, enviar o schema inteiro em todo prompt deixa a chamada ao
+# modelo lenta e pode estourar a janela de contexto. Aqui montamos, uma vez por
+# schema, um índice BM25 sobre nomes de tabelas, colunas, tipos e tabelas
+# vizinhas por chave estrangeira (as declaradas no catálogo ou, se o banco não
+# declarar nenhuma, as inferidas pelos nomes das colunas). Para cada pergunta são escolhidas as top-k
+# tabelas mais relevantes e seus parceiros de junção, dentro de um orçamento.
+# O orçamento e o PruneReport contam caracteres do schema como ele vai para o
+# modelo (uma linha por tabela, ver prompts.compact_table).
+
+# Configuração (variáveis de ambiente)
+TOP_K = int(os.getenv("SCHEMA_PRUNE_TOP_K", "8"))
+MAX_CHARS = int(os.getenv("SCHEMA_PRUNE_MAX_CHARS", "24000"))
+# Schemas com até este número de tabelas são enviados inteiros
+MIN_TABLES = int(os.getenv("SCHEMA_PRUNE_MIN_TABLES", "15"))
+
+# Parâmetros clássicos do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "da", "do", "das", "dos",
+    "e", "ou", "em", "no", "na", "nos", "nas", "por", "para", "com", "sem", "que",
+    "qual", "quais", "quanto", "quantos", "quantas", "quem", "onde", "como", "mostre",
+    "mostrar", "liste", "listar", "exiba", "todos", "todas", "cada", "seu", "sua",
+    "seus", "suas", "mais", "menos", "the", "of", "and", "or", "in", "to", "show",
+    "list", "all", "by", "for", "with", "how", "many", "what", "which",
+}
+
+PruneReport = namedtuple(
+    "PruneReport",
+    ["tables_before", "tables_after", "chars_before", "chars_after", "pruned"]
+)
+
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def _stem(token):
+    # Radical aproximado: remove o plural simples e trunca, para que
+    # "alunos"/"aluno" e "professores"/"professor" coincidam.
+    if len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    return token[:6]
+
+def tokenize(text):
+    """Quebra texto e identificadores (snake_case, camelCase) em radicais."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    words = re.split(r"[^0-9a-zA-Z]+", _strip_accents(text).lower())
+    return [_stem(word) for word in words if word and word not in STOPWORDS and not word.isdigit()]
+
+def infer_foreign_keys(tables):
+    """Infere pares (tabela, tabela_referenciada) por convenção de nomes.
+
+    Colunas como curso_id, id_curso ou cursoId apontam para a tabela cujo
+    nome (sem schema) tem o mesmo radical.
+    """
+    by_stem = {}
+    for table in tables:
+        by_stem.setdefault(_stem(_strip_accents(table.name.split(".")[-1]).lower()), []).append(table.name)
+
+    edges = set()
+    for table in tables:
+        for col_name, _ in table.columns:
+            name = re.sub(r"([a-z])([A-Z])", r"\1_\2", col_name).lower()
+            match = re.fullmatch(r"(?:id_|fk_)?(.+?)(?:_id|_fk|_cod)?", name)
+            if not match or match.group(1) == name:
+                continue
+            for target in by_stem.get(_stem(_strip_accents(match.group(1))), []):
+                if target != table.name:
+                    edges.add((table.name, target))
+    return edges
+
+def declared_foreign_keys(tables):
+    """Pares (tabela, tabela_referenciada) das chaves estrangeiras do catálogo."""
+    return {(table.name, fk.ref_table) for table in tables for fk in table.foreign_keys}
+
+class SchemaIndex:
+    """Índice BM25 sobre as tabelas (introspection.Table) de um schema."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.neighbours = {table.name: set() for table in tables}
+        # Chaves declaradas são exatas; a inferência por nomes fica para bancos sem nenhuma
+        edges = declared_foreign_keys(tables) or infer_foreign_keys(tables)
+        for source, target in edges:
+            if source in self.neighbours and target in self.neighbours:
+                self.neighbours[source].add(target)
+                self.neighbours[target].add(source)
+
+        self.docs = {}
+        for table in tables:
+            terms = tokenize(table.name) * 2  # o nome da tabela pesa mais
+            for col_name, col_type in table.columns:
+                terms += tokenize(col_name) + tokenize(col_type)
+            for neighbour in self.neighbours[table.name]:
+                terms += tokenize(neighbour)
+            self.docs[table.name] = Counter(terms)
+        # Tamanho de cada tabela no prompt (mais a quebra de linha)
+        self.sizes = {table.name: len(prompts.compact_table(table)) + 1 for table in tables}
+        self.total_chars = sum(self.sizes.values())
+
+        self.avg_len = (sum(sum(doc.values()) for doc in self.docs.values()) / len(self.docs)) if self.docs else 0
+        doc_freq = Counter()
+        for doc in self.docs.values():
+            doc_freq.update(doc.keys())
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, pergunta):
+        """Retorna [(pontuação, tabela)] em ordem decrescente, só com pontuação > 0."""
+        query_terms = set(tokenize(pergunta))
+        scored = []
+        if not self.avg_len:
+            # Nenhuma tabela com termos indexáveis
+            return scored
+        for table, doc in self.docs.items():
+            doc_len = sum(doc.values())
+            total = 0.0
+            for term in query_terms:
+                tf = doc.get(term)
+                if tf:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self.avg_len)
+                    total += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            if total > 0:
+                scored.append((total, table))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def select(self, pergunta, top_k=TOP_K, max_chars=MAX_CHARS):
+        """Escolhe as tabelas a enviar: top-k por relevância + parceiros de junção.
+
+        Se nem a tabela mais relevante couber em max_chars, ela é escolhida
+        sozinha (prune_schema corta suas colunas).
+        """
+        sizes = self.sizes
+        selected = []
+        used = 0
+
+        def add(table):
+            nonlocal used
+            if table in selected or used + sizes[table] > max_chars:
+                return
+            selected.append(table)
+            used += sizes[table]
+
+        ranked = [table for _, table in self.score(pergunta)[:top_k]]
+        for table in ranked:
+            add(table)
+        for table in ranked:
+            for neighbour in sorted(self.neighbours[table]):
+                add(neighbour)
+        if not selected and ranked:
+            selected.append(ranked[0])
+        return selected
+
+# Índices já construídos, por hash do schema (poucos schemas ativos por processo)
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 4
+
+def get_index(schema):
+    """Retorna o índice do schema, construindo-o apenas na primeira vez."""
+    key = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = SchemaIndex(introspection.parse_schema(schema))
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def truncate_table(table, max_chars):
+    """Mantém as primeiras colunas da tabela que cabem em max_chars no formato compacto (ao menos uma)."""
+    columns = list(table.columns)
+    while len(columns) > 1 and len(prompts.compact_table(table._replace(columns=columns))) + 1 > max_chars:
+        columns.pop()
+    return table._replace(columns=columns)
+
+def prune_schema(schema, pergunta, top_k=TOP_K, max_chars=MAX_CHARS, min_tables=MIN_TABLES):
+    """Reduz o schema às tabelas relevantes para a pergunta.
+
+    Retorna (schema_reduzido, PruneReport). Quando o schema é pequeno ou nenhuma
+    tabela é relevante, o schema completo é mantido.
+    """
+    index = get_index(schema)
+    total_tables = len(index.tables)
+    selected = index.select(pergunta, top_k, max_chars) if total_tables > min_tables else []
+    if not selected:
+        return schema, PruneReport(total_tables, total_tables, index.total_chars, index.total_chars, False)
+
+    chosen = set(selected)
+    # Mantém a ordem original do schema
+    tables = [table if index.sizes[table.name] <= max_chars else truncate_table(table, max_chars)
+              for table in index.tables if table.name in chosen]
+    pruned = "".join(introspection.format_table(table) for table in tables).rstrip("\n") + "\n"
+    chars_after = sum(len(prompts.compact_table(table)) + 1 for table in tables)
+    return pruned, PruneReport(total_tables, len(chosen), index.total_chars, chars_after, True)
+
+def full_report(schema):
+    """PruneReport do schema enviado inteiro, sem poda."""
+    index = get_index(schema)
+    return PruneReport(len(index.tables), len(index.tables), index.total_chars, index.total_chars, False)
+
+def describe_report(report):
+    """Resumo legível do tamanho do schema antes e depois da poda."""
+    tokens_before = report.chars_before // prompts.CHARS_PER_TOKEN
+    if not report.pruned:
+        return f"schema completo: {report.tables_before} tabelas, ~{tokens_before} tokens"
+    return (f"schema podado: {report.tables_after}/{report.tables_before} tabelas, "
+            f"~{tokens_before} -> ~{report.chars_after // prompts.CHARS_PER_TOKEN} tokens")
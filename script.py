@@ -1,163 +1,674 @@
-import re
-import pandas as pd
-import psycopg2
-import pymysql
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import getpass
+import introspection
+import schema_cache
+import response_cache
+import schema_pruning
+import prompts
+import context_cache
+import result_stream
+import pagination
+import result_cache
+import export
+import result_set
+import query_control
+import sql_stream
+import cost_guard
+import db_pool
+import llm_client
+import fake_llm
+import llm_cassette
+import metrics
+import singleflight
+import hashlib
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Configurar a API Key do Gemini
-# Obtém a API Key da variável de ambiente
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("A variável de ambiente GOOGLE_API_KEY não está definida. Certifique-se de que o arquivo .env existe e contém a chave.")
+# --- INICIALIZAÇÃO SOB DEMANDA ---
+# Importar este módulo precisa ser rápido (a GUI o importa antes de abrir a
+# janela): os drivers de banco, o google.generativeai e o pandas só são
+# importados no primeiro uso, e o modelo só é configurado na primeira
+# pergunta, então listar bancos ou conectar funciona mesmo sem GOOGLE_API_KEY.
+# Medição: python benchmarks/bench_startup.py
 
-genai.configure(api_key=GOOGLE_API_KEY)
+# Modelo usado: 'gemini' (padrão) ou 'fake' (modelo local de fake_llm.py, para testes offline)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+MODEL_NAME = 'fake-llm' if LLM_BACKEND == "fake" else 'gemini-1.5-pro-latest'
 
-model = genai.GenerativeModel('gemini-1.5-pro-latest')
+# Modelo em uso (criado por get_model; testes e benchmarks podem atribuir outro)
+model = None
+_model_lock = threading.Lock()
 
-# --- FUNÇÃO PARA LISTAR BANCOS DE DADOS ---
-def list_databases(db_engine, user, password):
-    """Conecta ao servidor e lista os bancos de dados disponíveis."""
-    conn = None
-    cursor = None
-    db_list = []
-    
-    try:
-        if db_engine == 'postgresql':
-            conn = psycopg2.connect(host='localhost', dbname='postgres', user=user, password=password)
-            conn.set_session(autocommit=True)
-            cursor = conn.cursor()
-            # Query para listar bancos de dados de usuário, excluindo templates
-            cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false AND datname <> 'postgres';")
-            db_list = [row[0] for row in cursor.fetchall()]
-        
-        elif db_engine == 'mysql':
-            conn = pymysql.connect(host='localhost', user=user, password=password)
-            cursor = conn.cursor()
-            # Query para listar bancos de dados de usuário, excluindo os de sistema
-            cursor.execute("SELECT schema_name FROM information_schema.schemata WHERE schema_name NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys');")
-            db_list = [row[0] for row in cursor.fetchall()]
-            
-    except (psycopg2.Error, pymysql.Error) as e:
-        # Retorna o erro para ser tratado no loop principal
-        raise e
-    
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-            
-    return db_list
+# Cliente com limite de taxa e novas tentativas, compartilhado por CLI, GUI e batch
+_llm_client = None
 
-def connect_db(db_engine, user, password, database_name):
-    """Conecta ao banco de dados especificado."""
+# Threads que validam a SQL enquanto o restante da resposta do modelo chega
+_validation_executor = None
+
+# Gerações e execuções idênticas simultâneas compartilham uma só chamada (ver singleflight.py)
+_generation_flight = singleflight.SingleFlight("generate")
+_execution_flight = singleflight.SingleFlight("execute")
+
+# Host do servidor de banco de dados
+DB_HOST = 'localhost'
+
+# Cache local do schema (criado sob demanda)
+_schema_cache = None
+
+# Cache de respostas pergunta -> SQL (criado sob demanda)
+_sql_cache = None
+
+# Cache de resultados das consultas (criado sob demanda)
+_result_cache = None
+
+# Cache de contexto do prefixo do prompt (None: ainda não criado; ver context_cache.py)
+_context_cache = None
+_context_cache_ready = False
+
+def get_model():
+    """Retorna o modelo configurado por LLM_BACKEND/LLM_MODE, criando-o na primeira chamada."""
+    global model
+    with _model_lock:
+        if model is None:
+            model = _create_model()
+        return model
+
+def _create_model():
+    if llm_cassette.MODE == "replay":
+        # Respostas gravadas (ver llm_cassette.py): sem rede e sem chave de API
+        created = llm_cassette.ReplayModel(llm_cassette.Cassette(), MODEL_NAME)
+    elif LLM_BACKEND == "fake":
+        created = fake_llm.FakeModel.from_env()
+    else:
+        # Configurar a API Key do Gemini
+        # Obtém a API Key da variável de ambiente
+        GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+        if not GOOGLE_API_KEY:
+            raise ValueError("A variável de ambiente GOOGLE_API_KEY não está definida. Certifique-se de que o arquivo .env existe e contém a chave.")
+
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        created = genai.GenerativeModel(MODEL_NAME)
+
+    if llm_cassette.MODE == "record":
+        created = llm_cassette.RecordingModel(created, llm_cassette.Cassette(), MODEL_NAME)
+    return created
+
+def is_gemini_model(candidate):
+    """Indica se é o modelo real do Gemini (sem importar o google.generativeai)."""
+    return type(candidate).__module__.startswith("google.generativeai")
+
+def db_errors():
+    """Classes de erro dos drivers já importados, para usar em except.
+
+    Um driver que ainda não foi importado não pode ter levantado o erro.
+    """
+    return tuple(sys.modules[name].Error for name in ("psycopg2", "pymysql") if name in sys.modules)
+
+def preload(db_engine=None):
+    """Importa antecipadamente o driver do motor, o pandas e o google.generativeai (ex.: em segundo plano na GUI).
+
+    Erros são ignorados: o uso de verdade os mostra no momento certo.
+    """
+    modules = ["pandas"] + {"postgresql": ["psycopg2"], "mysql": ["pymysql"]}.get(db_engine, ["psycopg2", "pymysql"])
+    if LLM_BACKEND == "gemini" and llm_cassette.MODE != "replay":
+        modules.append("google.generativeai")
+    for name in modules:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+def open_connection(db_engine, user, password, database_name):
+    """Abre uma nova conexão com o banco (sem pool)."""
     if db_engine == 'postgresql':
+        import psycopg2
         db = psycopg2.connect(
-            host='localhost',
+            host=DB_HOST,
             database=database_name,
             user=user,
             password=password
         )
     elif db_engine == 'mysql':
+        import pymysql
         db = pymysql.connect(
-            host='localhost',
+            host=DB_HOST,
             user=user,
             password=password,
             database=database_name
         )
     else:
         raise ValueError("Motor de banco de dados inválido. Escolha 'mysql' ou 'postgresql'.")
+    if query_control.QUERY_TIMEOUT > 0:
+        # Tempo limite aplicado pelo servidor a cada instrução da sessão
+        query_control.set_query_timeout(db, query_control.QUERY_TIMEOUT)
     return db
 
+def get_pool(db_engine, user, password, database_name):
+    """Retorna o pool de conexões do banco (um pool por motor, usuário e banco)."""
+    if db_engine not in ('postgresql', 'mysql'):
+        raise ValueError("Motor de banco de dados inválido. Escolha 'mysql' ou 'postgresql'.")
+    # A senha entra na chave (como hash) para que outra senha não reaproveite conexões já autenticadas
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    key = (db_engine, DB_HOST, user, database_name, password_hash)
+    return db_pool.get_pool(key, lambda: open_connection(db_engine, user, password, database_name))
+
+def pool_stats():
+    """Estatísticas dos pools de conexão: {(motor, host, usuário, banco): stats}."""
+    return {key[:4]: stats for key, stats in db_pool.all_stats().items()}
+
+def close_pools():
+    """Fecha todas as conexões ociosas dos pools."""
+    db_pool.close_all()
+
+# --- FUNÇÃO PARA LISTAR BANCOS DE DADOS ---
+def list_databases(db_engine, user, password):
+    """Conecta ao servidor e lista os bancos de dados disponíveis."""
+    # Banco de manutenção usado só para a listagem
+    maintenance_db = 'postgres' if db_engine == 'postgresql' else None
+    with get_pool(db_engine, user, password, maintenance_db).getconn() as conn:
+        cursor = conn.cursor()
+        try:
+            if db_engine == 'postgresql':
+                # Query para listar bancos de dados de usuário, excluindo templates
+                cursor.execute("SELECT datname FROM pg_database WHERE datistemplate = false AND datname <> 'postgres';")
+            else:
+                # Query para listar bancos de dados de usuário, excluindo os de sistema
+                cursor.execute("SELECT schema_name FROM information_schema.schemata WHERE schema_name NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys');")
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+def connect_db(db_engine, user, password, database_name):
+    """Empresta uma conexão do pool do banco especificado.
+
+    A conexão retornada se comporta como a do driver; close() a devolve ao pool.
+    """
+    return get_pool(db_engine, user, password, database_name).getconn()
+
 def get_schema(db, db_engine):
-    """Obtém o esquema do banco de dados."""
-    cursor = db.cursor()
-    schema_parts = []
-    if db_engine == 'postgresql':
-        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema='public'")
-        tables = [row[0] for row in cursor.fetchall()]
-        for table in tables:
-            schema_parts.append(f"Tabela: {table}")
-            cursor.execute(f"""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_schema='public' AND table_name='{table}'
-                ORDER BY ordinal_position
-            """)
-            columns = cursor.fetchall()
-            for col_name, col_type in columns:
-                schema_parts.append(f"  - {col_name}: {col_type}")
-            schema_parts.append("")
-    else:  # MySQL
-        cursor.execute("SHOW TABLES")
-        tables = [row[0] for row in cursor.fetchall()]
-        for table in tables:
-            schema_parts.append(f"Tabela: {table}")
-            cursor.execute(f"DESCRIBE {table}")
-            columns = cursor.fetchall()
-            for col in columns:
-                schema_parts.append(f"  - {col[0]}: {col[1]}")
-            schema_parts.append("")
-    cursor.close()
-    return "\n".join(schema_parts)
-
-def generate_sql(schema, pergunta):
-    """Gera a consulta SQL a partir da pergunta em linguagem natural e do schema usando Gemini."""
-    prompt = f"""### INSTRUÇÕES ###
-Você é um tradutor de linguagem natural para SQL altamente eficiente.
-Sua única tarefa é retornar um código SQL bruto e executável, baseado no schema e na pergunta do usuário.
-NUNCA adicione texto antes ou depois do código SQL.
-NUNCA use formatação Markdown como ```sql.
-NUNCA adicione explicações ou comentários.
-
-### SCHEMA DO BANCO DE DADOS ###
-{schema}
-
-### EXEMPLOS DE RESPOSTA ###
-Pergunta: "Quantos alunos existem no total?"
-SQL: SELECT COUNT(*) FROM aluno;
-
-Pergunta: "Mostre o nome de todos os cursos."
-SQL: SELECT nome_curso FROM curso;
-
-Pergunta: "liste todas as tabelas"
-SQL: SHOW TABLES;
-
-### TAREFA ATUAL ###
-Pergunta: "{pergunta}"
-SQL:"""
-
-    response = model.generate_content(prompt)
-    
+    """Obtém o esquema do banco de dados (db pode ser uma conexão ou um pool).
+
+    O texto inclui chaves, índices e linhas estimadas; introspection.parse_schema
+    o converte de volta no modelo estruturado.
+    """
+    # Três consultas em massa ao catálogo por motor (ver introspection.py)
+    with db_pool.borrow(db) as conn:
+        tables = introspection.fetch_tables(conn, db_engine)
+    return introspection.format_schema(tables)
+
+def get_schema_cached(db, db_engine, user, database_name):
+    """Obtém o esquema usando o cache local quando o catálogo não mudou.
+
+    Retorna (schema, veio_do_cache). db pode ser uma conexão ou um pool.
+    """
+    with metrics.span("schema_load", engine=db_engine) as stage, db_pool.borrow(db) as conn:
+        schema, from_cache = _get_schema_cached(conn, db_engine, user, database_name)
+        stage.set(cached=from_cache, schema_chars=len(schema))
+        metrics.inc("cache_requests_total", cache="schema", result="hit" if from_cache else "miss")
+        return schema, from_cache
+
+def _get_schema_cached(db, db_engine, user, database_name):
+    global _schema_cache
+    try:
+        if _schema_cache is None:
+            _schema_cache = schema_cache.SchemaCache()
+        key = (db_engine, DB_HOST, database_name, user)
+        fingerprint = schema_cache.schema_fingerprint(db, db_engine)
+        schema = _schema_cache.get(key, fingerprint)
+        if schema is not None:
+            return schema, True
+    except Exception as e:
+        # Sem cache (ex.: sem permissão no catálogo): segue com a introspecção completa
+        print(f"Aviso: cache de schema indisponível: {e}")
+        db.rollback()
+        return get_schema(db, db_engine), False
+
+    schema = get_schema(db, db_engine)
+    try:
+        _schema_cache.put(key, fingerprint, schema)
+    except Exception as e:
+        print(f"Aviso: não foi possível atualizar o cache de schema: {e}")
+    return schema, False
+
+def get_sql_cache():
+    """Retorna o cache de respostas pergunta -> SQL (criado sob demanda)."""
+    global _sql_cache
+    if _sql_cache is None:
+        _sql_cache = response_cache.ResponseCache()
+    return _sql_cache
+
+def invalidate_sql_cache(schema=None, pergunta=None):
+    """Remove do cache a resposta de uma pergunta (ou todo o cache, sem argumentos)."""
+    if pergunta is None:
+        get_sql_cache().invalidate()
+        return
+    for prompt_schema in {schema, schema_pruning.prune_schema(schema, pergunta)[0]}:
+        get_sql_cache().invalidate(response_cache.make_key(pergunta, prompt_schema, MODEL_NAME, prompts.PROMPT_VERSION))
+
+def get_result_cache():
+    """Retorna o cache de resultados das consultas (criado sob demanda)."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = result_cache.ResultCache()
+    return _result_cache
+
+def result_cache_key(db, sql_query):
+    """Chave do cache de resultados para a consulta, ou None se ela não puder ser cacheada.
+
+    A chave inclui a versão atual dos dados das tabelas citadas, então uma
+    alteração nessas tabelas gera uma chave nova.
+    """
+    if not result_cache.ENABLED or not result_cache.is_cacheable(sql_query):
+        return None
+    try:
+        with db_pool.borrow(db) as conn:
+            version = result_cache.data_version(conn, sql_query)
+    except db_errors():
+        # Sem acesso às estatísticas: a consulta roda sem cache
+        return None
+    if version is None:
+        return None
+    return result_cache.make_key(sql_query, *version)
+
+def get_context_cache():
+    """Retorna o cache de contexto configurado por CONTEXT_CACHE, ou None se desativado."""
+    global _context_cache, _context_cache_ready
+    if not _context_cache_ready:
+        _context_cache = context_cache.from_env(MODEL_NAME, gemini_model=is_gemini_model(get_model()))
+        _context_cache_ready = True
+    return _context_cache
+
+def get_llm_client():
+    """Retorna o cliente compartilhado do modelo (limite de taxa, concorrência e novas tentativas)."""
+    global _llm_client
+    current = get_model()
+    if _llm_client is None:
+        _llm_client = llm_client.LLMClient(current)
+    # Permite trocar script.model (ex.: em testes) mantendo os limites compartilhados
+    _llm_client.model = current
+    return _llm_client
+
+def llm_stats():
+    """Estatísticas do cliente do modelo, ou None se ele ainda não foi criado (sem criar o modelo)."""
+    client = _llm_client
+    return client.stats() if client is not None else None
+
+def describe_llm_stats():
+    """Resumo das chamadas ao modelo feitas neste processo."""
+    stats = get_llm_client().stats()
+    return (f"Modelo: {stats['requests']} chamadas, {stats['retries']} novas tentativas "
+            f"({stats['rate_limited']} por limite de taxa), {stats['failures']} falhas; "
+            f"concorrência atual {stats['concurrency_limit']:.1f}.")
+
+def _prepare_generation(schema, pergunta, use_cache, prune, info):
+    """Poda o schema e consulta o cache. Retorna (prompts.Prompt, chave_do_cache, sql_do_cache).
+
+    Se o prefixo com o schema completo couber no cache de contexto, o schema
+    não é podado: o prefixo fica igual para todas as perguntas e só a pergunta
+    é enviada a cada chamada (ver _model_request).
+    """
+    with metrics.span("prompt", prune=prune) as stage:
+        cache = get_context_cache()
+        prompt = None
+        if cache is not None:
+            prompt = prompts.build_prompt(schema, pergunta)
+            if not cache.accepts(prompt.prefix):
+                prompt = None
+            elif prune:
+                info['prune'] = schema_pruning.full_report(schema)
+        if prompt is None and prune:
+            schema, info['prune'] = schema_pruning.prune_schema(schema, pergunta)
+
+        cache_key = response_cache.make_key(pergunta, schema, MODEL_NAME, prompts.PROMPT_VERSION)
+        info['cache_hit'] = False
+        info['tokens'] = None
+        if use_cache:
+            cached_sql = get_sql_cache().get(cache_key)
+            if cached_sql is not None:
+                info['cache_hit'] = True
+                stage.set(cache_hit=True)
+                return None, cache_key, cached_sql
+
+        context_cached = prompt is not None
+        if prompt is None:
+            prompt = prompts.build_prompt(schema, pergunta)
+        stage.set(cache_hit=False, context_cache=context_cached, prompt_chars=len(prompt.text))
+        return prompt, cache_key, None
+
+def _model_request(prompt):
+    """(texto, modelo) a enviar ao LLMClient.
+
+    Com o prefixo no cache de contexto, só o trecho da pergunta vai para um
+    modelo ligado ao prefixo; senão, o prompt inteiro vai para o modelo padrão (None).
+    """
+    cache = get_context_cache()
+    if cache is not None:
+        cached_model = cache.model_for(prompt.prefix, get_model())
+        if cached_model is not None:
+            return prompt.question, cached_model
+    return prompt.text, None
+
+def _extract_sql(response, cache_key):
+    """Limpa a resposta do modelo e guarda a SQL no cache."""
     # Mesmo com o prompt forte, adicionamos uma camada de limpeza para garantir.
     try:
-        sql_query = response.text.strip()
         # Remove potenciais marcações de código que o modelo pode adicionar
-        sql_query = re.sub(r"```(sql)?", "", sql_query, flags=re.IGNORECASE)
-        sql_query = sql_query.strip()
-        return sql_query
+        sql_query = sql_stream.clean_sql(response.text)
     except Exception as e:
         print(f"Erro ao extrair texto da resposta do modelo: {e}")
         # Retorna a resposta bruta para depuração se houver um erro inesperado
         # na estrutura da resposta (o que é raro com generate_content)
         return response.candidates[0].content.parts[0].text if response.candidates else ""
 
-def execute_sql(db, sql_query):
-    """Executa a consulta SQL e retorna os resultados com nomes das colunas."""
-    current_cursor = db.cursor()
-    current_cursor.execute(sql_query)
-    resultados = current_cursor.fetchall()
-    colunas = []
-    if current_cursor.description:
-        colunas = [desc[0] for desc in current_cursor.description]
-    current_cursor.close()
-    return resultados, colunas
+    if sql_query:
+        get_sql_cache().put(cache_key, sql_query)
+    return sql_query
+
+def _generation_key(schema, pergunta, use_cache, prune):
+    # O próprio texto do schema entra na chave: o hash de uma str é calculado uma vez e guardado nela
+    return (pergunta, schema, use_cache, prune)
+
+def _share_info(info, leader_info, shared):
+    """Copia para info os detalhes da geração feita pela chamada líder."""
+    info.update(leader_info)
+    info['coalesced'] = shared
+    if shared:
+        # Os tokens foram gastos (e contados) pela líder
+        info['tokens'] = None
+
+def generate_sql(schema, pergunta, use_cache=True, prune=True, info=None):
+    """Gera a consulta SQL a partir da pergunta em linguagem natural e do schema usando Gemini.
+
+    Com prune=True, só as tabelas relevantes para a pergunta vão para o prompt.
+    Com use_cache=True, respostas anteriores para a mesma pergunta e schema são
+    reaproveitadas sem chamar o modelo. Se info (dict) for informado, recebe
+    detalhes da geração: 'prune' (PruneReport), 'cache_hit', 'tokens' (tokens de
+    entrada, em cache de contexto e de saída; None quando a SQL veio do cache) e
+    'coalesced'. Chamadas simultâneas com a mesma pergunta, schema e opções
+    compartilham uma única geração (ver singleflight.py); nas que esperaram pela
+    primeira, 'coalesced' é True e 'tokens' é None.
+    Erros 429/5xx da API são refeitos com espera exponencial (ver llm_client.py).
+    """
+    if info is None:
+        info = {}
+    (sql_query, leader_info), shared = _generation_flight.do(
+        _generation_key(schema, pergunta, use_cache, prune), _generate_sql, schema, pergunta, use_cache, prune)
+    _share_info(info, leader_info, shared)
+    return sql_query
+
+def _generate_sql(schema, pergunta, use_cache, prune):
+    info = {}
+    prompt, cache_key, cached_sql = _prepare_generation(schema, pergunta, use_cache, prune, info)
+    if cached_sql is not None:
+        return cached_sql, info
+    with metrics.span("llm", model=MODEL_NAME):
+        text, cached_model = _model_request(prompt)
+        info['tokens'] = {}
+        response = get_llm_client().generate_content(text, model=cached_model, usage=info['tokens'])
+        return _extract_sql(response, cache_key), info
+
+async def generate_sql_async(schema, pergunta, use_cache=True, prune=True, info=None):
+    """Versão assíncrona de generate_sql, com os mesmos limites de taxa, novas tentativas e agrupamento."""
+    if info is None:
+        info = {}
+    (sql_query, leader_info), shared = await _generation_flight.do_async(
+        _generation_key(schema, pergunta, use_cache, prune),
+        lambda: _generate_sql_async(schema, pergunta, use_cache, prune))
+    _share_info(info, leader_info, shared)
+    return sql_query
+
+async def _generate_sql_async(schema, pergunta, use_cache, prune):
+    info = {}
+    prompt, cache_key, cached_sql = _prepare_generation(schema, pergunta, use_cache, prune, info)
+    if cached_sql is not None:
+        return cached_sql, info
+    with metrics.span("llm", model=MODEL_NAME):
+        text, cached_model = _model_request(prompt)
+        info['tokens'] = {}
+        response = await get_llm_client().generate_content_async(text, model=cached_model, usage=info['tokens'])
+        return _extract_sql(response, cache_key), info
+
+def _get_validation_executor():
+    global _validation_executor
+    if _validation_executor is None:
+        _validation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sql-validate")
+    return _validation_executor
+
+def generate_sql_stream(schema, pergunta, use_cache=True, prune=True, info=None, on_text=None, validate=None,
+                        db_engine=None):
+    """Como generate_sql, mas recebendo a resposta do modelo em streaming.
+
+    on_text(texto) é chamado com cada trecho da SQL assim que chega, já sem as
+    marcações ```sql. Quando a primeira instrução termina (';'), validate(sql),
+    se informado, começa a rodar em outra thread enquanto o restante da resposta
+    chega; se a SQL final for essa instrução, o retorno de validate vai para
+    info['validation'] e, se a validação falhar, o erro do banco é levantado.
+    Além de 'prune', 'cache_hit' e 'tokens', info recebe 'ttft' (tempo até o primeiro
+    trecho), 'statement_time' (até a instrução completa) e 'total_time', em
+    segundos.
+    """
+    if info is None:
+        info = {}
+    start = time.perf_counter()
+    info['ttft'] = info['statement_time'] = info['total_time'] = None
+    info['validation'] = None
+    prompt, cache_key, cached_sql = _prepare_generation(schema, pergunta, use_cache, prune, info)
+    if cached_sql is not None:
+        if on_text:
+            on_text(cached_sql)
+        info['ttft'] = info['statement_time'] = info['total_time'] = time.perf_counter() - start
+        return cached_sql
+
+    stripper = sql_stream.FenceStripper()
+    detector = sql_stream.StatementDetector(backslash_escapes=(db_engine == 'mysql'))
+    validation = None
+    raw_parts = []
+
+    def feed(text):
+        nonlocal validation
+        if not text:
+            return
+        if on_text:
+            on_text(text)
+        statement = detector.feed(text)
+        if statement is not None:
+            info['statement_time'] = time.perf_counter() - start
+            if validate:
+                validation = _get_validation_executor().submit(validate, statement)
+
+    with metrics.span("llm", model=MODEL_NAME, stream=True) as stage:
+        text, cached_model = _model_request(prompt)
+        info['tokens'] = {}
+        for chunk in get_llm_client().generate_content_stream(text, model=cached_model, usage=info['tokens']):
+            if info['ttft'] is None:
+                info['ttft'] = time.perf_counter() - start
+            raw_parts.append(chunk)
+            feed(stripper.feed(chunk))
+        feed(stripper.flush())
+        stage.set(ttft_ms=round(info['ttft'] * 1000) if info['ttft'] is not None else None)
+    info['total_time'] = time.perf_counter() - start
+    if info['statement_time'] is None and detector.finish():
+        # Instrução sem ';': só fica completa no fim da resposta
+        info['statement_time'] = info['total_time']
+
+    sql_query = sql_stream.clean_sql("".join(raw_parts))
+    if validation is not None and sql_stream.clean_sql(detector.statement) == sql_query:
+        # Levanta o erro do banco se a SQL for inválida
+        info['validation'] = validation.result()
+    if sql_query:
+        get_sql_cache().put(cache_key, sql_query)
+    return sql_query
+
+def describe_generation(info):
+    """Origem e tempos da geração (preenchidos por generate_sql_stream em info)."""
+    if info.get('coalesced'):
+        return "compartilhada com uma pergunta idêntica em andamento"
+    if info.get('cache_hit'):
+        return "resposta do cache"
+    parts = []
+    if info.get('ttft') is not None:
+        parts.append(f"1º trecho em {info['ttft'] * 1000:.0f} ms")
+    if info.get('statement_time') is not None:
+        parts.append(f"instrução completa em {info['statement_time'] * 1000:.0f} ms")
+    if info.get('tokens'):
+        parts.append(describe_tokens(info['tokens']))
+    return ", ".join(parts) or "gerada pelo modelo"
+
+def describe_tokens(tokens):
+    """Tokens de entrada da pergunta (e quantos vieram do cache de contexto)."""
+    approx = "~" if tokens['source'] == "estimate" else ""
+    text = f"{approx}{tokens['input']} tokens de entrada"
+    if tokens['cached']:
+        text += f" ({tokens['cached']} do cache de contexto)"
+    return text
+
+def stream_sql(db, sql_query, batch_size=result_stream.DEFAULT_BATCH_SIZE, read_only=False):
+    """Executa a consulta com cursor do lado do servidor e retorna um ResultStream.
+
+    As linhas são lidas em lotes de batch_size via stream.batches(); ao
+    retornar, o primeiro lote já foi buscado e stream.columns está disponível.
+    Se db for um pool, a conexão emprestada é devolvida quando o stream fecha.
+    Com read_only, a consulta roda em uma transação só de leitura.
+    """
+    if not isinstance(db, db_pool.ConnectionPool):
+        return result_stream.ResultStream(db, sql_query, batch_size, read_only=read_only)
+    conn = db.getconn()
+    try:
+        return result_stream.ResultStream(conn, sql_query, batch_size, on_close=conn.close, read_only=read_only)
+    except BaseException:
+        conn.close()
+        raise
+
+def stream_sql_cached(db, sql_query, batch_size=result_stream.DEFAULT_BATCH_SIZE, read_only=False):
+    """Como stream_sql, mas consulta antes o cache de resultados.
+
+    Em um acerto, retorna um result_cache.CachedResult sem ir ao banco; senão,
+    o stream é lido normalmente e, se chegar ao fim, o resultado é guardado.
+    """
+    start = time.perf_counter()
+    key = result_cache_key(db, sql_query)
+    if key is None:
+        return stream_sql(db, sql_query, batch_size, read_only)
+    cache = get_result_cache()
+    hit = cache.get(key)
+    if hit is not None:
+        rows, columns = hit
+        return result_cache.CachedResult(rows, columns, time.perf_counter() - start, batch_size)
+    return result_cache.CachingStream(stream_sql(db, sql_query, batch_size, read_only), cache, key)
+
+def execute_sql(db, sql_query, use_cache=True, max_rows=None):
+    """Executa a consulta SQL e retorna os resultados com nomes das colunas.
+
+    Os resultados são um result_set.ResultSet (colunar, montado lote a lote),
+    que também pode ser lido como uma sequência de tuplas ou virar um
+    DataFrame com to_pandas(). Com max_rows, a leitura para nesse número de
+    linhas e o ResultSet fica com truncated=True se havia mais.
+    db pode ser uma conexão ou um pool (a conexão é emprestada só durante a consulta).
+    Com use_cache, resultados já vistos com a mesma versão dos dados vêm do cache.
+    Consultas de leitura idênticas no mesmo pool, ao mesmo tempo, são executadas
+    uma vez só e todas recebem o mesmo ResultSet (que não deve ser alterado).
+    """
+    if not isinstance(db, db_pool.ConnectionPool) or not result_stream.is_streamable_query(sql_query):
+        return _execute_sql(db, sql_query, use_cache, max_rows)
+    return _execution_flight.do((db, sql_query, use_cache, max_rows),
+                                _execute_sql, db, sql_query, use_cache, max_rows)[0]
+
+def _execute_sql(db, sql_query, use_cache, max_rows):
+    with (stream_sql_cached(db, sql_query) if use_cache else stream_sql(db, sql_query)) as stream:
+        return result_set.ResultSet.from_stream(stream, max_rows), stream.columns
+
+def singleflight_stats():
+    """Chamadas agrupadas pelo single-flight: {'generate': stats, 'execute': stats}."""
+    return {flight.name: flight.stats() for flight in (_generation_flight, _execution_flight)}
+
+def describe_singleflight():
+    stats = singleflight_stats()
+    return ("Chamadas idênticas simultâneas agrupadas: "
+            + ", ".join(f"{name} {s['coalesced']} de {s['leaders'] + s['coalesced']}" for name, s in stats.items())
+            + ".")
+
+def open_pager(db, sql_query, db_engine, page_size=pagination.PAGE_SIZE):
+    """Abre a consulta para leitura página a página (ver pagination.py).
+
+    Se db for um pool, a conexão fica emprestada ao paginador até pager.close().
+    """
+    if not isinstance(db, db_pool.ConnectionPool):
+        return pagination.open_pager(db, sql_query, db_engine, page_size)
+    conn = db.getconn()
+    try:
+        return pagination.open_pager(conn, sql_query, db_engine, page_size, on_close=conn.close)
+    except BaseException:
+        conn.close()
+        raise
+
+def print_result_stream(stream):
+    """Imprime os resultados no terminal à medida que os lotes chegam."""
+    if not stream.columns:
+        print("Comando executado com sucesso, sem resultados para exibir.")
+        stream.close()
+        return
+    offset = 0
+    render_time = 0.0
+    for batch in stream.batches():
+        start = time.perf_counter()
+        df = result_set.ResultSet.from_rows(batch, stream.columns).to_pandas(index=range(offset, offset + len(batch)))
+        print(df.to_string(header=(offset == 0)))
+        render_time += time.perf_counter() - start
+        offset += len(batch)
+    # A exibição se intercala com a leitura: registra a soma dos trechos de cada lote
+    metrics.record_stage("render", render_time, interface="cli", rows=offset)
+    if offset == 0:
+        print("Nenhum resultado encontrado ou comando executado sem retorno.")
+    else:
+        origem = "do cache de resultados em" if getattr(stream, "from_cache", False) else "primeiro lote em"
+        print(f"({offset} linhas; {origem} {stream.first_batch_latency * 1000:.0f} ms)")
+
+def print_page(page, page_size=pagination.PAGE_SIZE):
+    """Imprime uma página de resultados com a numeração global das linhas."""
+    if not page.columns:
+        print("Comando executado com sucesso, sem resultados para exibir.")
+        return
+    if not page.rows:
+        print("Nenhum resultado encontrado.")
+        return
+    start = page.number * page_size
+    df = result_set.ResultSet.from_rows(page.rows, page.columns).to_pandas(index=range(start, start + len(page.rows)))
+    print(df.to_string())
+    ultima = "" if page.has_next else ", última"
+    print(f"(página {page.number + 1}, linhas {start + 1} a {start + len(page.rows)}{ultima})")
+
+def browse_pages(db, sql_query, db_engine, page_size=pagination.PAGE_SIZE):
+    """Mostra o resultado página a página; o usuário navega com 'p' e 'a'."""
+    pager = open_pager(db, sql_query, db_engine, page_size)
+    try:
+        print(f"(paginação por {'chave' if pager.mode == 'keyset' else 'cursor'}, {page_size} linhas por página)")
+        page = query_control.run_cancellable(db, pager.first)
+        while True:
+            print_page(page, page_size)
+            if not (page.has_next or page.has_prev):
+                break
+            comando = input("[p] próxima, [a] anterior, Enter encerra a navegação: ").strip().lower()
+            if comando == 'p' and page.has_next:
+                page = query_control.run_cancellable(db, pager.next)
+            elif comando == 'a' and page.has_prev:
+                page = query_control.run_cancellable(db, pager.previous)
+            elif not comando:
+                break
+    finally:
+        pager.close()
+
+def print_export_progress(progress):
+    rate = progress.rows / progress.elapsed if progress.elapsed > 0 else 0
+    print(f"\rExportando... {progress.rows} linhas ({rate:.0f} linhas/s, {progress.bytes / 1024 / 1024:.1f} MiB)",
+          end="", flush=True)
 
 def main_loop():
     db_engine = input("Se você deseja utilizar mySQL digite 'mysql', se deseja utilizar PostgreSQL digite 'postgresql': ").strip().lower()
@@ -188,7 +699,7 @@ def main_loop():
             except ValueError:
                 print("Entrada inválida. Por favor, digite um número.")
     
-    except (psycopg2.Error, pymysql.Error) as e:
+    except db_errors() as e:
         print(f"Erro ao listar bancos de dados. Verifique suas credenciais. Erro: {e}")
         return
     except Exception as e:
@@ -196,52 +707,152 @@ def main_loop():
         return
     
     # O resto do código continua como antes, agora com o database_name selecionado
+    start = time.perf_counter()
     try:
-        db = connect_db(db_engine, user, password, database_name)
+        pool = get_pool(db_engine, user, password, database_name)
+        db = pool.getconn()
         print("Conectado ao banco de dados com sucesso!")
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados '{database_name}': {e}")
         return
 
     try:
-        schema = get_schema(db, db_engine)
+        schema, from_cache = get_schema_cached(db, db_engine, user, database_name)
+        elapsed = time.perf_counter() - start
         print("\nEsquema do banco de dados:")
         print(schema)
+        origem = "cache (conexão a quente)" if from_cache else "introspecção completa (conexão a frio)"
+        print(f"Schema carregado via {origem} em {elapsed * 1000:.0f} ms.")
     except Exception as e:
         print(f"Erro ao obter o schema: {e}")
         if db:
             db.close()
         return
 
+    print("\nComandos: 'cache' mostra as estatísticas dos caches de SQL e de resultados, 'limpar cache' os esvazia,")
+    print("'pool' mostra as conexões abertas, 'paginar' liga ou desliga a exibição página a página,")
+    print("'exportar arquivo.csv' (ou .csv.gz, .parquet) grava o resultado completo da última consulta;")
+    print("'metricas' mostra os tempos por etapa e os contadores da sessão;")
+    print("comece a pergunta com '!' para ignorar os caches e consultar o modelo e o banco novamente.")
+
+    paging = False
+    last_sql = None
     while True:
         pergunta = input("\nDigite sua pergunta em linguagem natural (ou 'sair' para terminar): ")
         if pergunta.lower() == 'sair':
             break
+        if pergunta.strip().lower() == 'cache':
+            stats = get_sql_cache().stats()
+            print(f"Cache de SQL: {stats['hits']} acertos, {stats['misses']} falhas, "
+                  f"{stats['memory_entries']} entradas em memória.")
+            print(describe_llm_stats())
+            stats = get_result_cache().stats()
+            print(f"Cache de resultados: {stats['hits']} acertos, {stats['misses']} falhas, "
+                  f"{stats['entries']} resultados ({stats['bytes'] / 1024:.0f} KiB).")
+            if get_context_cache() is not None:
+                stats = get_context_cache().stats()
+                print(f"Cache de contexto ({stats['backend']}): {stats['hits']} acertos, {stats['misses']} falhas, "
+                      f"{stats['entries']} prefixos ({stats['tokens']} tokens).")
+            continue
+        if pergunta.strip().lower() == 'pool':
+            for (engine, host, pool_user, pool_db), stats in pool_stats().items():
+                print(f"Pool {engine}://{pool_user}@{host}/{pool_db or ''}: {stats['in_use']} em uso, "
+                      f"{stats['idle']} ociosas (máx. {stats['max_size']}), {stats['waits']} esperas "
+                      f"({stats['wait_time'] * 1000:.0f} ms), {stats['discarded']} descartadas.")
+            continue
+        if pergunta.strip().lower() in ('metricas', 'métricas'):
+            print(metrics.describe())
+            continue
+        if pergunta.strip().lower() == 'paginar':
+            paging = not paging
+            print(f"Paginação {'ligada' if paging else 'desligada'} ({pagination.PAGE_SIZE} linhas por página).")
+            continue
+        comando_exportar = re.match(r"^exportar(?:\s+(\S+\.(?:csv|csv\.gz|gz|parquet|pq)))?$", pergunta.strip(),
+                                    flags=re.IGNORECASE)
+        if comando_exportar:
+            destino = comando_exportar.group(1)
+            if not destino:
+                print("Uso: exportar resultado.csv (ou .csv.gz, .parquet)")
+            elif not last_sql:
+                print("Nenhuma consulta para exportar ainda.")
+            else:
+                try:
+                    # Reexecuta a consulta gravando direto no arquivo (Ctrl-C cancela)
+                    result = query_control.run_cancellable(
+                        db, export.export_query, db, last_sql, destino, None, print_export_progress)
+                    print(f"\n{export.describe(result)}")
+                except db_errors() as e:
+                    db.rollback()
+                    print(f"\nErro ao exportar: {e}")
+                except Exception as e:
+                    print(f"\nErro ao exportar: {e}")
+            continue
+        if pergunta.strip().lower() == 'limpar cache':
+            invalidate_sql_cache()
+            get_result_cache().invalidate()
+            print("Caches de SQL e de resultados esvaziados.")
+            continue
+
+        use_cache = not pergunta.startswith('!')
+        pergunta = pergunta.lstrip('!').strip()
 
         try:
-            sql_query = generate_sql(schema, pergunta)
-            print("\n🔎 SQL gerada:")
-            print(sql_query)
-
-            resultados, colunas = execute_sql(db, sql_query)
-            print("\nResultados da consulta:")
-            if resultados:
-                if colunas:
-                    df = pd.DataFrame(list(resultados), columns=colunas)
-                    print(df.to_string())
-                else: # Para queries que não retornam colunas (ex: DDL)
-                    print("Comando executado com sucesso, sem resultados para exibir.")
-            else:
-                print("Nenhum resultado encontrado ou comando executado sem retorno.")
+            # Uma pergunta = um trace: as etapas abaixo ficam como spans filhos
+            with metrics.span("question", interface="cli", use_cache=use_cache) as question:
+                info = {}
+                print("\n🔎 SQL gerada:")
+                try:
+                    # A SQL aparece à medida que o modelo a gera e é validada assim que a instrução termina
+                    sql_query = generate_sql_stream(
+                        schema, pergunta, use_cache=use_cache, info=info,
+                        on_text=lambda text: print(text, end="", flush=True),
+                        validate=lambda sql: cost_guard.check(pool, sql), db_engine=db_engine,
+                    )
+                except KeyboardInterrupt:
+                    print("\nGeração interrompida.")
+                    continue
+                print(f"\n\n({schema_pruning.describe_report(info['prune'])}; {describe_generation(info)})")
+
+                # Estimativa do plano (já feita durante o streaming, se a SQL não mudou depois)
+                decision = info['validation'] or cost_guard.check(pool, sql_query)
+                print(cost_guard.describe(decision))
+                if decision.action == 'block':
+                    question.set(blocked=True)
+                    print("Consulta não executada. Reformule a pergunta ou ajuste COST_GUARD_* para permitir.")
+                    invalidate_sql_cache(schema, pergunta)
+                    continue
+                # A exportação usa a SQL completa, sem o LIMIT da estimativa de custo
+                last_sql = sql_query
+                if paging and result_stream.is_streamable_query(sql_query):
+                    # A navegação espera o usuário: fica fora da duração da pergunta
+                    question.set(paging=True)
+                    question.end()
+                    # Só a página atual é lida: o LIMIT da estimativa de custo não é necessário
+                    print("\nResultados da consulta (Ctrl-C cancela):")
+                    browse_pages(db, sql_query, db_engine)
+                    continue
+                if decision.action == 'limit':
+                    sql_query = decision.sql
+
+                print("\nResultados da consulta (Ctrl-C cancela):")
+                # Executa em outra thread para que o Ctrl-C cancele a instrução no servidor
+                query_control.run_cancellable(db, lambda: print_result_stream(
+                    (stream_sql_cached if use_cache else stream_sql)(db, sql_query)))
         
-        except (psycopg2.Error, pymysql.Error) as e:
-            print(f"Erro ao processar a consulta: {e}")
+        except db_errors() as e:
             db.rollback() # Importante para PostgreSQL em caso de erro na transação
+            if query_control.is_cancel_error(e):
+                print(f"Consulta cancelada ou tempo limite excedido: {e}")
+            else:
+                print(f"Erro ao processar a consulta: {e}")
+                # Não reaproveitar do cache uma SQL que falhou
+                invalidate_sql_cache(schema, pergunta)
         except Exception as e:
             print(f"Ocorreu um erro inesperado: {e}")
 
     if db:
         db.close()
+    close_pools()
     print("Programa encerrado.")
 
 if __name__ == "__main__":
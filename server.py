@@ -0,0 +1,590 @@
+"""Modo servidor: API HTTP (asyncio, só biblioteca padrão) para gerar e executar SQL.
+
+Endpoints (respostas em JSON; parâmetros na query string ou em um corpo JSON):
+
+    GET  /health                          -> estado do serviço, pools e requisições em andamento
+    GET  /metrics                         -> métricas no formato texto do Prometheus
+    GET  /databases                       -> bancos disponíveis no servidor
+    GET  /schema?database=...             -> schema em texto e estruturado (chaves, índices, linhas)
+    POST /generate {"question": ...}      -> SQL gerada, origem, tokens e tempos
+    POST /execute  {"sql": ...}           -> resultado em NDJSON
+    POST /ask      {"question": ...}      -> gera e executa; resultado em NDJSON
+
+Todos aceitam "database" (padrão: --database), que precisa estar em
+SERVER_DATABASES ou, sem essa lista, existir no servidor. /execute e /ask aceitam
+"max_rows" e todos os que geram ou executam aceitam "use_cache" (padrão true).
+As respostas NDJSON têm uma linha de cabeçalho ({"columns": [...]}, com "sql"
+em /ask), uma lista de valores por linha do resultado e uma linha final com o
+total ({"rows": n, ...}) ou com o erro ({"error": ...}): quando a leitura falha
+no meio, o status HTTP já foi enviado.
+As linhas são lidas do banco em lotes por threads do servidor e enviadas
+conforme chegam; com clientes lentos, a leitura espera o envio.
+
+Cada requisição executa uma única instrução. Só instruções de leitura são
+executadas, dentro de uma transação só de leitura, a não ser com
+--allow-writes. Com
+SERVER_TOKEN definido, as requisições precisam do cabeçalho
+"Authorization: Bearer <token>" (/health não).
+
+Uso:
+    python server.py --engine postgresql --user postgres --database meu_banco
+    python server.py --engine mysql --user root --database meu_banco --host 0.0.0.0 --port 8080
+
+A senha é lida da variável DB_PASSWORD ou pedida no terminal.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextvars
+import getpass
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import cost_guard
+import db_pool
+import introspection
+import metrics
+import query_control
+import result_stream
+import schema_pruning
+import script
+import sql_stream
+
+# --- CONFIGURAÇÃO ---
+
+# Threads para o trabalho bloqueante (banco e modelo); o pool de conexões e o
+# limite de concorrência do modelo (llm_client.py) continuam valendo
+WORKERS = int(os.getenv("SERVER_WORKERS", "32"))
+# Por quanto tempo (s) o schema de um banco é reaproveitado sem checar o catálogo
+SCHEMA_TTL = float(os.getenv("SERVER_SCHEMA_TTL", "60"))
+# Linhas enviadas por resultado, no máximo (o cliente pode pedir menos com max_rows)
+MAX_ROWS = int(os.getenv("SERVER_MAX_ROWS", "100000"))
+# Tamanho máximo do corpo das requisições, em bytes
+MAX_BODY = int(os.getenv("SERVER_MAX_BODY", str(1024 * 1024)))
+TOKEN = os.getenv("SERVER_TOKEN")
+# Bancos que as requisições podem usar (separados por vírgula); vazio: os que existem no servidor
+DATABASES = [name.strip() for name in os.getenv("SERVER_DATABASES", "").split(",") if name.strip()]
+
+# Conexões ociosas (keep-alive) são fechadas depois deste tempo (s)
+IDLE_TIMEOUT = 30
+# Lotes já codificados à espera de envio, por resposta em streaming
+STREAM_QUEUE_SIZE = 8
+
+_READ_ONLY_RE = re.compile(r"^\s*(show|describe|desc)\b", re.IGNORECASE)
+
+class HTTPError(Exception):
+    """Erro com o status HTTP que deve ser devolvido ao cliente."""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = HTTPStatus(status)
+        self.details = details
+
+class Request:
+    """Requisição já lida: método, caminho, parâmetros (query string + corpo JSON) e cabeçalhos."""
+
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path.rstrip("/") or "/"
+        self.headers = headers
+        self.params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError as e:
+                raise HTTPError(400, f"Corpo JSON inválido: {e}") from None
+            if not isinstance(data, dict):
+                raise HTTPError(400, "O corpo deve ser um objeto JSON.")
+            self.params.update(data)
+
+    def get(self, name, default=None):
+        return self.params.get(name, default)
+
+    def require(self, name):
+        value = self.params.get(name)
+        if value in (None, ""):
+            raise HTTPError(400, f"Parâmetro obrigatório ausente: {name}")
+        return value
+
+    def flag(self, name, default):
+        value = self.params.get(name, default)
+        if isinstance(value, str):
+            return value.strip().lower() not in ("0", "off", "false", "no")
+        return bool(value)
+
+    def integer(self, name, default):
+        try:
+            return int(self.params.get(name, default))
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"Parâmetro {name} deve ser um inteiro.") from None
+
+class NDJSONStream:
+    """Resposta em streaming: chunks (bytes) de um async generator.
+
+    close, se informado, libera o resultado (e a conexão emprestada) mesmo que
+    o envio nem tenha começado, ex.: se o cliente desconectou antes.
+    """
+
+    def __init__(self, chunks, close=None):
+        self.chunks = chunks
+        self.close = close
+
+def _line(value):
+    return (json.dumps(value, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+def is_single_statement(sql_query, db_engine=None):
+    """Indica se o texto tem uma só instrução (um ';' final e comentários depois são aceitos)."""
+    detector = sql_stream.StatementDetector(backslash_escapes=db_engine == 'mysql')
+    statement = detector.feed(sql_query)
+    if statement is None:
+        return True
+    return not result_stream._strip_comments(sql_query[len(statement):]).strip()
+
+def is_read_only(sql_query):
+    """Consultas de leitura: um único SELECT/WITH/VALUES/TABLE, SHOW ou DESCRIBE.
+
+    É só um filtro antecipado: a execução sem --allow-writes acontece em uma
+    transação só de leitura, que o banco garante.
+    """
+    return result_stream.is_streamable_query(sql_query) or bool(_READ_ONLY_RE.match(sql_query))
+
+def is_database_error(e):
+    # Erros dos drivers (SQL inválida, tempo limite...), sem importar os módulos aqui
+    return type(e).__module__.split(".")[0] in ("psycopg2", "pymysql", "sqlite3")
+
+def error_status(e):
+    if isinstance(e, HTTPError):
+        return e.status
+    if isinstance(e, cost_guard.CostGuardError):
+        return HTTPStatus.UNPROCESSABLE_ENTITY
+    if isinstance(e, db_pool.PoolTimeoutError):
+        return HTTPStatus.SERVICE_UNAVAILABLE
+    if isinstance(e, query_control.QueryCancelledError):
+        return HTTPStatus.GATEWAY_TIMEOUT
+    if isinstance(e, ValueError) or is_database_error(e):
+        return HTTPStatus.BAD_REQUEST
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+def table_json(table):
+    """introspection.Table como dict serializável."""
+    return {
+        "name": table.name,
+        "columns": [{"name": name, "type": col_type} for name, col_type in table.columns],
+        "primary_key": list(table.primary_key),
+        "foreign_keys": [{"columns": list(fk.columns), "ref_table": fk.ref_table, "ref_columns": list(fk.ref_columns)}
+                         for fk in table.foreign_keys],
+        "indexes": [{"name": index.name, "columns": list(index.columns), "unique": index.unique}
+                    for index in table.indexes],
+        "rows": table.rows,
+    }
+
+# --- SERVIÇO ---
+
+class TextToSQLService:
+    """Handlers dos endpoints sobre os pools de conexão e o cliente do modelo compartilhados."""
+
+    def __init__(self, db_engine, user, password, database=None, allow_writes=False, workers=WORKERS,
+                 databases=DATABASES):
+        self.db_engine = db_engine
+        self.user = user
+        self.password = password
+        self.database = database
+        # Lista fixa de bancos permitidos, ou None para aceitar os que list_databases encontrar
+        self.allowed = set(databases) if databases else None
+        self.allow_writes = allow_writes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server")
+        self.started_at = time.time()
+        self.in_flight = 0
+        # banco -> (schema, momento da leitura); só bancos já validados por check_database
+        self._schemas = {}
+        self._schema_locks = {}
+        # Bancos existentes no servidor, relidos no máximo a cada SCHEMA_TTL segundos
+        self._known = set()
+        self._known_at = None
+        self._known_lock = asyncio.Lock()
+        self.routes = {
+            "/health": ("GET", self.health),
+            "/metrics": ("GET", self.metrics),
+            "/databases": ("GET", self.databases),
+            "/schema": ("GET", self.schema),
+            "/generate": ("POST", self.generate),
+            "/execute": ("POST", self.execute),
+            "/ask": ("POST", self.ask),
+        }
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Roda func em uma thread do servidor, levando o contexto (span atual) junto."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: context.run(func, *args, **kwargs))
+
+    async def database_for(self, request):
+        database = request.get("database") or self.database
+        if not database:
+            raise HTTPError(400, "Informe o banco em 'database' (ou inicie o servidor com --database).")
+        await self.check_database(database)
+        return database
+
+    async def check_database(self, database):
+        """Recusa bancos fora da lista permitida (ou inexistentes) antes de criar pool ou cache para eles.
+
+        O nome vem do cliente: sem a checagem, cada nome novo deixaria um pool
+        de conexões e uma entrada de schema para sempre no servidor.
+        """
+        if database == self.database:
+            return
+        if self.allowed is not None:
+            if database not in self.allowed:
+                raise HTTPError(404, f"Banco não permitido neste servidor: {database}")
+            return
+        if database in self._known:
+            return
+        async with self._known_lock:
+            # Um nome desconhecido relê a lista no máximo uma vez por SCHEMA_TTL
+            stale = self._known_at is None or time.monotonic() - self._known_at > SCHEMA_TTL
+            if database not in self._known and stale:
+                self._set_known(await self.run_blocking(
+                    script.list_databases, self.db_engine, self.user, self.password))
+        if database not in self._known:
+            raise HTTPError(404, f"Banco não encontrado: {database}")
+
+    def _set_known(self, names):
+        """Atualiza os bancos existentes e esquece o schema dos que sumiram."""
+        self._known = set(names)
+        self._known_at = time.monotonic()
+        for name in list(self._schemas):
+            if name not in self._known and name != self.database:
+                self._schemas.pop(name, None)
+                self._schema_locks.pop(name, None)
+
+    def pool(self, database):
+        return script.get_pool(self.db_engine, self.user, self.password, database)
+
+    async def load_schema(self, database):
+        """Schema do banco, relido do catálogo (ou do cache de schema) a cada SCHEMA_TTL segundos."""
+        lock = self._schema_locks.setdefault(database, asyncio.Lock())
+        # Requisições simultâneas sobre o mesmo banco esperam a mesma leitura
+        async with lock:
+            entry = self._schemas.get(database)
+            if entry is None or time.monotonic() - entry[1] > SCHEMA_TTL:
+                schema, _ = await self.run_blocking(
+                    script.get_schema_cached, self.pool(database), self.db_engine, self.user, database)
+                entry = self._schemas[database] = (schema, time.monotonic())
+        return entry[0]
+
+    # --- ENDPOINTS ---
+
+    async def health(self, request):
+        pools = {f"{user}@{host}/{database or ''}": stats
+                 for (engine, host, user, database), stats in script.pool_stats().items()}
+        return {"status": "ok", "engine": self.db_engine, "uptime_s": round(time.time() - self.started_at, 1),
+                "in_flight": self.in_flight, "pools": pools, "llm": script.llm_stats(),
+                "singleflight": script.singleflight_stats()}
+
+    async def metrics(self, request):
+        return metrics.prometheus_text()
+
+    async def databases(self, request):
+        if self.allowed is not None:
+            return {"databases": sorted(self.allowed)}
+        names = await self.run_blocking(script.list_databases, self.db_engine, self.user, self.password)
+        self._set_known(names)
+        return {"databases": names}
+
+    async def schema(self, request):
+        database = await self.database_for(request)
+        schema = await self.load_schema(database)
+        tables = introspection.parse_schema(schema)
+        return {"database": database, "text": schema, "tables": [table_json(table) for table in tables]}
+
+    async def _generate(self, request, database):
+        pergunta = request.require("question")
+        schema = await self.load_schema(database)
+        info = {}
+        start = time.perf_counter()
+        # Versão síncrona em uma thread: a poda, os caches e o cache de contexto também bloqueiam
+        sql_query = await self.run_blocking(
+            script.generate_sql, schema, pergunta, use_cache=request.flag("use_cache", True), info=info)
+        return schema, pergunta, {
+            "sql": sql_query, "cache_hit": info["cache_hit"], "coalesced": info["coalesced"], "tokens": info["tokens"],
+            "schema": schema_pruning.describe_report(info["prune"]),
+            "generate_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    async def generate(self, request):
+        database = await self.database_for(request)
+        with metrics.span("question", interface="server") as question:
+            _, _, result = await self._generate(request, database)
+            return {**result, "trace_id": question.trace_id}
+
+    async def execute(self, request):
+        database = await self.database_for(request)
+        return await self._execute(request, database, request.require("sql"), {})
+
+    async def ask(self, request):
+        database = await self.database_for(request)
+        with metrics.span("question", interface="server") as question:
+            schema, pergunta, result = await self._generate(request, database)
+            try:
+                return await self._execute(request, database, result["sql"], {**result, "trace_id": question.trace_id})
+            except Exception:
+                # Não reaproveitar do cache uma SQL que falhou
+                await self.run_blocking(script.invalidate_sql_cache, schema, pergunta)
+                raise
+
+    async def _execute(self, request, database, sql_query, header):
+        if not is_single_statement(sql_query, self.db_engine):
+            raise HTTPError(400, "Envie uma única instrução SQL por requisição.", sql=sql_query)
+        if not self.allow_writes and not is_read_only(sql_query):
+            raise HTTPError(403, "Só consultas de leitura são permitidas neste servidor.", sql=sql_query)
+        max_rows = min(request.integer("max_rows", MAX_ROWS), MAX_ROWS)
+        if max_rows < 0:
+            raise HTTPError(400, "Parâmetro max_rows não pode ser negativo.")
+        use_cache = request.flag("use_cache", True)
+        pool = self.pool(database)
+
+        decision = await self.run_blocking(cost_guard.check, pool, sql_query)
+        if decision.action == 'block':
+            raise HTTPError(422, decision.reason, sql=sql_query)
+        if decision.estimate is not None:
+            header["estimate"] = {"cost": decision.estimate.cost, "rows": decision.estimate.rows,
+                                  "action": decision.action}
+        header["sql"] = decision.sql
+
+        # Abre antes de responder: erros na execução ainda viram um status HTTP
+        open_stream = script.stream_sql_cached if use_cache else script.stream_sql
+        stream = await self.run_blocking(open_stream, pool, decision.sql, read_only=not self.allow_writes)
+        header["columns"] = stream.columns
+        header["from_cache"] = getattr(stream, "from_cache", False)
+        return NDJSONStream(self._stream_rows(stream, header, max_rows), close=stream.close)
+
+    async def _stream_rows(self, stream, header, max_rows):
+        """Envia as linhas conforme a thread produtora lê e codifica os lotes."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+        cancelled = threading.Event()
+        context = contextvars.copy_context()
+        producer = loop.run_in_executor(
+            self.executor, context.run, self._produce_rows, loop, queue, cancelled, stream, max_rows)
+        try:
+            yield _line(header)
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Cliente desconectado (ou fim normal): a produtora para no próximo lote
+            cancelled.set()
+            await producer
+
+    def _produce_rows(self, loop, queue, cancelled, stream, max_rows):
+        def put(chunk):
+            future = asyncio.run_coroutine_threadsafe(queue.put(chunk), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.5)
+                except concurrent.futures.TimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        return None
+
+        start = time.perf_counter()
+        rows = 0
+        truncated = False
+        try:
+            with stream:
+                for batch in stream.batches():
+                    if cancelled.is_set():
+                        return
+                    room = max_rows - rows
+                    put(b"".join(_line(list(row)) for row in batch[:room]))
+                    rows += min(len(batch), room)
+                    if len(batch) > room:
+                        truncated = True
+                        break
+            put(_line({"rows": rows, "truncated": truncated,
+                       "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}))
+        except Exception as e:
+            put(_line({"error": f"{type(e).__name__}: {e}", "rows": rows}))
+        finally:
+            put(None)
+
+# --- HTTP ---
+
+async def read_request(reader):
+    """Lê uma requisição HTTP/1.x. Retorna (Request, versão) ou None se a conexão fechou."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Linha de requisição inválida.") from None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Content-Length inválido.") from None
+    if length > MAX_BODY:
+        raise HTTPError(413, f"Corpo maior que {MAX_BODY} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body), version
+
+def _head(status, content_type, keep_alive, length=None, chunked=False):
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if length is not None:
+        lines.append(f"Content-Length: {length}")
+    elif chunked:
+        lines.append("Transfer-Encoding: chunked")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def send_response(writer, status, result, keep_alive, chunked):
+    """Envia o resultado de um handler: dict/list (JSON), str (texto) ou NDJSONStream."""
+    if isinstance(result, NDJSONStream):
+        writer.write(_head(status, "application/x-ndjson; charset=utf-8", keep_alive, chunked=chunked))
+        async for chunk in result.chunks:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+            await writer.drain()
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return
+    if isinstance(result, str):
+        body, content_type = result.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        body, content_type = _line(result), "application/json; charset=utf-8"
+    writer.write(_head(status, content_type, keep_alive, len(body)) + body)
+    await writer.drain()
+
+class Server:
+    """Servidor HTTP/1.1 com keep-alive; cada conexão é uma tarefa asyncio."""
+
+    def __init__(self, service, token=TOKEN):
+        self.service = service
+        self.token = token
+
+    def _authorized(self, request):
+        if not self.token or request.path == "/health":
+            return True
+        given = request.headers.get("authorization", "")
+        return hmac.compare_digest(given.encode(), f"Bearer {self.token}".encode())
+
+    async def dispatch(self, request):
+        route = self.service.routes.get(request.path)
+        if route is None:
+            raise HTTPError(404, f"Endpoint não encontrado: {request.path}")
+        method, handler = route
+        if request.method != method:
+            raise HTTPError(405, f"Use {method} em {request.path}.")
+        if not self._authorized(request):
+            raise HTTPError(401, "Token ausente ou inválido.")
+        return await handler(request)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    parsed = await read_request(reader)
+                except HTTPError as e:
+                    await send_response(writer, e.status, {"error": str(e)}, False, False)
+                    break
+                except (asyncio.IncompleteReadError, ValueError):
+                    break
+                if parsed is None:
+                    break
+                request, version = parsed
+                chunked = version == "HTTP/1.1"
+                keep_alive = chunked and request.headers.get("connection", "").lower() != "close"
+                keep_alive = await self.handle_request(request, writer, keep_alive, chunked)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request, writer, keep_alive, chunked):
+        """Atende uma requisição; retorna se a conexão pode continuar aberta."""
+        self.service.in_flight += 1
+        status = HTTPStatus.OK
+        result = None
+        with metrics.span("request", method=request.method, path=request.path) as span:
+            try:
+                try:
+                    result = await self.dispatch(request)
+                except Exception as e:
+                    status = error_status(e)
+                    if status == HTTPStatus.INTERNAL_SERVER_ERROR:
+                        print(f"Erro em {request.method} {request.path}: {type(e).__name__}: {e}")
+                    result = {"error": str(e), **getattr(e, "details", {})}
+                    span.set(error=type(e).__name__)
+                # Sem chunked (HTTP/1.0), o fim do NDJSON é o fechamento da conexão
+                keep_alive = keep_alive and (chunked or not isinstance(result, NDJSONStream))
+                await send_response(writer, status, result, keep_alive, chunked)
+            finally:
+                if isinstance(result, NDJSONStream):
+                    await result.chunks.aclose()
+                    if result.close is not None:
+                        await self.service.run_blocking(result.close)
+                self.service.in_flight -= 1
+                span.set(status=status.value)
+                path = request.path if request.path in self.service.routes else "other"
+                metrics.inc("http_requests_total", path=path, status=status.value)
+        return keep_alive
+
+async def serve(service, host, port):
+    server = Server(service)
+    listener = await asyncio.start_server(server.handle_connection, host, port)
+    addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+    print(f"Servidor ouvindo em {addresses} (Ctrl+C encerra).")
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=["postgresql", "mysql"], required=True)
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--database", help="banco usado quando a requisição não informa 'database'")
+    parser.add_argument("--databases", nargs="+", default=DATABASES,
+                        help="bancos que as requisições podem usar (padrão: SERVER_DATABASES ou os do servidor)")
+    parser.add_argument("--host", default="127.0.0.1", help="endereço de escuta (padrão: só local)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="threads para o banco e o modelo")
+    parser.add_argument("--allow-writes", action="store_true",
+                        help="permite executar instruções que não são de leitura")
+    args = parser.parse_args()
+
+    password = os.getenv("DB_PASSWORD") or getpass.getpass("Digite a senha do banco de dados: ")
+    service = TextToSQLService(args.engine, args.user, password, args.database, args.allow_writes, args.workers,
+                               args.databases)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServidor encerrado.")
+    finally:
+        service.executor.shutdown(wait=False, cancel_futures=True)
+        script.close_pools()
+
+if __name__ == "__main__":
+    main()
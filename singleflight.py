@@ -0,0 +1,129 @@
+import threading
+
+import metrics
+
+# --- CHAMADAS IDÊNTICAS SIMULTÂNEAS COMPARTILHAM O RESULTADO (SINGLE-FLIGHT) ---
+# Quando várias threads (batch, servidor) pedem a mesma coisa ao mesmo tempo,
+# só a primeira (a "líder") faz a chamada; as demais esperam e recebem o mesmo
+# resultado ou a mesma exceção. Diferente de um cache, nada fica guardado
+# quando a chamada termina: o próximo pedido idêntico executa de novo.
+# Se a líder for interrompida (KeyboardInterrupt, tarefa cancelada), quem
+# estava esperando tenta de novo e uma delas vira a nova líder.
+
+class _Call:
+    __slots__ = ("done", "result", "error", "aborted")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.aborted = False
+
+class SingleFlight:
+    """Agrupa chamadas simultâneas com a mesma chave em uma só execução."""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        # (laço de eventos, chave) -> asyncio.Future da líder
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _count(self, leader):
+        # Conta cada chamada uma vez, pelo papel final (quem tentou de novo e virou líder conta como líder)
+        with self._lock:
+            if leader:
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        metrics.inc("singleflight_calls_total", group=self.name, role="leader" if leader else "coalesced")
+
+    def do(self, key, func, *args, **kwargs):
+        """Executa func(*args, **kwargs), ou espera a chamada idêntica já em andamento.
+
+        Retorna (resultado, compartilhado). Exceções da líder são levantadas
+        também para quem esperava por ela.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            call.done.wait()
+            if call.aborted:
+                continue
+            self._count(False)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        self._count(True)
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.aborted = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def do_async(self, key, make_coro):
+        """Como do, para corrotinas: make_coro() cria a corrotina executada pela líder."""
+        # Importado só aqui: o asyncio pesa na importação e só o servidor e o batch o usam
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        while True:
+            with self._lock:
+                future = self._async_calls.get(flight_key)
+                leader = future is None
+                if leader:
+                    future = self._async_calls[flight_key] = loop.create_future()
+            if leader:
+                break
+            try:
+                # shield: cancelar quem espera não cancela a chamada da líder
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    continue
+                raise
+            except Exception:
+                self._count(False)
+                raise
+            self._count(False)
+            return future.result(), True
+
+        self._count(True)
+        try:
+            result = await make_coro()
+        except Exception as e:
+            future.set_exception(e)
+            # Marca a exceção como lida mesmo que ninguém esteja esperando
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._async_calls[flight_key]
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced,
+                    "in_flight": len(self._calls) + len(self._async_calls)}
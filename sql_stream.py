@@ -0,0 +1,127 @@
+import re
+
+# --- PROCESSAMENTO INCREMENTAL DA SQL GERADA ---
+# Com a geração em streaming, o texto chega em pedaços. FenceStripper remove as
+# marcações ```sql à medida que chegam (segurando só o trecho final que ainda
+# pode ser o começo de uma marcação) e StatementDetector percebe o ';' que
+# encerra a instrução, ignorando os que estão dentro de strings, identificadores
+# entre aspas, comentários e dollar quotes do PostgreSQL.
+
+FENCE_RE = re.compile(r"```(sql)?", flags=re.IGNORECASE)
+_FENCE = "```sql"
+
+def clean_sql(text):
+    """Remove marcações de código e espaços nas pontas da SQL devolvida pelo modelo."""
+    return FENCE_RE.sub("", text.strip()).strip()
+
+def _partial_fence_len(text):
+    """Tamanho do sufixo de text que pode ser o começo de uma marcação ```sql."""
+    lowered = text[-len(_FENCE):].lower()
+    for size in range(min(len(lowered), len(_FENCE)), 0, -1):
+        if _FENCE.startswith(lowered[-size:]):
+            return size
+    return 0
+
+class FenceStripper:
+    """Remove as marcações de código de um texto recebido em pedaços."""
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def feed(self, chunk):
+        """Recebe um pedaço e retorna o texto limpo que já pode ser exibido."""
+        text = self._pending + chunk
+        hold = _partial_fence_len(text)
+        self._pending = text[len(text) - hold:] if hold else ""
+        return self._emit(FENCE_RE.sub("", text[:len(text) - hold]))
+
+    def flush(self):
+        """Fim do stream: libera o que estava retido."""
+        text, self._pending = self._pending, ""
+        return self._emit(FENCE_RE.sub("", text))
+
+    def _emit(self, text):
+        if not self._started:
+            # Espaços antes da SQL (ex.: a quebra de linha após ```sql) não são exibidos
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+_DOLLAR_TAG_RE = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+
+class StatementDetector:
+    """Encontra o fim da primeira instrução SQL em um texto que chega em pedaços.
+
+    Com backslash_escapes=True (MySQL), \\' dentro de strings não fecha a string.
+    """
+
+    def __init__(self, backslash_escapes=False):
+        self.backslash_escapes = backslash_escapes
+        self.text = ""
+        self.statement = None
+        self._pos = 0
+        self._state = None  # None, "'", '"', '`', '--', '/*' ou a tag de um dollar quote
+
+    def feed(self, chunk):
+        """Acrescenta o pedaço; retorna a instrução completa (até o ';') quando ela termina."""
+        if self.statement is not None:
+            return None
+        self.text += chunk
+        text, i, state = self.text, self._pos, self._state
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if state is None:
+                if c == ";":
+                    self.statement = text[:i + 1]
+                    self._pos, self._state = i + 1, None
+                    return self.statement
+                if c in "'\"`":
+                    state = c
+                elif c in "-/$":
+                    if i + 1 >= n:
+                        break  # Ainda não dá para saber se é comentário/dollar quote
+                    pair = text[i:i + 2]
+                    if pair == "--":
+                        state, i = "--", i + 1
+                    elif pair == "/*":
+                        state, i = "/*", i + 1
+                    elif c == "$":
+                        match = _DOLLAR_TAG_RE.match(text, i)
+                        if match:
+                            state, i = match.group(0), match.end() - 1
+                        elif re.fullmatch(r"\$[A-Za-z0-9_]*", text[i:]) and not text[i + 1].isdigit():
+                            break  # Tag de dollar quote ainda incompleta
+            elif state == "--":
+                if c == "\n":
+                    state = None
+            elif state == "/*":
+                if c == "*":
+                    if i + 1 >= n:
+                        break
+                    if text[i + 1] == "/":
+                        state, i = None, i + 1
+            elif state in ("'", '"', '`'):
+                if c == "\\" and self.backslash_escapes and state != '`':
+                    if i + 1 >= n:
+                        break
+                    i += 1
+                elif c == state:
+                    state = None
+            else:
+                # Dentro de um dollar quote: termina na mesma tag
+                if text.startswith(state, i):
+                    i += len(state) - 1
+                    state = None
+                elif c == "$" and state.startswith(text[i:]):
+                    break  # Talvez a tag de fechamento esteja chegando
+            i += 1
+        self._pos, self._state = i, state
+        return None
+
+    def finish(self):
+        """Fim do stream: sem ';', a instrução é todo o texto recebido."""
+        if self.statement is None and self.text.strip():
+            self.statement = self.text
+        return self.statement
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Os módulos do projeto ficam na raiz do repositório, como nos benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Caches (schema, SQL, resultados) em um diretório temporário, nunca no do usuário
+os.environ.setdefault("TEXT_TO_SQL_CACHE_DIR", tempfile.mkdtemp(prefix="text-to-sql-tests-"))
+# Os testes nunca chamam a API real
+os.environ.setdefault("LLM_BACKEND", "fake")
@@ -0,0 +1,48 @@
+"""Entrega de eventos da thread de trabalho para a thread do Tk, com um root falso."""
+import time
+
+from background import BackgroundWorker
+
+class FakeRoot:
+    """Guarda os after() agendados; run() os executa como o mainloop do Tk."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def run(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            pending, self.scheduled = self.scheduled, []
+            for callback in pending:
+                callback()
+            time.sleep(0.01)
+
+def test_callback_errors_do_not_stop_the_polling(capsys):
+    root = FakeRoot()
+    worker = BackgroundWorker(root, poll_ms=10)
+    received = []
+
+    def broken(value):
+        raise ValueError("widget destruído")
+
+    worker.submit(lambda: 1, on_success=broken)
+    worker.submit(lambda: 2, on_success=received.append)
+    root.run(0.3)
+    worker.post(received.append, 3)
+    root.run(0.1)
+    worker.shutdown()
+    assert received == [2, 3]
+    assert "widget destruído" in capsys.readouterr().out
+
+def test_jobs_report_errors_on_the_tk_thread():
+    root = FakeRoot()
+    worker = BackgroundWorker(root, poll_ms=10)
+    errors = []
+    worker.submit(lambda: 1 / 0, on_error=errors.append)
+    root.run(0.2)
+    worker.shutdown()
+    assert isinstance(errors[0], ZeroDivisionError)
+    assert worker.pending == 0
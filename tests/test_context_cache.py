@@ -0,0 +1,170 @@
+"""Cache de contexto: criação, reaproveitamento e volta ao prompt inteiro quando a criação falha."""
+import threading
+import time
+
+import pytest
+
+import context_cache
+import llm_cassette
+import llm_client
+import script
+from context_cache import CachedPrefix, ContextCache, LocalContextCache
+from fake_llm import FakeModel
+from prompts import estimate_tokens
+
+SCHEMA = """Tabela: alunos (~1200 linhas)
+- id: integer
+- nome: character varying
+- curso_id: integer
+
+Tabela: cursos (~30 linhas)
+- id: integer
+- nome: character varying"""
+
+PREFIX = "Instruções e schema " * 50
+
+class StubCache(ContextCache):
+    """Cache cuja criação é controlada pelo teste (falha, demora) e que registra as remoções."""
+
+    name = "stub"
+
+    def __init__(self, fail=False, delay=0.0, **kwargs):
+        kwargs.setdefault("min_tokens", 1)
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.delay = delay
+        self.created = []
+        self.deleted = []
+
+    def _create(self, prefix, model):
+        self.created.append(prefix)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("400 Cached content is too small")
+        return CachedPrefix(("cached", prefix), 100, time.time() + self.ttl, len(self.created))
+
+    def _delete(self, entry):
+        self.deleted.append(entry.handle)
+
+def test_small_prefixes_are_not_cached():
+    cache = StubCache(min_tokens=10_000)
+    assert cache.model_for(PREFIX, object()) is None
+    assert cache.created == []
+
+def test_prefix_is_created_once_and_reused():
+    cache, model = StubCache(), object()
+    first = cache.model_for(PREFIX, model)
+    assert first == ("cached", PREFIX)
+    assert cache.model_for(PREFIX, model) is first
+    assert cache.model_for(PREFIX, model) is first
+    assert len(cache.created) == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"], stats["tokens"]) == (1, 2, 1, 100)
+
+def test_failed_creation_falls_back_to_the_full_prompt(capsys):
+    cache, model = StubCache(fail=True), object()
+    assert cache.model_for(PREFIX, model) is None
+    # Até o TTL vencer, a criação não é tentada de novo a cada pergunta
+    assert cache.model_for(PREFIX, model) is None
+    assert len(cache.created) == 1
+    stats = cache.stats()
+    assert (stats["failures"], stats["hits"], stats["entries"]) == (1, 0, 0)
+    assert "enviando o prompt inteiro" in capsys.readouterr().out
+
+def test_expired_prefix_is_created_again():
+    # Com TTL menor que a margem de expiração, a entrada nunca é usada de novo
+    cache, model = StubCache(ttl=0), object()
+    cache.model_for(PREFIX, model)
+    cache.model_for(PREFIX, model)
+    assert len(cache.created) == 2
+    assert cache.stats()["misses"] == 2
+
+def test_least_recently_used_prefix_is_deleted():
+    cache, model = StubCache(max_entries=1), object()
+    cache.model_for(PREFIX, model)
+    cache.model_for(PREFIX + "outro schema", model)
+    assert cache.deleted == [1]
+    assert cache.stats()["entries"] == 1
+
+def test_concurrent_questions_share_one_creation():
+    cache, model = StubCache(delay=0.2), object()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.model_for(PREFIX, model))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.created) == 1
+    assert results == [("cached", PREFIX)] * 8
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 7)
+
+def test_hits_do_not_wait_for_another_creation():
+    cache, model = StubCache(), object()
+    cache.model_for(PREFIX, model)
+    cache.delay = 1.0
+    creating = threading.Thread(target=cache.model_for, args=(PREFIX + "outro schema", model))
+    creating.start()
+    start = time.perf_counter()
+    assert cache.model_for(PREFIX, model) == ("cached", PREFIX)
+    assert time.perf_counter() - start < 0.5
+    creating.join()
+
+@pytest.mark.parametrize("mode, model_name, override, expected", [
+    ("off", "gemini-1.5-pro-002", None, None),
+    ("local", "gemini-1.5-pro-latest", None, "local"),
+    ("auto", "gemini-1.5-pro-002", None, "gemini"),
+    # O Gemini não cria caches para aliases
+    ("auto", "gemini-1.5-pro-latest", None, None),
+    ("gemini", "gemini-1.5-pro-latest", "gemini-1.5-pro-002", "gemini"),
+])
+def test_from_env(monkeypatch, mode, model_name, override, expected):
+    monkeypatch.setattr(context_cache, "MODE", mode)
+    monkeypatch.setattr(context_cache, "MODEL_NAME", override)
+    cache = context_cache.from_env(model_name, gemini_model=True)
+    assert (cache.name if cache else None) == expected
+    if expected == "gemini":
+        assert context_cache.is_versioned(cache.model_name)
+
+def test_auto_mode_needs_the_real_gemini_model(monkeypatch):
+    monkeypatch.setattr(context_cache, "MODE", "auto")
+    assert context_cache.from_env("gemini-1.5-pro-002", gemini_model=False) is None
+
+def test_local_cache_sends_prefix_and_question_to_the_model():
+    model = FakeModel(latency=0, responder=lambda prompt: prompt)
+    cached = LocalContextCache(min_tokens=1).model_for(PREFIX, model)
+    assert cached.generate_content("Pergunta: quantos alunos?").text == PREFIX + "Pergunta: quantos alunos?"
+    assert cached.cached_tokens == estimate_tokens(PREFIX)
+
+@pytest.fixture
+def offline_script(monkeypatch):
+    """script com um modelo atribuído pelo teste e cache de contexto local."""
+    def use(model):
+        monkeypatch.setattr(script, "model", model)
+        monkeypatch.setattr(script, "_llm_client", llm_client.LLMClient(model, bucket=llm_client.TokenBucket(0)))
+        monkeypatch.setattr(script, "_context_cache", LocalContextCache(min_tokens=1))
+        monkeypatch.setattr(script, "_context_cache_ready", True)
+    return use
+
+def test_generate_sql_uses_the_context_cache(offline_script):
+    offline_script(FakeModel(latency=0))
+    info = {}
+    assert script.generate_sql(SCHEMA, "Quantos alunos existem?", use_cache=False, info=info).startswith("SELECT")
+    # Só a pergunta foi enviada; o prefixo (instruções + schema inteiro, sem poda) veio do cache
+    assert info["tokens"]["cached"] > 0
+    assert info["tokens"]["input"] > info["tokens"]["cached"]
+    assert info["prune"].tables_after == info["prune"].tables_before == 2
+    assert script.get_context_cache().stats()["misses"] == 1
+
+def test_cached_calls_replay_from_the_cassette(offline_script, tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    question = "Quais cursos existem?"
+
+    offline_script(llm_cassette.RecordingModel(FakeModel(latency=0), llm_cassette.Cassette(path), "fake-llm"))
+    recorded = script.generate_sql(SCHEMA, question, use_cache=False)
+
+    # Novo processo, sem rede: a mesma chamada (prefixo + pergunta) vem do cassette
+    offline_script(llm_cassette.ReplayModel(llm_cassette.Cassette(path), "fake-llm", latency=0))
+    info = {}
+    assert script.generate_sql(SCHEMA, question, use_cache=False, info=info) == recorded
+    assert info["tokens"]["cached"] > 0
@@ -0,0 +1,65 @@
+"""Pools por banco: a criação de um pool não trava os pools dos outros bancos."""
+import threading
+import time
+
+import pytest
+
+import db_pool
+
+class FakeConnection:
+    closed = 0
+
+    def close(self):
+        self.closed = 1
+
+@pytest.fixture(autouse=True)
+def isolated_pools(monkeypatch):
+    monkeypatch.setattr(db_pool, "_pools", {})
+    monkeypatch.setattr(db_pool, "_creating", {})
+
+def test_slow_database_does_not_block_other_pools():
+    release = threading.Event()
+
+    def slow_connect():
+        # Banco inacessível: o connect só volta no tempo limite
+        release.wait(5)
+        return FakeConnection()
+
+    opening = threading.Thread(target=db_pool.get_pool, args=("lento", slow_connect))
+    opening.start()
+    time.sleep(0.1)
+    start = time.perf_counter()
+    other = db_pool.get_pool("rapido", FakeConnection)
+    stats = db_pool.all_stats()
+    assert time.perf_counter() - start < 0.5
+    assert list(stats) == ["rapido"]
+    release.set()
+    opening.join()
+    assert db_pool.get_pool("rapido", FakeConnection) is other
+    assert set(db_pool.all_stats()) == {"lento", "rapido"}
+
+def test_concurrent_callers_share_one_pool():
+    connects = []
+
+    def connect():
+        connects.append(1)
+        time.sleep(0.1)
+        return FakeConnection()
+
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(db_pool.get_pool("banco", connect))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, pools))) == 1
+    assert len(connects) == min(db_pool.MIN_SIZE, db_pool.MAX_SIZE)
+
+def test_failed_creation_is_retried():
+    def refuse():
+        raise ConnectionError("connection refused")
+
+    with pytest.raises(ConnectionError):
+        db_pool.get_pool("banco", refuse)
+    assert db_pool._creating == {}
+    assert db_pool.get_pool("banco", FakeConnection).stats()["created"] == min(db_pool.MIN_SIZE, db_pool.MAX_SIZE)
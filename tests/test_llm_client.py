@@ -0,0 +1,163 @@
+"""Novas tentativas, espera exponencial e concorrência adaptativa (AIMD) do LLMClient diante de 429 e 5xx."""
+import asyncio
+
+import pytest
+
+import llm_client
+from fake_llm import FakeAPIError, FakeModel, FakeResponse, split_chunks
+from llm_client import AdaptiveLimiter, LLMClient, TokenBucket
+
+class ScriptedModel:
+    """Modelo que devolve, chamada a chamada, o próximo item do roteiro (texto ou exceção)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self._stream()
+        return FakeResponse(self._next())
+
+    def _stream(self):
+        for chunk in split_chunks(self._next()):
+            yield FakeResponse(chunk)
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Tentativas (attempt) em que houve espera; as esperas em si não acontecem."""
+    attempts = []
+    real_backoff = llm_client.backoff_delay
+
+    def backoff(attempt):
+        attempts.append(attempt)
+        return real_backoff(attempt)
+
+    monkeypatch.setattr(llm_client, "backoff_delay", backoff)
+    monkeypatch.setattr(llm_client.time, "sleep", lambda seconds: None)
+    return attempts
+
+def make_client(model, max_retries=5, limiter=None):
+    return LLMClient(model, bucket=TokenBucket(rate_per_minute=0), limiter=limiter or AdaptiveLimiter(4),
+                     max_retries=max_retries)
+
+def test_retries_rate_limit_and_server_errors(delays):
+    model = ScriptedModel(FakeAPIError(429, "quota"), FakeAPIError(503, "unavailable"), "SELECT 1;")
+    client = make_client(model)
+    assert client.generate_content("pergunta").text == "SELECT 1;"
+    assert model.calls == 3
+    assert delays == [0, 1]
+    stats = client.stats()
+    assert (stats["requests"], stats["retries"], stats["rate_limited"], stats["failures"]) == (3, 2, 1, 0)
+    assert stats["in_flight"] == 0
+
+def test_client_errors_are_not_retried(delays):
+    model = ScriptedModel(FakeAPIError(400, "invalid argument"))
+    client = make_client(model)
+    with pytest.raises(FakeAPIError):
+        client.generate_content("pergunta")
+    assert model.calls == 1
+    assert delays == []
+    assert client.stats()["failures"] == 1
+
+def test_gives_up_after_max_retries(delays):
+    model = ScriptedModel(*[FakeAPIError(503, "unavailable")] * 3)
+    client = make_client(model, max_retries=2)
+    with pytest.raises(FakeAPIError):
+        client.generate_content("pergunta")
+    assert model.calls == 3
+    assert delays == [0, 1]
+    stats = client.stats()
+    assert (stats["retries"], stats["failures"], stats["in_flight"]) == (2, 1, 0)
+
+def test_backoff_is_exponential_with_full_jitter():
+    for attempt in range(8):
+        bound = min(30, 0.5 * 2 ** attempt)
+        samples = [llm_client.backoff_delay(attempt, base=0.5, cap=30) for _ in range(200)]
+        assert all(0 <= delay <= bound for delay in samples)
+        # Jitter completo: as esperas se espalham por todo o intervalo
+        assert max(samples) - min(samples) > bound / 2
+
+def test_rate_limit_halves_the_concurrency_and_success_grows_it(delays):
+    limiter = AdaptiveLimiter(max_limit=8)
+    client = make_client(ScriptedModel(FakeAPIError(429, "quota"), "SELECT 1;"), limiter=limiter)
+    client.generate_content("pergunta")
+    # 8 -> 4 (429) -> 4 + 1/4 (sucesso)
+    assert limiter.limit == pytest.approx(4.25)
+
+def test_server_errors_do_not_shrink_the_concurrency(delays):
+    limiter = AdaptiveLimiter(max_limit=8, initial=2)
+    client = make_client(ScriptedModel(FakeAPIError(503, "unavailable"), "SELECT 1;"), limiter=limiter)
+    client.generate_content("pergunta")
+    assert limiter.limit == pytest.approx(2.5)
+
+def test_concurrency_limit_stays_between_one_and_max():
+    limiter = AdaptiveLimiter(max_limit=4)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release("rate_limited")
+    assert limiter.limit == 1.0
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release("ok")
+    assert limiter.limit == 4.0
+
+def test_ctrl_c_releases_the_slot():
+    limiter = AdaptiveLimiter(max_limit=1)
+    client = make_client(ScriptedModel(KeyboardInterrupt()), limiter=limiter)
+    with pytest.raises(KeyboardInterrupt):
+        client.generate_content("pergunta")
+    assert limiter.in_flight == 0
+
+def test_cancelled_async_call_releases_the_slot():
+    limiter = AdaptiveLimiter(max_limit=1)
+    client = make_client(FakeModel(latency=5), limiter=limiter)
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.generate_content_async("pergunta"), 0.05)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
+
+def test_stream_retries_only_before_the_first_chunk(delays):
+    model = ScriptedModel(FakeAPIError(429, "quota"), "SELECT * FROM alunos;")
+    client = make_client(model)
+    assert "".join(client.generate_content_stream("pergunta")) == "SELECT * FROM alunos;"
+    assert delays == [0]
+    assert client.stats()["in_flight"] == 0
+
+def test_abandoned_stream_releases_the_slot():
+    limiter = AdaptiveLimiter(max_limit=1)
+    client = make_client(ScriptedModel("SELECT * FROM alunos;"), limiter=limiter)
+    stream = client.generate_content_stream("pergunta")
+    next(stream)
+    assert limiter.in_flight == 1
+    stream.close()
+    assert limiter.in_flight == 0
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(1.0, abs=0.05)
+    assert waits[3] == pytest.approx(2.0, abs=0.05)
+
+def test_fake_model_with_injected_rate_limits(delays):
+    model = FakeModel(latency=0, rate_limit_rate=0.3, seed=7)
+    limiter = AdaptiveLimiter(max_limit=4)
+    client = make_client(model, limiter=limiter)
+    for _ in range(20):
+        assert client.generate_content("Tabela: alunos").text == "SELECT * FROM alunos LIMIT 10;"
+    stats = client.stats()
+    assert stats["requests"] == model.calls
+    assert stats["rate_limited"] == stats["retries"] > 0
+    assert stats["failures"] == 0
+    assert 1 <= limiter.limit <= 4
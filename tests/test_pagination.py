@@ -0,0 +1,54 @@
+"""Escolha entre paginação por chave e por cursor, e a ordem das páginas, com SQLite em memória."""
+import sqlite3
+
+import pytest
+
+import pagination
+
+@pytest.fixture
+def db():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE aluno (id INTEGER PRIMARY KEY, nome TEXT)")
+    names = ["bruno", "Ana", "carla", "Daniel", "eva"]
+    connection.executemany("INSERT INTO aluno VALUES (?, ?)", list(enumerate(names, 1)))
+    connection.commit()
+    yield connection
+    connection.close()
+
+def all_rows(pager):
+    rows, page = [], pager.first()
+    while True:
+        rows.extend(page.rows)
+        if not page.has_next:
+            return rows
+        page = pager.next()
+
+@pytest.mark.parametrize("sql, order", [
+    ("SELECT * FROM aluno", []),
+    ("SELECT * FROM aluno ORDER BY id DESC", [("id", True)]),
+    ("SELECT * FROM aluno a WHERE a.id IN (SELECT id FROM aluno ORDER BY nome) ORDER BY a.id",
+     [("id", False)]),
+])
+def test_simple_selects_are_parsed(sql, order):
+    assert pagination.parse_simple_select(sql)[4] == order
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM aluno ORDER BY lower(nome)",
+    "SELECT * FROM aluno ORDER BY coalesce(nome, '') DESC, id",
+    "SELECT * FROM aluno ORDER BY nome NULLS LAST",
+    "SELECT * FROM aluno ORDER BY id LIMIT 3",
+])
+def test_unparsed_order_by_is_not_keyset(sql):
+    assert pagination.parse_simple_select(sql) is None
+
+def test_primary_key_order_uses_keyset(db):
+    pager = pagination.open_pager(db, "SELECT * FROM aluno ORDER BY id DESC", None, page_size=2)
+    assert pager.mode == "keyset"
+    assert [row[0] for row in all_rows(pager)] == [5, 4, 3, 2, 1]
+
+def test_expression_order_keeps_the_requested_order(db):
+    # Paginar pela chave perderia a ordem pedida: vai para o cursor
+    pager = pagination.open_pager(db, "SELECT * FROM aluno ORDER BY lower(nome)", None, page_size=2)
+    assert pager.mode == "cursor"
+    assert [row[1] for row in all_rows(pager)] == ["Ana", "bruno", "carla", "Daniel", "eva"]
+    pager.close()
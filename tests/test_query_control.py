@@ -0,0 +1,228 @@
+"""Tempo limite e cancelamento de consultas longas, com conexões falsas do psycopg2 e do PyMySQL."""
+import _thread
+import threading
+import time
+
+import pymysql
+import pytest
+
+import query_control
+import result_stream
+
+class QueryCanceledError(Exception):
+    """Mesmo nome da exceção do psycopg2 (psycopg2.extensions.QueryCanceledError)."""
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.itersize = None
+
+    def execute(self, statement, params=None):
+        self.connection.executed.append((statement, params))
+        if statement in self.connection.failing:
+            raise self.connection.failing[statement]
+        if statement.startswith("SELECT pg_sleep") or "long_query" in statement:
+            self.connection.running.set()
+            # A consulta "roda" até ser cancelada ou estourar o tempo limite da sessão
+            limit = self.connection.timeout_ms / 1000 if self.connection.timeout_ms else 5
+            if self.connection.cancelled.wait(limit):
+                raise self.connection.interrupted("user request")
+            raise self.connection.interrupted("statement timeout")
+        if statement.startswith("SET statement_timeout"):
+            self.connection.timeout_ms = params[0]
+        self.description = [("x",)]
+
+    def fetchmany(self, size):
+        return []
+
+    def close(self):
+        pass
+
+class FakeConnection:
+
+    def __init__(self):
+        self.executed = []
+        self.failing = {}
+        self.timeout_ms = 0
+        self.commits = 0
+        self.running = threading.Event()
+        self.cancelled = threading.Event()
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+class PostgresConnection(FakeConnection):
+    """Conexão que detect_engine reconhece como do psycopg2."""
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def interrupted(self, reason):
+        return QueryCanceledError(f"canceling statement due to {reason}")
+
+PostgresConnection.__module__ = "psycopg2.extensions"
+
+class MySQLConnection(FakeConnection):
+    """Conexão do PyMySQL: sem cancel(), cancelada por KILL QUERY de outra conexão."""
+
+    host, port, user, password = "localhost", 3306, b"app", "secret"
+
+    def thread_id(self):
+        return 42
+
+    def interrupted(self, reason):
+        if reason == "user request":
+            return Exception(1317, "Query execution was interrupted")
+        return Exception(3024, "Query execution was interrupted, maximum statement execution time exceeded")
+
+MySQLConnection.__module__ = "pymysql.connections"
+
+class SideConnection:
+    """Conexão auxiliar aberta por cancel_query; KILL QUERY interrompe a consulta de target."""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+        self.kwargs = kwargs
+        self.executed = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        if statement == "KILL QUERY %s" and params == (self.target.thread_id(),):
+            self.target.cancelled.set()
+
+    def close(self):
+        self.closed = True
+
+def test_postgres_timeout_is_set_per_session_and_committed():
+    db = PostgresConnection()
+    query_control.set_query_timeout(db, 1.5)
+    assert db.executed == [("SET statement_timeout = %s", (1500,))]
+    # Sem o commit, um rollback posterior desfaria o SET
+    assert db.commits == 1
+
+def test_mysql_timeout_falls_back_to_mariadb_variable():
+    db = MySQLConnection()
+    db.failing["SET SESSION MAX_EXECUTION_TIME = %s"] = Exception("Unknown system variable")
+    query_control.set_query_timeout(db, 2)
+    assert db.executed[-1] == ("SET SESSION max_statement_time = %s", (2,))
+
+def test_long_query_stops_at_the_timeout():
+    db = PostgresConnection()
+    query_control.set_query_timeout(db, 0.2)
+    start = time.perf_counter()
+    with pytest.raises(QueryCanceledError) as error:
+        result_stream.ResultStream(db, "SELECT * FROM long_query")
+    assert time.perf_counter() - start < 2
+    assert query_control.is_cancel_error(error.value)
+
+def test_cancel_from_another_thread():
+    db = PostgresConnection()
+    errors = []
+
+    def run():
+        try:
+            result_stream.ResultStream(db, "SELECT * FROM long_query")
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    assert db.running.wait(2)
+    query_control.cancel_query(db)
+    worker.join(2)
+    assert not worker.is_alive()
+    assert query_control.is_cancel_error(errors[0])
+
+def test_ctrl_c_cancels_the_query_on_the_server(capsys):
+    db = PostgresConnection()
+
+    def interrupt():
+        db.running.wait(2)
+        # Dá tempo de a thread principal chegar ao laço de espera, como um Ctrl-C de verdade
+        time.sleep(0.1)
+        _thread.interrupt_main()
+
+    threading.Thread(target=interrupt, daemon=True).start()
+    start = time.perf_counter()
+    with pytest.raises(QueryCanceledError):
+        query_control.run_cancellable(db, result_stream.ResultStream, db, "SELECT * FROM long_query")
+    assert db.cancelled.is_set()
+    assert time.perf_counter() - start < 2
+    assert "Cancelamento concluído" in capsys.readouterr().out
+
+def test_mysql_cancel_kills_the_query_from_a_side_connection(monkeypatch):
+    db = MySQLConnection()
+    sides = []
+    monkeypatch.setattr(pymysql, "connect", lambda **kwargs: sides.append(SideConnection(db, **kwargs)) or sides[-1])
+    errors = []
+
+    def run():
+        try:
+            result_stream.ResultStream(db, "SELECT * FROM long_query")
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    assert db.running.wait(2)
+    query_control.cancel_query(db)
+    worker.join(2)
+    assert not worker.is_alive()
+    assert query_control.is_cancel_error(errors[0])
+    side, = sides
+    assert side.kwargs == {"host": "localhost", "port": 3306, "user": "app", "password": "secret"}
+    assert side.executed == [("KILL QUERY %s", (42,))]
+    assert side.closed
+
+def test_failed_cancel_keeps_waiting_for_the_query(monkeypatch, capsys):
+    db = MySQLConnection()
+    db.timeout_ms = 500
+
+    def refuse(**kwargs):
+        raise pymysql.err.OperationalError(1040, "Too many connections")
+
+    monkeypatch.setattr(pymysql, "connect", refuse)
+
+    def interrupt():
+        db.running.wait(2)
+        time.sleep(0.1)
+        _thread.interrupt_main()
+
+    threading.Thread(target=interrupt, daemon=True).start()
+    # O erro da conexão auxiliar não substitui o resultado da consulta (aqui, o tempo limite)
+    with pytest.raises(Exception) as error:
+        query_control.run_cancellable(db, result_stream.ResultStream, db, "SELECT * FROM long_query")
+    assert error.value.args[0] == 3024
+    out = capsys.readouterr().out
+    assert "Não foi possível cancelar a consulta" in out and "Too many connections" in out
+    assert "Cancelamento concluído" not in out
+
+def test_cancel_error_detection():
+    assert query_control.is_cancel_error(query_control.QueryCancelledError())
+    assert query_control.is_cancel_error(QueryCanceledError())
+    # MySQL: consulta interrompida (KILL QUERY) e MAX_EXECUTION_TIME excedido
+    assert query_control.is_cancel_error(Exception(1317, "Query execution was interrupted"))
+    assert query_control.is_cancel_error(Exception(3024, "maximum statement execution time exceeded"))
+    assert not query_control.is_cancel_error(Exception(1064, "syntax error"))
+
+def test_cancel_is_refused_for_unknown_connections():
+    with pytest.raises(ValueError):
+        query_control.cancel_query(object())
@@ -0,0 +1,64 @@
+"""Validação do banco pedido pelo cliente antes de abrir pools ou guardar schemas."""
+import asyncio
+
+import pytest
+
+import script
+import server
+
+@pytest.fixture
+def service(monkeypatch):
+    listings, pools = [], []
+
+    def list_databases(*args):
+        listings.append(args)
+        return ["escola", "loja"]
+
+    monkeypatch.setattr(script, "list_databases", list_databases)
+    monkeypatch.setattr(script, "get_pool", lambda *args: pools.append(args) or object())
+    monkeypatch.setattr(script, "get_schema_cached", lambda pool, engine, user, database: (f"schema de {database}", False))
+
+    def make(**kwargs):
+        created = server.TextToSQLService("postgresql", "u", "p", "escola", **kwargs)
+        created.listings, created.pools = listings, pools
+        return created
+
+    yield make
+
+def ask_schema(service, database):
+    return asyncio.run(service.schema(server.Request("GET", f"/schema?database={database}", {}, b"")))
+
+def test_unknown_databases_are_refused_without_opening_pools(service):
+    svc = service(databases=None)
+    for name in ("nao_existe", "outro", "mais_um"):
+        with pytest.raises(server.HTTPError) as error:
+            ask_schema(svc, name)
+        assert error.value.status == 404
+    assert svc.pools == []
+    assert svc._schemas == {} and svc._schema_locks == {}
+    # Nomes desconhecidos não forçam uma listagem por requisição
+    assert len(svc.listings) == 1
+    svc.executor.shutdown()
+
+def test_existing_databases_are_accepted(service):
+    svc = service(databases=None)
+    assert ask_schema(svc, "loja")["text"] == "schema de loja"
+    assert ask_schema(svc, "escola")["text"] == "schema de escola"
+    assert set(svc._schemas) == {"loja", "escola"}
+    svc.executor.shutdown()
+
+def test_allow_list_is_checked_without_listing(service):
+    svc = service(databases=["loja"])
+    assert ask_schema(svc, "loja")["database"] == "loja"
+    with pytest.raises(server.HTTPError):
+        ask_schema(svc, "outro_banco")
+    assert svc.listings == []
+    assert asyncio.run(svc.databases(None)) == {"databases": ["loja"]}
+    svc.executor.shutdown()
+
+def test_dropped_databases_are_forgotten(service):
+    svc = service(databases=None)
+    ask_schema(svc, "loja")
+    svc._set_known(["escola"])
+    assert "loja" not in svc._schemas and "loja" not in svc._schema_locks
+    svc.executor.shutdown()
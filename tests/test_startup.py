@@ -0,0 +1,17 @@
+"""Importar os pontos de entrada não carrega módulos pesados (ver benchmarks/bench_startup.py)."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# asyncio: só o servidor e as chamadas assíncronas do batch o usam
+HEAVY_MODULES = ["pandas", "numpy", "psycopg2", "pymysql", "google.generativeai", "asyncio"]
+
+@pytest.mark.parametrize("module", ["script", "batch"])
+def test_import_does_not_load_heavy_modules(module):
+    check = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""